@@ -0,0 +1,263 @@
+import heapq
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from delivery_policy import AdaptivePacer, CircuitBreaker
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS account_sends (
+    account TEXT NOT NULL,
+    sent_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_account_sends ON account_sends (account, sent_at);
+"""
+
+
+class AccountScheduler:
+    """Hands out sending accounts by remaining quota in a rolling window, with counts persisted across runs.
+
+    Each account may set its own "DAILY_QUOTA" in email_accounts.json. An account is leased to one
+    sender at a time and is not handed out again until its pacing delay has passed. Each account has
+    an adaptive pacer and a circuit breaker fed by the outcome of its sends.
+
+    Accounts that aren't leased are idle, pacing (in a heap keyed by when their delay ends) or resting
+    (out of quota or unhealthy, in a heap keyed by when they may have capacity again), so leasing one
+    looks at the idle accounts rather than the whole pool.
+
+    clock (time() only) and rng default to the time and random modules; the simulation passes virtual ones.
+    """
+
+    def __init__(
+        self,
+        accounts: List[dict],
+        db_path: str = "account_usage.db",
+        default_quota: int = 100,
+        window: float = 86400,
+        pacing: tuple = (5, 15),
+        clock=time,
+        rng=random
+    ):
+        self.accounts = accounts
+        self.clock = clock
+        self.default_quota = default_quota
+        self.window = window
+        self._cond = threading.Condition()
+        self._sent: Dict[str, deque] = {a["EMAIL_USER"]: deque() for a in accounts}
+        self._by_user: Dict[str, dict] = {a["EMAIL_USER"]: a for a in accounts}
+        self._order: Dict[str, int] = {a["EMAIL_USER"]: i for i, a in enumerate(accounts)}
+        self._quotas: Dict[str, int] = {a["EMAIL_USER"]: self.quota(a) for a in accounts}
+        self._idle = set(self._by_user)
+        self._pacing: List[Tuple[float, str]] = []
+        self._resting: List[Tuple[float, str]] = []
+        self._unhealthy_until: Dict[str, float] = {a["EMAIL_USER"]: 0.0 for a in accounts}
+        self._leased = set()
+        self._breakers = {a["EMAIL_USER"]: CircuitBreaker(clock=clock) for a in accounts}
+        self._pacers = {
+            a["EMAIL_USER"]: AdaptivePacer(min_delay=pacing[0], initial=sum(pacing) / 2, rng=rng) for a in accounts
+        }
+
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        cutoff = self.clock.time() - window
+        self._conn.execute("DELETE FROM account_sends WHERE sent_at < ?", (cutoff,))
+        self._conn.commit()
+        for user, sent_at in self._conn.execute(
+            "SELECT account, sent_at FROM account_sends WHERE sent_at >= ? ORDER BY sent_at", (cutoff,)
+        ):
+            if user in self._sent:
+                self._sent[user].append(sent_at)
+
+    def quota(self, account: dict) -> int:
+        return int(account.get("DAILY_QUOTA", self.default_quota))
+
+    def _expire(self, user: str, now: float) -> None:
+        sent = self._sent[user]
+        while sent and sent[0] <= now - self.window:
+            sent.popleft()
+
+    def _remaining(self, account: dict, now: float) -> int:
+        user = account["EMAIL_USER"]
+        self._expire(user, now)
+        return max(0, self.quota(account) - len(self._sent[user]))
+
+    def remaining(self, account: dict) -> int:
+        with self._cond:
+            return self._remaining(account, self.clock.time())
+
+    def _usable(self, account: dict, now: float) -> bool:
+        user = account["EMAIL_USER"]
+        return (self._unhealthy_until[user] <= now and self._breakers[user].allow(now)
+                and self._remaining(account, now) > 0)
+
+    def _capacity_at(self, account: dict, now: float) -> Optional[float]:
+        """When an unusable account may send again; None if it never will"""
+        user = account["EMAIL_USER"]
+        at = max(self._unhealthy_until[user], self._breakers[user].open_until)
+        if self._remaining(account, now) == 0:
+            sent = self._sent[user]
+            # One slot frees up when the send that filled the quota leaves the window
+            index = len(sent) - self.quota(account)
+            if not 0 <= index < len(sent):
+                return None
+            at = max(at, sent[index] + self.window)
+        return at
+
+    def _rest(self, user: str, now: float, not_before: float = 0.0) -> None:
+        at = self._capacity_at(self._by_user[user], now)
+        heapq.heappush(self._resting, (float("inf") if at is None else max(at, not_before), user))
+
+    def _next(self, now: float) -> Tuple[Optional[dict], Optional[float], bool]:
+        """(leased account, None, False) or (None, when to look again, whether the pool is out of capacity).
+
+        When to look again is None if only a release can free an account, or, when out of capacity,
+        if no capacity is coming back.
+        """
+        while self._pacing and self._pacing[0][0] <= now:
+            self._idle.add(heapq.heappop(self._pacing)[1])
+        while self._resting and self._resting[0][0] <= now:
+            self._idle.add(heapq.heappop(self._resting)[1])
+
+        best, best_key = None, None
+        cutoff = now - self.window
+        for user in list(self._idle):
+            account = self._by_user[user]
+            sent = self._sent[user]
+            while sent and sent[0] <= cutoff:
+                sent.popleft()
+            remaining = self._quotas[user] - len(sent)
+            if remaining < 0:
+                remaining = 0
+            if not remaining or self._unhealthy_until[user] > now or not self._breakers[user].allow(now):
+                self._idle.discard(user)
+                self._rest(user, now)
+                continue
+            key = (remaining, -self._order[user])
+            if best_key is None or key > best_key:
+                best, best_key = account, key
+        if best is not None:
+            self._idle.discard(best["EMAIL_USER"])
+            self._leased.add(best["EMAIL_USER"])
+            return best, None, False
+
+        # Accounts that ran out while pacing rest instead, so the heap top is the next usable one
+        while self._pacing and not self._usable(self._by_user[self._pacing[0][1]], now):
+            ready_at, user = heapq.heappop(self._pacing)
+            self._rest(user, now, ready_at)
+        if self._pacing:
+            return None, self._pacing[0][0], False
+        if any(self._usable(self._by_user[user], now) for user in self._leased):
+            return None, None, False
+        # Capacity came back for an account that is still resting out its pacing delay
+        waits = [at for at, user in self._resting if self._usable(self._by_user[user], now)]
+        if waits:
+            return None, min(waits), False
+        return None, self.capacity_returns_at(), True
+
+    def try_acquire(self) -> Tuple[Optional[dict], Optional[float], bool]:
+        """acquire() without waiting; see _next()"""
+        with self._cond:
+            return self._next(self.clock.time())
+
+    def acquire(
+        self,
+        stop_event: Optional[threading.Event] = None,
+        wait_for_capacity: bool = False,
+        max_wait: float = 0
+    ) -> Optional[dict]:
+        """Lease the healthy, idle account with the most remaining quota.
+
+        Waits while accounts are only pacing or leased. Returns None when the whole pool is out of
+        quota or resting (or stop_event is set), unless capacity returns within max_wait seconds or
+        wait_for_capacity is set, in which case it pauses until then.
+        """
+        paused = False
+        with self._cond:
+            while stop_event is None or not stop_event.is_set():
+                now = self.clock.time()
+                account, wake_at, exhausted = self._next(now)
+                if account is not None:
+                    return account
+                if exhausted:
+                    if wake_at is None or (not wait_for_capacity and wake_at - now > max_wait):
+                        return None
+                    if not paused:
+                        paused = True
+                        print(f"⏸ Account pool exhausted. Pausing until "
+                              f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(wake_at))}")
+                    self._cond.wait(timeout=min(max(wake_at - now, 0.1), 60))
+                    continue
+                self._cond.wait(timeout=min(max(wake_at - now, 0.01), 0.5) if wake_at is not None else 0.5)
+        return None
+
+    def release(self, account: dict, sent: bool, delay: Optional[float] = None, soft_error: bool = False) -> float:
+        """Return a leased account and the pause before its next send; a successful send counts against its quota.
+
+        Without an explicit delay the account's adaptive pacer decides when it may send again.
+        soft_error marks a failure that was the account's or server's fault (4xx, dropped connection).
+        """
+        user = account["EMAIL_USER"]
+        now = self.clock.time()
+        with self._cond:
+            pacer = self._pacers[user]
+            if sent:
+                self._sent[user].append(now)
+                self._conn.execute("INSERT INTO account_sends (account, sent_at) VALUES (?, ?)", (user, now))
+                self._conn.commit()
+                self._breakers[user].record_success()
+                pacer.on_success()
+            elif soft_error:
+                pacer.on_soft_error()
+                if self._breakers[user].record_failure():
+                    until = time.strftime('%H:%M', time.localtime(self._breakers[user].open_until))
+                    print(f"⚡ Too many failures on {user}; resting it until {until}")
+            if delay is None:
+                delay = pacer.next_delay()
+            self._leased.discard(user)
+            heapq.heappush(self._pacing, (now + delay, user))
+            self._cond.notify_all()
+            return delay
+
+    def mark_unhealthy(self, account: dict, duration: Optional[float] = None) -> None:
+        """Take an account out of rotation (e.g. the provider reported its limit was exceeded)"""
+        with self._cond:
+            self._unhealthy_until[account["EMAIL_USER"]] = self.clock.time() + (duration or self.window)
+            self._cond.notify_all()
+
+    def capacity_returns_at(self) -> Optional[float]:
+        """Earliest time an account that is out of quota or unhealthy gets capacity back"""
+        with self._cond:
+            now = self.clock.time()
+            times = []
+            for account in self.accounts:
+                if not self._usable(account, now):
+                    at = self._capacity_at(account, now)
+                    if at is not None:
+                        times.append(at)
+            return min(times) if times else None
+
+    def forecast(self, pending: int, mean_delay: float) -> dict:
+        """Predict how far the pool gets through `pending` sends at the current pacing"""
+        with self._cond:
+            now = self.clock.time()
+            usable = [a for a in self.accounts if self._usable(a, now)]
+            capacity = sum(self._remaining(a, now) for a in usable)
+            rate = len(usable) / mean_delay if mean_delay > 0 else float("inf")
+            sendable = min(pending, capacity)
+            finish_at = now + sendable / rate if rate and rate != float("inf") else now
+            return {
+                "pending": pending,
+                "capacity": capacity,
+                "accounts_available": len(usable),
+                "runs_out": pending > capacity,
+                "finish_at": finish_at,
+                "capacity_returns_at": (self.capacity_returns_at() or now + self.window) if pending > capacity else None,
+            }
+
+    def close(self) -> None:
+        with self._cond:
+            self._conn.close()
@@ -0,0 +1,202 @@
+import re
+import socket
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Protocol
+
+from recipient_ingest import normalize_email
+
+try:
+    import dns.resolver
+    import dns.exception
+except ImportError:  # dnspython is optional; fall back to the system resolver
+    dns = None
+
+# Pragmatic subset of RFC 5322: dot-atom local part and a dotted domain with a letter TLD
+EMAIL_RE = re.compile(
+    r"^[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,63}$"
+)
+
+DISPOSABLE_DOMAINS = {
+    "10minutemail.com", "guerrillamail.com", "guerrillamail.net", "mailinator.com",
+    "maildrop.cc", "sharklasers.com", "temp-mail.org", "tempmail.com", "throwawaymail.com",
+    "trashmail.com", "yopmail.com", "getnada.com", "dispostable.com", "fakeinbox.com",
+}
+
+INVALID_SYNTAX = "invalid_syntax"
+DISPOSABLE = "disposable_domain"
+NO_MAIL_HOST = "undeliverable_domain"
+
+
+class DomainResolver(Protocol):
+    """Answers whether a domain can receive mail"""
+
+    def has_mail_host(self, domain: str) -> bool: ...
+
+
+class DNSResolver:
+    """MX lookup via dnspython, with an A/AAAA lookup (implicit MX) for domains without MX records.
+
+    Without dnspython only the A/AAAA lookup is possible, and a domain without one may still have MX
+    records, so a negative answer then counts as unknown and the address is accepted.
+    """
+
+    def __init__(self, timeout: float = 5.0):
+        self.timeout = timeout
+
+    def has_mail_host(self, domain: str) -> bool:
+        mx_checked = False
+        if dns is not None:
+            try:
+                answers = dns.resolver.resolve(domain, "MX", lifetime=self.timeout)
+                # A single "." exchange is a null MX (RFC 7505): the domain accepts no mail
+                return any(str(r.exchange) not in (".", "") for r in answers)
+            except (dns.resolver.NXDOMAIN, dns.resolver.NoNameservers):
+                return False
+            except dns.resolver.NoAnswer:
+                mx_checked = True
+            except dns.exception.DNSException:
+                # Timeouts are not proof the domain is dead
+                return True
+        try:
+            socket.getaddrinfo(domain, 25, proto=socket.IPPROTO_TCP)
+            return True
+        except socket.gaierror as e:
+            if not mx_checked:
+                return True
+            return e.errno not in (socket.EAI_NONAME, getattr(socket, "EAI_NODATA", socket.EAI_NONAME))
+        except OSError:
+            return True
+
+
+class StubResolver:
+    """Fixed answers for offline runs and tests; unknown domains use the default"""
+
+    def __init__(self, answers: Optional[Dict[str, bool]] = None, default: bool = True):
+        self.answers = answers or {}
+        self.default = default
+        self.lookups = 0
+
+    def has_mail_host(self, domain: str) -> bool:
+        self.lookups += 1
+        return self.answers.get(domain, self.default)
+
+
+class CachingResolver:
+    """Thread-safe LRU + TTL cache in front of another resolver"""
+
+    def __init__(self, resolver: DomainResolver, maxsize: int = 100_000, ttl: float = 6 * 3600):
+        self.resolver = resolver
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached(self, domain: str) -> Optional[bool]:
+        with self._lock:
+            entry = self._cache.get(domain)
+            if entry is None:
+                return None
+            result, expires = entry
+            if expires < time.monotonic():
+                del self._cache[domain]
+                return None
+            self._cache.move_to_end(domain)
+            return result
+
+    def has_mail_host(self, domain: str) -> bool:
+        result = self.cached(domain)
+        if result is not None:
+            return result
+        result = self.resolver.has_mail_host(domain)
+        with self._lock:
+            self._cache[domain] = (result, time.monotonic() + self.ttl)
+            self._cache.move_to_end(domain)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return result
+
+
+class AddressValidator:
+    """Pre-flight checks run on recipients before they reach SMTP"""
+
+    def __init__(
+        self,
+        resolver: Optional[DomainResolver] = None,
+        disposable_domains: Optional[Iterable[str]] = None,
+        check_domains: bool = True,
+        workers: int = 16
+    ):
+        self.resolver = resolver if isinstance(resolver, CachingResolver) \
+            else CachingResolver(resolver or DNSResolver())
+        self.disposable_domains = set(disposable_domains) if disposable_domains is not None \
+            else set(DISPOSABLE_DOMAINS)
+        self.check_domains = check_domains
+        self.workers = workers
+        self.rejections: Counter = Counter()
+
+    @staticmethod
+    def load_domain_list(path: str) -> List[str]:
+        with open(path, encoding='utf-8') as f:
+            return [line.strip().lower() for line in f if line.strip() and not line.startswith("#")]
+
+    def _offline_reason(self, email: str) -> Optional[str]:
+        if len(email) > 254 or not EMAIL_RE.match(email):
+            return INVALID_SYNTAX
+        if email.rpartition("@")[2] in self.disposable_domains:
+            return DISPOSABLE
+        return None
+
+    def check(self, email: str) -> Optional[str]:
+        """Rejection reason for one address, or None if it looks deliverable"""
+        email = normalize_email(email)
+        reason = self._offline_reason(email)
+        if reason is None and self.check_domains:
+            if not self.resolver.has_mail_host(email.rpartition("@")[2]):
+                reason = NO_MAIL_HOST
+        return reason
+
+    def filter(self, emails: Iterable, chunk_size: int = 500, key=None) -> Iterator:
+        """Yield deliverable-looking addresses; domains in each chunk are resolved in parallel, once each.
+
+        With key, filters any items (e.g. CSV rows) by the address key(item) returns and yields the items.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            chunk: List[tuple] = []
+            for item in emails:
+                email = normalize_email(key(item) if key is not None else item)
+                chunk.append((email, item if key is not None else email))
+                if len(chunk) >= chunk_size:
+                    yield from self._filter_chunk(chunk, executor)
+                    chunk = []
+            if chunk:
+                yield from self._filter_chunk(chunk, executor)
+
+    def _filter_chunk(self, chunk: List[tuple], executor: ThreadPoolExecutor) -> Iterator:
+        candidates = []
+        for email, item in chunk:
+            reason = self._offline_reason(email)
+            if reason is None:
+                candidates.append((email, item))
+            else:
+                self.rejections[reason] += 1
+
+        if self.check_domains:
+            domains = {email.rpartition("@")[2] for email, _ in candidates}
+            unknown = [d for d in domains if self.resolver.cached(d) is None]
+            list(executor.map(self.resolver.has_mail_host, unknown))
+
+        for email, item in candidates:
+            if self.check_domains and not self.resolver.has_mail_host(email.rpartition("@")[2]):
+                self.rejections[NO_MAIL_HOST] += 1
+                continue
+            yield item
+
+    def summary(self) -> str:
+        if not self.rejections:
+            return "Address validation: no addresses rejected"
+        details = ", ".join(f"{count} {reason}" for reason, count in self.rejections.most_common())
+        return f"Address validation rejected {sum(self.rejections.values())}: {details}"
@@ -0,0 +1,399 @@
+import asyncio
+import base64
+import re
+import smtplib
+import socket
+import ssl
+import threading
+import time
+from email.utils import getaddresses
+from typing import Dict, Optional, Sequence, Tuple
+
+from metrics import registry as metrics
+
+CRLF = b"\r\n"
+_LINE_ENDINGS = re.compile(rb"\r\n|\r|\n")
+_LEADING_DOT = re.compile(rb"^\.", re.M)
+
+
+def prepare_data(data) -> bytes:
+    """Message bytes as DATA expects them: CRLF line endings, leading dots doubled, ending in CRLF.CRLF"""
+    data = _LINE_ENDINGS.sub(CRLF, bytes(data))
+    data = _LEADING_DOT.sub(b"..", data)
+    if not data.endswith(CRLF):
+        data += CRLF
+    return data + b"." + CRLF
+
+
+class StaleSession(smtplib.SMTPServerDisconnected):
+    """A pooled session turned out to be closed before the server took any part of the message"""
+
+
+class SessionTimeout(smtplib.SMTPServerDisconnected):
+    """The server stopped answering within the timeout; the session is closed, like a dropped one"""
+
+
+class AsyncSMTP:
+    """One ESMTP client session on asyncio streams.
+
+    Capabilities come from EHLO (HELO if the server doesn't speak ESMTP). With PIPELINING (RFC 2920)
+    the envelope and DATA go out in one write, so a message costs two round trips instead of
+    three plus one per recipient; without it commands are sent lock-step like smtplib. Failures
+    raise the same smtplib exceptions, so callers classify them the same way.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = 30, local_hostname: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.local_hostname = local_hostname or socket.getfqdn()
+        self.esmtp = False
+        self.capabilities: Dict[str, str] = {}
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    @property
+    def pipelining(self) -> bool:
+        return "pipelining" in self.capabilities
+
+    async def connect(self) -> None:
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout
+            )
+        except asyncio.TimeoutError:
+            raise smtplib.SMTPConnectError(-1, b"timed out connecting") from None
+        code, message = await self._read_reply()
+        if code != 220:
+            self.close()
+            raise smtplib.SMTPConnectError(code, message)
+        await self.ehlo()
+
+    async def _read_reply(self) -> Tuple[int, bytes]:
+        if self._writer is None:
+            raise smtplib.SMTPServerDisconnected("please run connect() first")
+        lines = []
+        while True:
+            try:
+                line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+            except asyncio.TimeoutError:
+                # The conversation is out of step now; the session can't be reused
+                self.close()
+                raise SessionTimeout(f"No reply within {self.timeout}s") from None
+            except (ConnectionError, ssl.SSLError) as e:
+                self.close()
+                raise smtplib.SMTPServerDisconnected(f"Connection lost: {e}") from None
+            if not line:
+                self.close()
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            try:
+                code = int(line[:3])
+            except ValueError:
+                self.close()
+                raise smtplib.SMTPServerDisconnected(f"Malformed reply: {line[:100]!r}") from None
+            lines.append(line[4:].rstrip(b"\r\n"))
+            if line[3:4] != b"-":
+                return code, b"\n".join(lines)
+
+    async def _write(self, data: bytes) -> None:
+        if self._writer is None:
+            raise smtplib.SMTPServerDisconnected("please run connect() first")
+        try:
+            self._writer.write(data)
+            await asyncio.wait_for(self._writer.drain(), self.timeout)
+        except asyncio.TimeoutError:
+            self.close()
+            raise SessionTimeout(f"Write not accepted within {self.timeout}s") from None
+        except (ConnectionError, ssl.SSLError) as e:
+            self.close()
+            raise smtplib.SMTPServerDisconnected(f"Connection lost: {e}") from None
+
+    async def command(self, line: str) -> Tuple[int, bytes]:
+        await self._write(line.encode("ascii") + CRLF)
+        return await self._read_reply()
+
+    async def ehlo(self) -> None:
+        code, message = await self.command(f"EHLO {self.local_hostname}")
+        if code != 250:
+            # Not an ESMTP server: no extensions, everything lock-step
+            code, message = await self.command(f"HELO {self.local_hostname}")
+            if code != 250:
+                raise smtplib.SMTPHeloError(code, message)
+            self.esmtp = False
+            self.capabilities = {}
+            return
+        self.esmtp = True
+        self.capabilities = {}
+        for line in message.decode("latin-1").split("\n")[1:]:
+            keyword, _, params = line.partition(" ")
+            self.capabilities[keyword.lower()] = params.strip()
+
+    async def starttls(self, context: Optional[ssl.SSLContext] = None) -> None:
+        if "starttls" not in self.capabilities:
+            raise smtplib.SMTPNotSupportedError("STARTTLS extension not supported by server.")
+        code, message = await self.command("STARTTLS")
+        if code != 220:
+            raise smtplib.SMTPResponseException(code, message)
+        context = context or ssl.create_default_context()
+        if hasattr(self._writer, "start_tls"):
+            upgrade = self._writer.start_tls(context, server_hostname=self.host)
+        else:
+            upgrade = self._start_tls_on_loop(context)
+        try:
+            await asyncio.wait_for(upgrade, self.timeout)
+        except asyncio.TimeoutError:
+            self.close()
+            raise SessionTimeout(f"TLS handshake not finished within {self.timeout}s") from None
+        # Capabilities may differ once encrypted (RFC 3207)
+        await self.ehlo()
+
+    async def _start_tls_on_loop(self, context: ssl.SSLContext) -> None:
+        # StreamWriter.start_tls is Python 3.11+; before that, upgrade the transport and swap it into the
+        # writer the way 3.11 does (a second writer would close the raw transport when the first is collected)
+        loop = asyncio.get_running_loop()
+        protocol = self._writer.transport.get_protocol()
+        transport = await loop.start_tls(self._writer.transport, protocol, context, server_hostname=self.host)
+        self._writer._transport = transport
+        protocol._over_ssl = True
+
+    async def login(self, user: str, password: str) -> None:
+        mechanisms = self.capabilities.get("auth", "").upper().split()
+        if not mechanisms:
+            raise smtplib.SMTPNotSupportedError("SMTP AUTH extension not supported by server.")
+        if "PLAIN" in mechanisms:
+            token = base64.b64encode(f"\0{user}\0{password}".encode("utf-8")).decode("ascii")
+            code, message = await self.command(f"AUTH PLAIN {token}")
+        elif "LOGIN" in mechanisms:
+            code, message = await self.command(f"AUTH LOGIN {base64.b64encode(user.encode('utf-8')).decode('ascii')}")
+            if code == 334:
+                code, message = await self.command(base64.b64encode(password.encode("utf-8")).decode("ascii"))
+        else:
+            raise smtplib.SMTPException("No suitable authentication method found.")
+        if code not in (235, 503):
+            raise smtplib.SMTPAuthenticationError(code, message)
+
+    async def noop(self) -> int:
+        return (await self.command("NOOP"))[0]
+
+    async def rset(self) -> None:
+        try:
+            await self.command("RSET")
+        except smtplib.SMTPServerDisconnected:
+            pass
+
+    def _mail_options(self, data: bytes) -> str:
+        options = ""
+        if "size" in self.capabilities:
+            options += f" SIZE={len(data)}"
+        if "8bitmime" in self.capabilities and any(b > 127 for b in data[:65536]):
+            options += " BODY=8BITMIME"
+        return options
+
+    async def sendmail(self, from_addr: str, to_addrs: Sequence[str], data) -> Dict[str, Tuple[int, bytes]]:
+        """Send one message; returns refused recipients like smtplib.SMTP.sendmail"""
+        data = prepare_data(data)
+        envelope = [f"MAIL FROM:<{from_addr}>{self._mail_options(data)}"] + [f"RCPT TO:<{a}>" for a in to_addrs]
+        if self.pipelining:
+            await self._write(b"".join(line.encode("ascii") + CRLF for line in envelope + ["DATA"]))
+            replies = []
+            for i in range(len(envelope) + 1):
+                try:
+                    replies.append(await self._read_reply())
+                except smtplib.SMTPServerDisconnected as e:
+                    if i == 0 and not isinstance(e, SessionTimeout):
+                        # Nothing was answered, so nothing was accepted: safe to resend on a new session
+                        raise StaleSession(str(e)) from None
+                    raise
+            (mail_code, mail_message), rcpt_replies, (data_code, data_message) = replies[0], replies[1:-1], replies[-1]
+        else:
+            try:
+                mail_code, mail_message = await self.command(envelope[0])
+            except SessionTimeout:
+                # A slow server, not a closed pooled session: resending would only wait again
+                raise
+            except smtplib.SMTPServerDisconnected as e:
+                raise StaleSession(str(e)) from None
+            rcpt_replies = []
+            if mail_code == 250:
+                for line in envelope[1:]:
+                    rcpt_replies.append(await self.command(line))
+            data_code, data_message = None, b""
+
+        refused = {a: reply for a, reply in zip(to_addrs, rcpt_replies) if reply[0] not in (250, 251)}
+        failure = None
+        if mail_code != 250:
+            failure = smtplib.SMTPSenderRefused(mail_code, mail_message, from_addr)
+        elif len(refused) == len(to_addrs):
+            failure = smtplib.SMTPRecipientsRefused(refused)
+        elif data_code is None:
+            data_code, data_message = await self.command("DATA")
+        if failure is None and data_code != 354:
+            failure = smtplib.SMTPDataError(data_code, data_message)
+        if failure is not None:
+            if data_code == 354:
+                # A pipelined DATA was accepted after all; end it empty so the session stays usable
+                await self._write(b"." + CRLF)
+                await self._read_reply()
+            await self._reset_after(failure)
+            raise failure
+
+        await self._write(data)
+        code, message = await self._read_reply()
+        if code != 250:
+            failure = smtplib.SMTPDataError(code, message)
+            await self._reset_after(failure)
+            raise failure
+        return refused
+
+    async def _reset_after(self, failure: smtplib.SMTPException) -> None:
+        if getattr(failure, "smtp_code", None) == 421 or (
+            isinstance(failure, smtplib.SMTPRecipientsRefused)
+            and any(code == 421 for code, _ in failure.recipients.values())
+        ):
+            # The server is closing the session
+            self.close()
+        else:
+            await self.rset()
+
+    async def quit(self) -> None:
+        try:
+            await self.command("QUIT")
+        except (smtplib.SMTPException, OSError):
+            pass
+        self.close()
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+
+class AsyncSMTPPool:
+    """Drop-in replacement for SMTPConnectionPool on one asyncio event loop.
+
+    Sessions (one per account) live on a background event loop thread, so a single thread can keep
+    hundreds of them open. Blocking callers use sendmail(); coroutines can await sendmail_async().
+    Pooled sessions aren't probed with NOOP before each send; a session found closed is replaced
+    and the message resent, which is safe because the server had not answered any of it.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        idle_timeout: float = 300,
+        timeout: float = 30,
+        tls_context: Optional[ssl.SSLContext] = None
+    ):
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.tls_context = tls_context
+        self._sessions: Dict[str, Tuple[AsyncSMTP, float]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="smtp-event-loop", daemon=True).start()
+            return self._loop
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def _connect(self, account: dict) -> AsyncSMTP:
+        user = account["EMAIL_USER"]
+        session = AsyncSMTP(self.host, self.port, timeout=self.timeout)
+        with metrics.timer("smtp_connect", user):
+            await session.connect()
+        try:
+            with metrics.timer("smtp_starttls", user):
+                await session.starttls(self.tls_context)
+            with metrics.timer("smtp_auth", user):
+                await session.login(user, account["EMAIL_PASS"])
+        except Exception:
+            await session.quit()
+            raise
+        return session
+
+    async def _session(self, account: dict) -> AsyncSMTP:
+        entry = self._sessions.pop(account["EMAIL_USER"], None)
+        if entry is not None and entry[0].connected:
+            session = entry[0]
+        else:
+            session = await self._connect(account)
+        self._sessions[account["EMAIL_USER"]] = (session, time.monotonic())
+        return session
+
+    async def sendmail_async(self, account: dict, from_addr: str, to_addrs: Sequence[str], data) -> Dict:
+        user = account["EMAIL_USER"]
+        lock = self._locks.setdefault(user, asyncio.Lock())
+        async with lock:
+            await self._close_idle()
+            for attempt in range(2):
+                with metrics.timer("smtp_session", user):
+                    session = await self._session(account)
+                try:
+                    with metrics.timer("smtp_data", user) as timer:
+                        refused = await session.sendmail(from_addr, to_addrs, data)
+                        timer.code = "250"
+                except StaleSession:
+                    self._sessions.pop(user, None)
+                    session.close()
+                    if attempt:
+                        raise
+                    continue
+                except smtplib.SMTPServerDisconnected:
+                    self._sessions.pop(user, None)
+                    raise
+                self._sessions[user] = (session, time.monotonic())
+                return refused
+
+    def sendmail(self, account: dict, from_addr: str, to_addrs, data) -> Dict:
+        """Send pre-rendered message bytes through the account's pooled session"""
+        return self._call(self.sendmail_async(account, from_addr, to_addrs, data))
+
+    def send(self, account: dict, msg) -> Dict:
+        """Send an email.message.Message through the account's pooled session"""
+        from_addr = getaddresses(msg.get_all("Sender") or msg.get_all("From") or [])[0][1]
+        to_addrs = [a for _, a in getaddresses(msg.get_all("To", []) + msg.get_all("Cc", []) + msg.get_all("Bcc", []))]
+        del msg["Bcc"]
+        return self.sendmail(account, from_addr, to_addrs, msg.as_bytes())
+
+    async def _invalidate(self, user: str) -> None:
+        entry = self._sessions.pop(user, None)
+        if entry is not None:
+            await entry[0].quit()
+
+    def invalidate(self, account: dict) -> None:
+        """Drop the pooled session for an account (e.g. after an auth or limit error)"""
+        if self._loop is not None:
+            self._call(self._invalidate(account["EMAIL_USER"]))
+
+    async def _close_idle(self) -> None:
+        now = time.monotonic()
+        stale = [user for user, (_, last_used) in self._sessions.items() if now - last_used > self.idle_timeout]
+        for user in stale:
+            await self._invalidate(user)
+
+    def close_idle(self) -> None:
+        """Close sessions that have not been used within idle_timeout seconds"""
+        if self._loop is not None:
+            self._call(self._close_idle())
+
+    async def _close_all(self) -> None:
+        users = list(self._sessions)
+        await asyncio.gather(*(self._invalidate(user) for user in users), return_exceptions=True)
+
+    def close_all(self) -> None:
+        if self._loop is not None:
+            self._call(self._close_all())
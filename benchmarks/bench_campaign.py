@@ -0,0 +1,217 @@
+"""End-to-end campaign benchmark: main.run() against the local SMTP sink with pacing disabled.
+
+With --campaigns N the recipients are split across N campaigns sent together by multi_campaign.py,
+to compare its throughput with a single campaign's and check each campaign's share of the sends.
+
+Each campaign size runs in a fresh process with its own temp directory (ledger, suppression index,
+usage DB, logs, outbox), so peak RSS and CPU time are per run and nothing touches the real state.
+Recipients and injected failures are seeded, so runs are reproducible.
+
+Example:
+    python benchmarks/bench_campaign.py --sizes 1000 10000 100000 --accounts 8 --rtt-ms 1 --fail-450 0.01
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from smtp_sink import SinkConfig, start_sink_process
+
+
+def write_recipients(path: str, count: int, seed: int) -> None:
+    """Synthetic vendor CSV; ~1% duplicates like a real export"""
+    rng = random.Random(seed)
+    domains = [f"vendor{i}.example.com" for i in range(500)]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Full Name", "Email", "Company"])
+        for i in range(count):
+            n = rng.randrange(i) if i and rng.random() < 0.01 else i
+            writer.writerow([f"Recruiter {n}", f"recruiter{n}@{domains[n % len(domains)]}", f"Vendor {n % 500}"])
+
+
+def split_recipients(path: str, parts: int) -> list:
+    """Deal the rows of a recipient CSV round-robin into `parts` files; returns their paths"""
+    paths = [f"vendors_{part}.csv" for part in range(parts)]
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    for part, part_path in enumerate(paths):
+        with open(part_path, "w", newline="") as f:
+            csv.writer(f).writerows([rows[0]] + rows[1 + part::parts])
+    return paths
+
+
+def write_accounts(path: str, count: int, quota: int) -> None:
+    accounts = [{"EMAIL_USER": f"sender{i}@example.com", "EMAIL_PASS": "secret", "DAILY_QUOTA": quota}
+                for i in range(count)]
+    with open(path, "w") as f:
+        json.dump(accounts, f)
+
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_campaign(args, size: int) -> dict:
+    """Runs in the child process: set up an isolated campaign and drive main.run()"""
+    workdir = tempfile.mkdtemp(prefix="bench_campaign_")
+    os.chdir(workdir)
+    write_recipients("vendors.csv", size, args.seed)
+    write_accounts("accounts.json", args.accounts, quota=size * 2)
+    if args.attachment_kb:
+        with open("resume.pdf", "wb") as f:
+            f.write(random.Random(args.seed).randbytes(args.attachment_kb * 1024))
+
+    sink, port, accepted = start_sink_process(SinkConfig(
+        args.rtt_ms, args.data_ms, args.fail_421, args.fail_450, args.fail_550, tls=not args.no_tls,
+        pipelining=not args.no_pipelining, seed=args.seed
+    ))
+
+    # Everything main.py reads at import time points into the temp dir; the WBL API is unreachable
+    os.environ.update({
+        "EMAIL_ACCOUNTS_FILE": "accounts.json", "SMTP_SERVER": "127.0.0.1", "SMTP_PORT": str(port),
+        "VENDOR_CSV_FILES": "vendors.csv", "CAMPAIGN_ID": f"bench-{size}",
+        "SEND_LEDGER_DB": "send_ledger.db", "SUPPRESSION_DB": "suppression.db",
+        "ACCOUNT_USAGE_DB": "account_usage.db", "ACTIVITY_OUTBOX_DIR": "activity_outbox",
+        "VALIDATE_DOMAINS": "0", "MAX_CONCURRENCY": str(args.accounts),
+        "RETRY_BASE_DELAY": str(args.retry_base_delay), "RETRY_WAIT_LIMIT": "60",
+        "SPOOL_DIR": "spool" if args.spool else "", "DOMAIN_RATE_PER_MINUTE": str(args.domain_rate),
+        "SMTP_TRANSPORT": args.transport, "SMTP_TLS_VERIFY": "0",
+        "WBL_API_URL": "http://127.0.0.1:9/api", "WBL_API_TOKEN": "", "WBL_EMAIL": "", "WBL_PASSWORD": "",
+    })
+    import main
+
+    main.SEND_DELAY_RANGE = (0, 0)
+    main.RESUME_PATH = "resume.pdf"
+    latencies = array("d")
+    send_email = main.send_email
+
+    def timed_send_email(to_email, account, data=None, context=None, template=None):
+        started = time.perf_counter()
+        try:
+            return send_email(to_email, account, data, context, template)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    main.send_email = timed_send_email
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    started = time.perf_counter()
+    # Logging as in production, minus the per-recipient console lines that would dominate at these rates
+    listener = main.start_logging("logs", quiet=True)
+    campaign_ids = [f"bench-{size}"]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        if args.campaigns > 1:
+            import multi_campaign
+
+            weights = args.weights or [1] * args.campaigns
+            campaigns = [
+                main.Campaign(f"bench-{size}-{part}", main.subject, main.text_body, main.RESUME_PATH, csv_path,
+                              candidate_id=part + 1, weight=weights[part % len(weights)])
+                for part, csv_path in enumerate(split_recipients("vendors.csv", args.campaigns))
+            ]
+            campaign_ids = [c.campaign_id for c in campaigns]
+            multi_campaign.run_campaigns(campaigns)
+        else:
+            main.run()
+    listener.stop()
+    elapsed = time.perf_counter() - started
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    sink.terminate()
+    ledger = main.SendLedger("send_ledger.db")
+    per_campaign = {campaign_id: dict(ledger.counts(campaign_id)) for campaign_id in campaign_ids}
+    ledger.close()
+    counts = {}
+    for campaign_counts in per_campaign.values():
+        for status, count in campaign_counts.items():
+            counts[status] = counts.get(status, 0) + count
+    if not args.keep:
+        os.chdir(tempfile.gettempdir())
+        shutil.rmtree(workdir, ignore_errors=True)
+    ordered = sorted(latencies)
+    sent = counts.get(main.SENT, 0)
+    return {
+        "recipients": size,
+        "sent": sent,
+        "failed": counts.get(main.FAILED, 0),
+        "deferred": counts.get(main.DEFERRED, 0),
+        "accepted_by_sink": accepted.value,
+        "seconds": round(elapsed, 3),
+        "msgs_per_sec": round(sent / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "cpu_seconds": round((usage.ru_utime + usage.ru_stime)
+                             - (usage_before.ru_utime + usage_before.ru_stime), 3),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),  # ru_maxrss is KiB on Linux
+        "campaign_sent": {campaign_id: c.get(main.SENT, 0) for campaign_id, c in per_campaign.items()},
+        "workdir": workdir if args.keep else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--accounts", type=int, default=8)
+    parser.add_argument("--rtt-ms", type=float, default=0, help="sink round trip: each reply waits this long after its command")
+    parser.add_argument("--data-ms", type=float, default=0, help="extra sink delay after DATA")
+    parser.add_argument("--fail-421", type=float, default=0)
+    parser.add_argument("--fail-450", type=float, default=0)
+    parser.add_argument("--fail-550", type=float, default=0, help="injected as 550 5.1.1 user unknown")
+    parser.add_argument("--no-tls", action="store_true")
+    parser.add_argument("--no-pipelining", action="store_true", help="sink doesn't advertise PIPELINING")
+    parser.add_argument("--transport", choices=["smtplib", "async"], default="smtplib")
+    parser.add_argument("--attachment-kb", type=int, default=0)
+    parser.add_argument("--spool", action="store_true", help="render into an on-disk spool ahead of sending")
+    parser.add_argument("--domain-rate", type=float, default=0, help="sends per minute per recipient domain (0 = unlimited)")
+    parser.add_argument("--retry-base-delay", type=float, default=0.5)
+    parser.add_argument("--campaigns", type=int, default=1, help="split the recipients across this many campaigns")
+    parser.add_argument("--weights", type=float, nargs="+", help="fair-share weight of each campaign (default equal)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="keep each run's temp dir (ledger, logs) for inspection")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        result = run_campaign(args, args.child)
+        sys.__stdout__.write(json.dumps(result) + "\n")
+        return
+
+    results = []
+    print(f"{'recipients':>10} {'sent':>9} {'failed':>7} {'msg/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'cpu s':>8} {'rss MB':>8}")
+    for size in args.sizes:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--child", str(size)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{result['recipients']:>10} {result['sent']:>9} {result['failed']:>7} {result['msgs_per_sec']:>9} "
+              f"{result['p50_ms']:>8} {result['p99_ms']:>8} {result['cpu_seconds']:>8} {result['peak_rss_mb']:>8}")
+        if args.campaigns > 1:
+            print("           sent per campaign: " + ", ".join(
+                f"{campaign_id} {sent}" for campaign_id, sent in result["campaign_sent"].items()))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "python": sys.version.split()[0], "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
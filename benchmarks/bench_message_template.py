@@ -0,0 +1,69 @@
+"""Messages rendered per second: per-send MIME rebuild vs. pre-built MessageTemplate.
+
+Usage: python benchmarks/bench_message_template.py [--count 2000] [--attachment-kb 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_template import MessageTemplate  # noqa: E402
+
+SUBJECT = "AI Engineer | USC "
+BODY = "Hi,\n\nI'm an AI Engineer with experience building production-grade systems.\n" * 20
+FROM_HEADER = "Sender <sender@example.com>"
+REPLY_TO = "reply@example.com"
+
+
+def render_legacy(to_email, attachment_path):
+    """What send_email did before: rebuild the MIME tree and re-read the PDF per recipient"""
+    msg = MIMEMultipart()
+    msg["Subject"] = SUBJECT
+    msg["From"] = FROM_HEADER
+    msg["To"] = to_email
+    msg["Reply-To"] = REPLY_TO
+    msg.attach(MIMEText(BODY, "plain"))
+    if os.path.exists(attachment_path):
+        with open(attachment_path, "rb") as f:
+            part = MIMEApplication(f.read(), Name=os.path.basename(attachment_path))
+        part['Content-Disposition'] = f'attachment; filename="{os.path.basename(attachment_path)}"'
+        msg.attach(part)
+    return msg.as_bytes()
+
+
+def measure(label, fn, count):
+    start = time.perf_counter()
+    for i in range(count):
+        fn(f"vendor{i}@example.com")
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed
+    print(f"{label:<10} {count} messages in {elapsed:.3f}s  ->  {rate:,.0f} msg/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--attachment-kb", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        attachment_path = os.path.join(tmp, "resume.pdf")
+        with open(attachment_path, "wb") as f:
+            f.write(os.urandom(args.attachment_kb * 1024))
+
+        legacy = measure("legacy", lambda to: render_legacy(to, attachment_path), args.count)
+        template = MessageTemplate(SUBJECT, BODY, FROM_HEADER, REPLY_TO, attachment_path)
+        prebuilt = measure("template", template.render, args.count)
+
+    print(f"speedup: {prebuilt / legacy:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
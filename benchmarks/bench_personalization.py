@@ -0,0 +1,94 @@
+"""Personalized messages per minute: naive str.format + MIME build per message vs. compiled MessageTemplate.
+
+Usage: python benchmarks/bench_personalization.py [--count 5000] [--attachment-kb 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_template import CompiledTemplate, MessageTemplate, recipient_context  # noqa: E402
+
+SUBJECT = "AI Engineer for {company|your team}"
+BODY = ("Hi {first_name|there},\n\nI saw that {company|your company} is hiring for {job_title|AI roles}.\n"
+        + "I'm an AI Engineer with experience building production-grade systems.\n" * 20)
+FROM_HEADER = "Sender <sender@example.com>"
+REPLY_TO = "reply@example.com"
+
+
+def rows(count):
+    for i in range(count):
+        yield {"Email": f"vendor{i}@example.com", "Full Name": f"Recruiter {i}",
+               "Company": f"Vendor {i % 500}", "Job Title": "" if i % 3 else "ML Engineer"}
+
+
+def naive_text(fmt, context):
+    # What a per-message str.format looks like with fallbacks for missing columns
+    return fmt.format_map(defaultdict(str, context))
+
+
+def naive_message(to_email, context, attachment):
+    """Format subject and body with str.format, then build and serialize the MIME tree per recipient"""
+    values = defaultdict(str, context)
+    values["first_name"] = values["first_name"] or "there"
+    msg = MIMEMultipart()
+    msg["Subject"] = SUBJECT.replace("|your team", "").format_map(values)
+    msg["From"] = FROM_HEADER
+    msg["To"] = to_email
+    msg["Reply-To"] = REPLY_TO
+    body = BODY.replace("|there", "").replace("|your company", "").replace("|AI roles", "")
+    msg.attach(MIMEText(body.format_map(values), "plain"))
+    if attachment is not None:
+        part = MIMEApplication(attachment, Name="resume.pdf")
+        part['Content-Disposition'] = 'attachment; filename="resume.pdf"'
+        msg.attach(part)
+    return msg.as_bytes()
+
+
+def measure(label, fn, inputs):
+    start = time.perf_counter()
+    for args in inputs:
+        fn(*args)
+    elapsed = time.perf_counter() - start
+    rate = len(inputs) / elapsed * 60
+    print(f"{label:<20} {len(inputs)} in {elapsed:.3f}s  ->  {rate:,.0f} per minute")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--attachment-kb", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        attachment_path = os.path.join(tmp, "resume.pdf")
+        attachment = os.urandom(args.attachment_kb * 1024) if args.attachment_kb else None
+        if attachment is not None:
+            with open(attachment_path, "wb") as f:
+                f.write(attachment)
+        template = MessageTemplate(SUBJECT, BODY, FROM_HEADER, REPLY_TO, attachment_path)
+        inputs = [(row["Email"], recipient_context(row, template.fields)) for row in rows(args.count)]
+
+        print("Body text only:")
+        plain_body = BODY.replace("|there", "").replace("|your company", "").replace("|AI roles", "")
+        naive = measure("str.format", lambda _, ctx: naive_text(plain_body, ctx), inputs)
+        compiled_body = CompiledTemplate(BODY)
+        compiled = measure("compiled", lambda _, ctx: compiled_body.render(ctx), inputs)
+        print(f"speedup: {compiled / naive:.1f}x\n")
+
+        print("Full message:")
+        naive = measure("str.format + MIME", lambda to, ctx: naive_message(to, ctx, attachment), inputs)
+        compiled = measure("MessageTemplate", template.render, inputs)
+        print(f"speedup: {compiled / naive:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
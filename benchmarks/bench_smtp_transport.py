@@ -0,0 +1,89 @@
+"""SMTP transports against the local sink: blocking smtplib sessions vs. asyncio sessions with PIPELINING.
+
+Measures throughput at a given round trip. That both transports deliver byte-identical messages, handle
+stale sessions and raise the same errors is checked by tests/test_async_smtp.py.
+
+Usage: python benchmarks/bench_smtp_transport.py [--count 2000] [--sessions 200] [--rtt-ms 20]
+"""
+import argparse
+import asyncio
+import os
+import ssl
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from async_smtp import AsyncSMTPPool  # noqa: E402
+from smtp_pool import SMTPConnectionPool  # noqa: E402
+from smtp_sink import SinkConfig, start_sink_process  # noqa: E402
+
+
+def client_tls_context() -> ssl.SSLContext:
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def make_pool(transport: str, port: int):
+    if transport == "async":
+        return AsyncSMTPPool("127.0.0.1", port, tls_context=client_tls_context())
+    return SMTPConnectionPool("127.0.0.1", port)
+
+
+def account(i: int) -> dict:
+    return {"EMAIL_USER": f"sender{i}@example.com", "EMAIL_PASS": "secret"}
+
+
+def measure(transport: str, args, pipelining: bool) -> float:
+    sink, port, accepted = start_sink_process(SinkConfig(args.rtt_ms, pipelining=pipelining))
+    pool = make_pool(transport, port)
+    data = b"Subject: benchmark\r\n\r\n" + b"x" * 2000 + b"\r\n"
+    accounts = [account(i) for i in range(args.sessions)]
+
+    started = time.perf_counter()
+    if transport == "async":
+        async def session(acct, n):
+            for _ in range(n):
+                await pool.sendmail_async(acct, acct["EMAIL_USER"], ["to@example.com"], data)
+
+        async def all_sessions():
+            per = [args.count // args.sessions + (i < args.count % args.sessions) for i in range(args.sessions)]
+            await asyncio.gather(*(session(a, n) for a, n in zip(accounts, per)))
+
+        asyncio.run_coroutine_threadsafe(all_sessions(), pool.loop).result()
+    else:
+        # The existing model: one blocking session per worker thread
+        with ThreadPoolExecutor(max_workers=min(args.sessions, args.threads)) as executor:
+            list(executor.map(
+                lambda i: pool.sendmail(accounts[i % args.sessions], "s@example.com", ["to@example.com"], data),
+                range(args.count)
+            ))
+    elapsed = time.perf_counter() - started
+    pool.close_all()
+    delivered = accepted.value
+    sink.terminate()
+    assert delivered == args.count, f"{transport}: sink accepted {delivered} of {args.count}"
+    return args.count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--sessions", type=int, default=200, help="SMTP sessions (one per account)")
+    parser.add_argument("--threads", type=int, default=32, help="worker threads for the smtplib transport")
+    parser.add_argument("--rtt-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    print(f"Throughput: {args.count} messages, {args.sessions} sessions, {args.rtt_ms} ms round trip")
+    for transport, pipelining in (("smtplib", True), ("async", False), ("async", True)):
+        rate = measure(transport, args, pipelining)
+        label = f"{transport} (server {'with' if pipelining else 'without'} PIPELINING)"
+        print(f"  {label:42} {rate:9.1f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Contacts uploaded per second against a local stub of the WBL API.
+
+Compares one blocking save_vendor_contact() per contact with save_vendor_contacts_bulk().
+
+Usage: python benchmarks/bench_vendor_contact_upload.py [--count 2000] [--latency-ms 20] [--workers 16]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True
+    latency = 0.02
+    failure_rate = 0.0
+    received = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            self._reply(503, {"detail": "try again"})
+            return
+        items = json.loads(body)
+        with StubAPIHandler.lock:
+            StubAPIHandler.received += len(items) if isinstance(items, list) else 1
+        self._reply(200, {"id": StubAPIHandler.received})
+
+    def _reply(self, status, data):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def contacts(count):
+    for i in range(count):
+        yield {"email": f"vendor{i}@example.com", "full_name": f"Vendor {i}", "company_name": "Acme"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    StubAPIHandler.latency = args.latency_ms / 1000
+    StubAPIHandler.failure_rate = args.failure_rate
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAPIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ["WBL_API_URL"] = f"http://127.0.0.1:{server.server_address[1]}/api"
+    os.environ["WBL_API_TOKEN"] = "benchmark-token"
+    from job_activity_logger import JobActivityLogger
+    logger = JobActivityLogger()
+
+    # Sequential baseline on a slice, extrapolated: it is the slow path being replaced
+    sample = min(args.count, 200)
+    start = time.perf_counter()
+    for contact in contacts(sample):
+        logger.save_vendor_contact(contact)
+    sequential = sample / (time.perf_counter() - start)
+    print(f"sequential  {sample} contacts  ->  {sequential:,.0f} contacts/s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        summary = logger.save_vendor_contacts_bulk(
+            contacts(args.count), os.path.join(tmp, "checkpoint.txt"), workers=args.workers
+        )
+        print(f"concurrent  {args.count} contacts  ->  {summary['per_second']:,.0f} contacts/s")
+
+        summary = logger.save_vendor_contacts_bulk(
+            contacts(args.count), os.path.join(tmp, "checkpoint_bulk.txt"), workers=args.workers,
+            batch_size=args.batch_size, bulk_path="vendor_contact/bulk"
+        )
+        print(f"batched     {args.count} contacts  ->  {summary['per_second']:,.0f} contacts/s")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""Local asyncio SMTP sink for benchmarks: accepts and discards mail.
+
+Supports EHLO/HELO, STARTTLS (self-signed certificate generated with openssl), AUTH PLAIN/LOGIN,
+PIPELINING, a configurable round trip per reply (pipelined commands share one), per-DATA latency,
+and injected 421/450/550 replies.
+
+Run standalone: python benchmarks/smtp_sink.py --port 2525 --rtt-ms 5 --fail-450 0.01
+"""
+import argparse
+import asyncio
+import base64
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import ssl
+import subprocess
+import tempfile
+from typing import Optional
+
+
+class SinkConfig:
+    def __init__(self, rtt_ms=0.0, data_ms=0.0, fail_421=0.0, fail_450=0.0, fail_550=0.0,
+                 tls=True, pipelining=True, seed=42):
+        self.rtt = rtt_ms / 1000
+        self.data_latency = data_ms / 1000
+        self.fail_421 = fail_421
+        self.fail_450 = fail_450
+        self.fail_550 = fail_550
+        self.tls = tls
+        self.pipelining = pipelining
+        self.seed = seed
+
+
+def make_tls_context(directory: str) -> Optional[ssl.SSLContext]:
+    """Self-signed server context, or None if openssl isn't available"""
+    if not shutil.which("openssl"):
+        return None
+    cert = os.path.join(directory, "sink.crt")
+    key = os.path.join(directory, "sink.key")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+class SMTPSink:
+    def __init__(self, config: SinkConfig, tls_context: Optional[ssl.SSLContext] = None, accepted=None,
+                 messages: Optional[list] = None):
+        self.config = config
+        self.tls_context = tls_context if config.tls else None
+        self.random = random.Random(config.seed)
+        self.accepted = accepted  # optional multiprocessing.Value shared with the parent
+        self.messages = messages  # optional list of accepted (mail_from, rcpt_tos, data) when run in-process
+
+    def _fault(self) -> Optional[bytes]:
+        roll = self.random.random()
+        c = self.config
+        if roll < c.fail_421:
+            return b"421 4.7.0 Try again later, closing connection"
+        if roll < c.fail_421 + c.fail_450:
+            return b"450 4.2.1 Mailbox temporarily unavailable"
+        if roll < c.fail_421 + c.fail_450 + c.fail_550:
+            return b"550 5.1.1 User unknown"
+        return None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        tls_active = False
+        envelope = (b"", [])
+        loop = asyncio.get_running_loop()
+        # When the command being answered arrived; its reply goes out one round trip later, so
+        # pipelined commands that arrive together share a round trip instead of paying one each
+        arrived = loop.time()
+
+        async def reply(line: bytes) -> None:
+            if self.config.rtt:
+                delay = arrived + self.config.rtt - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            writer.write(line + b"\r\n")
+            await writer.drain()
+
+        try:
+            await reply(b"220 localhost ESMTP benchmark sink")
+            while True:
+                # A command already buffered arrived with the one before it (pipelined); StreamReader has no peek
+                pipelined = b"\n" in reader._buffer
+                line = await reader.readline()
+                if not line:
+                    break
+                if not pipelined:
+                    arrived = loop.time()
+                command = line.strip().split(b" ", 1)
+                verb = command[0].upper()
+                arg = command[1] if len(command) > 1 else b""
+
+                if verb == b"EHLO":
+                    caps = [b"localhost", b"8BITMIME", b"SIZE 52428800", b"SMTPUTF8", b"AUTH PLAIN LOGIN"]
+                    if self.config.pipelining:
+                        caps.append(b"PIPELINING")
+                    if self.tls_context is not None and not tls_active:
+                        caps.append(b"STARTTLS")
+                    lines = [b"250-" + c for c in caps[:-1]] + [b"250 " + caps[-1]]
+                    await reply(b"\r\n".join(lines))
+                elif verb == b"HELO":
+                    await reply(b"250 localhost")
+                elif verb == b"STARTTLS" and self.tls_context is not None and not tls_active:
+                    await reply(b"220 2.0.0 Ready to start TLS")
+                    await writer.start_tls(self.tls_context)
+                    tls_active = True
+                elif verb == b"AUTH":
+                    mechanism = arg.split(b" ", 1)
+                    if mechanism[0].upper() == b"LOGIN":
+                        if len(mechanism) == 1:
+                            await reply(b"334 " + base64.b64encode(b"Username:"))
+                            await reader.readline()
+                            arrived = loop.time()
+                        await reply(b"334 " + base64.b64encode(b"Password:"))
+                        await reader.readline()
+                        arrived = loop.time()
+                    elif len(mechanism) == 1:
+                        await reply(b"334 ")
+                        await reader.readline()
+                        arrived = loop.time()
+                    await reply(b"235 2.7.0 Authentication successful")
+                elif verb in (b"MAIL", b"RCPT", b"RSET", b"NOOP"):
+                    if verb == b"MAIL":
+                        envelope = (arg, [])
+                    elif verb == b"RCPT":
+                        envelope[1].append(arg)
+                    await reply(b"250 2.0.0 OK")
+                elif verb == b"DATA":
+                    await reply(b"354 End data with <CR><LF>.<CR><LF>")
+                    data = await reader.readuntil(b"\r\n.\r\n")
+                    arrived = loop.time()
+                    if self.config.data_latency:
+                        await asyncio.sleep(self.config.data_latency)
+                    fault = self._fault()
+                    if fault is not None:
+                        await reply(fault)
+                        if fault.startswith(b"421"):
+                            break
+                        continue
+                    if self.accepted is not None:
+                        with self.accepted.get_lock():
+                            self.accepted.value += 1
+                    if self.messages is not None:
+                        # Undo dot-stuffing: what the client was asked to send
+                        body = re.sub(rb"(?m)^\.\.", b".", data[:-3])
+                        self.messages.append((envelope[0], envelope[1], body))
+                    await reply(b"250 2.0.0 Message accepted")
+                elif verb == b"QUIT":
+                    await reply(b"221 2.0.0 Bye")
+                    break
+                else:
+                    await reply(b"502 5.5.2 Command not recognized")
+        except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        # Large read limit so DATA with a multi-MB attachment fits in one readuntil()
+        return await asyncio.start_server(self.handle, host, port, limit=64 * 1024 * 1024)
+
+
+def _serve_forever(config: SinkConfig, port_queue, accepted) -> None:
+    async def main():
+        with tempfile.TemporaryDirectory() as tmp:
+            sink = SMTPSink(config, make_tls_context(tmp) if config.tls else None, accepted)
+            server = await sink.serve()
+            port_queue.put(server.sockets[0].getsockname()[1])
+            async with server:
+                await server.serve_forever()
+    asyncio.run(main())
+
+
+def start_sink_process(config: SinkConfig):
+    """Run the sink in a child process (so its CPU isn't charged to the sender); returns (process, port, accepted)"""
+    port_queue = multiprocessing.Queue()
+    accepted = multiprocessing.Value("l", 0)
+    process = multiprocessing.Process(target=_serve_forever, args=(config, port_queue, accepted), daemon=True)
+    process.start()
+    port = port_queue.get(timeout=30)
+    return process, port, accepted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--rtt-ms", type=float, default=0)
+    parser.add_argument("--data-ms", type=float, default=0)
+    parser.add_argument("--fail-421", type=float, default=0)
+    parser.add_argument("--fail-450", type=float, default=0)
+    parser.add_argument("--fail-550", type=float, default=0)
+    parser.add_argument("--no-tls", action="store_true")
+    parser.add_argument("--no-pipelining", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    config = SinkConfig(args.rtt_ms, args.data_ms, args.fail_421, args.fail_450, args.fail_550,
+                        tls=not args.no_tls, pipelining=not args.no_pipelining, seed=args.seed)
+
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            sink = SMTPSink(config, make_tls_context(tmp) if config.tls else None)
+            server = await sink.serve(port=args.port)
+            print(f"SMTP sink listening on 127.0.0.1:{args.port}")
+            async with server:
+                await server.serve_forever()
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
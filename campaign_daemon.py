@@ -0,0 +1,305 @@
+import argparse
+import json
+import logging
+import os
+import re
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import main as campaign
+from event_log import start_logging
+from metrics import registry as metrics, MetricsExporter
+
+DAEMON_QUEUE_DIR = os.getenv("DAEMON_QUEUE_DIR", "campaign_queue")
+DAEMON_POLL_INTERVAL = float(os.getenv("DAEMON_POLL_INTERVAL", "2"))
+DAEMON_HTTP_PORT = int(os.getenv("DAEMON_HTTP_PORT", "0"))  # 0 = no HTTP endpoint
+
+# Job fields; each one left out falls back to the campaign configured in main.py
+JOB_FIELDS = ("campaign_id", "csv_files", "subject", "body", "resume_path")
+# Job ids become file names in the queue directory
+JOB_ID_RE = re.compile(r"[A-Za-z0-9_.-]+")
+
+
+def _job_id(job: dict) -> str:
+    label = re.sub(r"[^A-Za-z0-9_-]+", "-", str(job.get("campaign_id") or job.get("subject") or "campaign"))
+    # Ids sort in submission order, which is the order jobs are run in
+    now = time.time()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+    return f"{stamp}-{int(now * 1_000_000) % 1_000_000:06d}-{label.strip('-')[:40]}"
+
+
+def valid_job_id(job_id) -> bool:
+    return isinstance(job_id, str) and JOB_ID_RE.fullmatch(job_id) is not None and ".." not in job_id
+
+
+def validate_job(job) -> Optional[str]:
+    """Why a job can't be run, or None"""
+    if not isinstance(job, dict):
+        return "job must be a JSON object"
+    unknown = set(job) - set(JOB_FIELDS) - {"id"}
+    if unknown:
+        return f"unknown fields: {', '.join(sorted(unknown))}"
+    for field, value in job.items():
+        if field == "csv_files" and isinstance(value, list):
+            if not value or not all(isinstance(item, str) and item.strip() for item in value):
+                return "csv_files must be a non-empty string or list of non-empty strings"
+            continue
+        if not isinstance(value, str) or not value.strip():
+            return f"{field} must be a non-empty string"
+    if "id" in job and not valid_job_id(job["id"]):
+        return "id may only contain letters, digits, '_', '-' and '.', and not '..'"
+    return None
+
+
+class CampaignQueue:
+    """Campaign jobs as JSON files in a directory: new jobs in the top level, then running/, done/ or failed/.
+
+    Anything that can write a file can queue a campaign; write to a temporary name and rename to *.json.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.running = os.path.join(root, "running")
+        self.done = os.path.join(root, "done")
+        self.failed = os.path.join(root, "failed")
+        for path in (root, self.running, self.done, self.failed):
+            os.makedirs(path, exist_ok=True)
+
+    def submit(self, job: dict) -> str:
+        job = dict(job)
+        job_id = job.setdefault("id", _job_id(job))
+        if not valid_job_id(job_id):
+            raise ValueError(f"invalid job id: {job_id!r}")
+        tmp_path = os.path.join(self.root, f".{job_id}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, os.path.join(self.root, f"{job_id}.json"))
+        return job_id
+
+    def requeue_running(self) -> int:
+        """Put back jobs a stopped daemon was running; the send ledger resumes them where they left off"""
+        moved = 0
+        for name in os.listdir(self.running):
+            os.replace(os.path.join(self.running, name), os.path.join(self.root, name))
+            moved += 1
+        return moved
+
+    def claim_next(self) -> Optional[str]:
+        """Move the oldest queued job into running/; returns its path"""
+        names = sorted(name for name in os.listdir(self.root) if name.endswith(".json"))
+        for name in names:
+            claimed = os.path.join(self.running, name)
+            try:
+                os.rename(os.path.join(self.root, name), claimed)
+            except FileNotFoundError:
+                continue
+            return claimed
+        return None
+
+    def finish(self, path: str, job: dict, result: dict, failed: bool = False) -> None:
+        job = dict(job, result=result, finished_at=time.time())
+        dest = os.path.join(self.failed if failed else self.done, os.path.basename(path))
+        with open(dest, "w", encoding="utf-8") as f:
+            json.dump(job, f, indent=2, default=str)
+        os.remove(path)
+
+    def status(self, job_id: str) -> Optional[dict]:
+        if not valid_job_id(job_id):
+            return None
+        name = f"{job_id}.json"
+        for state, folder in (("queued", self.root), ("running", self.running),
+                              ("done", self.done), ("failed", self.failed)):
+            path = os.path.join(folder, name)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    return dict(json.load(f), status=state)
+            except FileNotFoundError:
+                continue
+        return None
+
+
+def job_campaign(job: dict) -> "campaign.Campaign":
+    """The campaign a job describes, with main.py's configured one filling in the fields it leaves out"""
+    configured = campaign.Campaign.configured()
+    csv_files = job.get("csv_files", configured.csv_files)
+    if "campaign_id" in job:
+        campaign_id = job["campaign_id"]
+    else:
+        campaign_id = job["subject"].strip() if "subject" in job else configured.campaign_id
+    return campaign.Campaign(
+        campaign_id,
+        job.get("subject", configured.subject),
+        job.get("body", configured.text_body),
+        job.get("resume_path", configured.resume_path),
+        ",".join(csv_files) if isinstance(csv_files, list) else csv_files,
+    )
+
+
+def run_job(job: dict, services: "campaign.CampaignServices") -> dict:
+    """Run one job's campaign on the daemon's shared services"""
+    return campaign.run(services, job_campaign(job))
+
+
+def _handler(queue: CampaignQueue, daemon: "CampaignDaemon"):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code: int, payload: dict) -> None:
+            body = json.dumps(payload, default=str).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"status": "ok", "running": daemon.current})
+            elif self.path.startswith("/campaigns/"):
+                status = queue.status(self.path[len("/campaigns/"):])
+                self._reply(200, status) if status else self._reply(404, {"error": "no such campaign"})
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/campaigns":
+                self._reply(404, {"error": "not found"})
+                return
+            try:
+                job = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            except ValueError:
+                self._reply(400, {"error": "body is not valid JSON"})
+                return
+            error = validate_job(job)
+            if error:
+                self._reply(400, {"error": error})
+                return
+            job.pop("id", None)
+            self._reply(202, {"id": queue.submit(job), "status": "queued"})
+
+        def log_message(self, format, *args):
+            logging.info(f"daemon http: {format % args}")
+
+    return Handler
+
+
+class CampaignDaemon:
+    """Runs queued campaigns one after another in a single process.
+
+    The API session and token, the suppression index, the DNS cache, the send ledger and pooled SMTP
+    sessions are set up once and reused by every campaign instead of being rebuilt per run.
+    """
+
+    def __init__(self, queue: CampaignQueue, poll_interval: float = 2.0):
+        self.queue = queue
+        self.poll_interval = poll_interval
+        self.current: Optional[str] = None
+        self.stop_event = threading.Event()
+
+    def serve_http(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        # Local clients only: the endpoint has no authentication
+        server = ThreadingHTTPServer((host, port), _handler(self.queue, self))
+        threading.Thread(target=server.serve_forever, name="daemon-http", daemon=True).start()
+        print(f"Accepting campaigns on http://{host}:{server.server_address[1]}/campaigns")
+        return server
+
+    def run_forever(self) -> None:
+        requeued = self.queue.requeue_running()
+        if requeued:
+            print(f"Requeued {requeued} campaign(s) interrupted by the last shutdown")
+        services = campaign.CampaignServices()
+        print(f"Watching {os.path.abspath(self.queue.root)} for campaigns (Ctrl-C to stop)")
+        try:
+            while not self.stop_event.is_set():
+                path = self.queue.claim_next()
+                if path is None:
+                    self.stop_event.wait(self.poll_interval)
+                    campaign.smtp_pool.close_idle()
+                    continue
+                if not self._run(path, services):
+                    break
+        finally:
+            services.close()
+
+    def _run(self, path: str, services) -> bool:
+        """Run one claimed job; False once the daemon should stop"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                job = json.load(f)
+        except ValueError as e:
+            self.queue.finish(path, {}, {"error": f"invalid job file: {e}"}, failed=True)
+            return True
+        job.setdefault("id", os.path.basename(path)[:-len(".json")])
+        error = validate_job(job)
+        if error:
+            print(f"⚠ Rejected campaign job {job['id']}: {error}")
+            self.queue.finish(path, job, {"error": error}, failed=True)
+            return True
+
+        self.current = job["id"]
+        print(f"\n▶ Campaign job {job['id']}")
+        logging.info(f"Daemon starting campaign job {job['id']}")
+        try:
+            result = run_job(job, services)
+        except Exception as e:
+            logging.exception(f"Campaign job {job['id']} failed")
+            print(f"❌ Campaign job {job['id']} failed: {e}")
+            self.queue.finish(path, job, {"error": str(e)}, failed=True)
+            return True
+        finally:
+            self.current = None
+        if result["interrupted"]:
+            # Left in running/ and requeued at the next start; the ledger resumes it
+            print(f"Campaign job {job['id']} interrupted; it will resume when the daemon restarts")
+            return False
+        self.queue.finish(path, job, result)
+        print(f"✓ Campaign job {job['id']} done: {result['sent']} sent, {result['failed']} failed")
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued email campaigns from a long-running process")
+    parser.add_argument("--queue-dir", default=DAEMON_QUEUE_DIR)
+    parser.add_argument("--port", type=int, default=DAEMON_HTTP_PORT,
+                        help="also accept campaigns over HTTP on 127.0.0.1 (0 = queue directory only)")
+    parser.add_argument("--poll-interval", type=float, default=DAEMON_POLL_INTERVAL)
+    parser.add_argument("--submit", metavar="JOB_JSON", help="queue a campaign from a JSON file and exit")
+    parser.add_argument("--quiet", action="store_true", help="print periodic progress instead of every recipient")
+    args = parser.parse_args()
+
+    queue = CampaignQueue(args.queue_dir)
+    if args.submit:
+        with open(args.submit, encoding="utf-8") as f:
+            job = json.load(f)
+        error = validate_job(job)
+        if error:
+            print(f"⚠ {error}")
+            return
+        print(f"Queued campaign job {queue.submit(job)}")
+        return
+
+    campaign.QUIET = campaign.QUIET or args.quiet
+    listener = start_logging(campaign.LOG_DIR, campaign.LOG_MAX_BYTES, campaign.LOG_BACKUP_COUNT,
+                             campaign.LOG_ROTATE_SECONDS or None, quiet=campaign.QUIET)
+    # SIGTERM stops the daemon the same way Ctrl-C does: the running campaign saves its progress first
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    exporter = MetricsExporter(
+        metrics, prometheus_path=campaign.METRICS_PROM_FILE, json_path=campaign.METRICS_JSON_FILE,
+        interval=campaign.METRICS_INTERVAL
+    ).start()
+    daemon = CampaignDaemon(queue, args.poll_interval)
+    server = daemon.serve_http(args.port) if args.port else None
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        print("\nDaemon stopped")
+    finally:
+        if server is not None:
+            server.shutdown()
+        exporter.stop()
+        listener.stop()
+
+
+if __name__ == "__main__":
+    main()
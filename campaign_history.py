@@ -0,0 +1,446 @@
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from collections import Counter
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from domain_throttle import recipient_domain
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS labels (
+    id    INTEGER PRIMARY KEY,
+    value TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS outcomes (
+    ts        INTEGER NOT NULL,
+    day       TEXT    NOT NULL,
+    campaign  INTEGER,
+    account   INTEGER,
+    domain    INTEGER,
+    email     TEXT    NOT NULL,
+    status    TEXT    NOT NULL,
+    smtp_code INTEGER,
+    error     TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outcomes_day ON outcomes (day, status);
+CREATE INDEX IF NOT EXISTS idx_outcomes_email ON outcomes (email);
+CREATE TABLE IF NOT EXISTS by_account (
+    day      TEXT    NOT NULL,
+    campaign INTEGER NOT NULL,
+    account  INTEGER NOT NULL,
+    status   TEXT    NOT NULL,
+    count    INTEGER NOT NULL,
+    PRIMARY KEY (day, campaign, account, status)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS by_domain (
+    day      TEXT    NOT NULL,
+    campaign INTEGER NOT NULL,
+    domain   INTEGER NOT NULL,
+    status   TEXT    NOT NULL,
+    count    INTEGER NOT NULL,
+    PRIMARY KEY (day, campaign, domain, status)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS by_domain_month (
+    month    TEXT    NOT NULL,
+    campaign INTEGER NOT NULL,
+    domain   INTEGER NOT NULL,
+    status   TEXT    NOT NULL,
+    count    INTEGER NOT NULL,
+    PRIMARY KEY (month, campaign, domain, status)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS log_files (
+    fingerprint TEXT    PRIMARY KEY,
+    path        TEXT    NOT NULL,
+    offset      INTEGER NOT NULL,
+    complete    INTEGER NOT NULL DEFAULT 0,
+    updated_at  REAL    NOT NULL
+);
+"""
+
+# Outcome events from events.jsonl that are worth keeping
+STATUSES = ("sent", "failed", "deferred", "switched")
+
+# Per-recipient lines in the text logs (read from the per-run email_sender_<timestamp>.log files of earlier versions):
+#   2025-01-31 10:00:00,123 - INFO - SUCCESS: Sent to a@b.com using me@gmail.com
+#   2025-01-31 10:00:01,456 - ERROR - FAILED: Could not send to a@b.com - (550, b'...')
+TEXT_LINE_RE = re.compile(
+    rb"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),\d+ - \w+ - "
+    rb"(?:SUCCESS: Sent to (\S+) using (\S+)|FAILED: Could not send to (\S+) - (.*))"
+)
+SMTP_CODE_RE = re.compile(r"^\((\d{3}),")
+
+# Outcomes since email_sender.log replaced the per-run logs are in events.jsonl; its SUCCESS:/FAILED: lines
+# would count them twice
+LOG_PATTERNS = ("email_sender_*.log*", "events.jsonl*")
+# Label id used for "no campaign" (text logs predate campaign ids) and "no account"
+NONE = 0
+BATCH_LINES = 20000
+
+
+def _fingerprint(first_line: bytes) -> str:
+    """Identifies a log file by its first line, so it's still recognised after rotation renames or gzips it"""
+    return hashlib.blake2b(first_line, digest_size=16).hexdigest()
+
+
+def _open(path: str):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def log_files(log_dir: str) -> List[str]:
+    """Text and JSONL logs under log_dir, rotated and gzipped ones included, oldest first"""
+    paths = set()
+    for pattern in LOG_PATTERNS:
+        paths.update(glob.glob(os.path.join(log_dir, pattern)))
+    return sorted(paths, key=lambda p: (os.path.getmtime(p), p))
+
+
+def _text_timestamp(stamp: bytes) -> float:
+    # Slicing the fixed-width "YYYY-MM-DD HH:MM:SS" is several times faster than strptime
+    return time.mktime((int(stamp[0:4]), int(stamp[5:7]), int(stamp[8:10]),
+                        int(stamp[11:13]), int(stamp[14:16]), int(stamp[17:19]), 0, 0, -1))
+
+
+@lru_cache(maxsize=65536)
+def _local_day(quarter_hour: int) -> str:
+    # Every time zone's midnight falls on a quarter hour, so the day is the same throughout one
+    return time.strftime("%Y-%m-%d", time.localtime(quarter_hour * 900))
+
+
+def parse_text_line(line: bytes) -> Optional[Tuple[float, str, str, str, Optional[int], Optional[str]]]:
+    """(ts, email, account, status, smtp_code, error) from a SUCCESS:/FAILED: line, else None"""
+    match = TEXT_LINE_RE.match(line)
+    if match is None:
+        return None
+    ts = _text_timestamp(match.group(1))
+    if match.group(2) is not None:
+        return ts, match.group(2).decode("utf-8", "replace"), match.group(3).decode("utf-8", "replace"), \
+            "sent", 250, None
+    error = match.group(5).decode("utf-8", "replace").rstrip()
+    code = SMTP_CODE_RE.match(error)
+    return ts, match.group(4).decode("utf-8", "replace"), "", "failed", int(code.group(1)) if code else None, error
+
+
+def parse_event_line(line: bytes) -> Optional[Tuple[float, str, str, str, Optional[int], Optional[str], str]]:
+    """(ts, email, account, status, smtp_code, error, campaign) from an events.jsonl line, else None"""
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return None
+    status = event.get("event")
+    if status not in STATUSES or not event.get("email"):
+        return None
+    code = event.get("smtp_code")
+    return (event["ts"], event["email"], event.get("account") or "", status,
+            int(code) if isinstance(code, (int, str)) and str(code).isdigit() else None,
+            event.get("error"), event.get("campaign") or "")
+
+
+def _first_of_next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _split_months(since: Optional[str], until: Optional[str]) -> List[Tuple[str, str, Optional[str], Optional[str]]]:
+    """[since, until] as (table, column, from, to): whole months by month, the days at either end by day"""
+    start = date.fromisoformat(since) if since else None
+    end = date.fromisoformat(until) if until else None
+    first = start if start is None or start.day == 1 else _first_of_next_month(start)
+    after = None if end is None else _first_of_next_month(end)
+    stop = after if end is None or end + timedelta(days=1) == after else end.replace(day=1)
+    if first is not None and stop is not None and first >= stop:
+        return [("by_domain", "day", since, until)]
+    ranges = [("by_domain_month", "month", first and first.isoformat()[:7],
+               stop and (stop - timedelta(days=1)).isoformat()[:7])]
+    if start is not None and start != first:
+        ranges.append(("by_domain", "day", since, (first - timedelta(days=1)).isoformat()))
+    if end is not None and stop != after:
+        ranges.append(("by_domain", "day", stop.isoformat(), until))
+    return ranges
+
+
+class IndexStats:
+    def __init__(self):
+        self.files = 0
+        self.skipped = 0
+        self.lines = 0
+        self.outcomes = 0
+
+    def summary(self) -> str:
+        return (f"Read {self.lines} new line(s) from {self.files} file(s) ({self.skipped} unchanged): "
+                f"{self.outcomes} outcome(s) indexed")
+
+
+class CampaignHistory:
+    """Every send outcome from logs/, in SQLite, with rollups per account and day and per recipient domain
+    and day (and month).
+
+    Each log file is remembered by a fingerprint of its first line and the byte offset read up to, so
+    re-indexing only reads what was appended, and rotated (renamed or gzipped) files aren't read again.
+    Reports read the rollups, which stay small however many outcomes there are.
+    """
+
+    def __init__(self, path: str = "history.db"):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # The email index takes inserts in random order; a bigger page cache keeps that off the disk
+        self._conn.execute("PRAGMA cache_size=-65536")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._labels: Dict[str, int] = {value: id_ for id_, value in self._conn.execute("SELECT id, value FROM labels")}
+
+    def _label(self, value: str) -> int:
+        if not value:
+            return NONE
+        id_ = self._labels.get(value)
+        if id_ is None:
+            # Another indexer may have added it since the cache was loaded
+            self._conn.execute("INSERT OR IGNORE INTO labels (value) VALUES (?)", (value,))
+            id_ = self._conn.execute("SELECT id FROM labels WHERE value = ?", (value,)).fetchone()[0]
+            self._labels[value] = id_
+        return id_
+
+    def _add(self, rows: List[tuple]) -> None:
+        """Store parsed outcomes and fold them into the rollups; the caller commits"""
+        outcomes = []
+        accounts: Counter = Counter()
+        domains: Counter = Counter()
+        for ts, email, account, status, smtp_code, error, campaign in rows:
+            day = _local_day(int(ts) // 900)
+            campaign_id, account_id = self._label(campaign), self._label(account.lower())
+            domain_id = self._label(recipient_domain(email))
+            outcomes.append((int(ts), day, campaign_id, account_id, domain_id, email.lower(), status, smtp_code, error))
+            accounts[(day, campaign_id, account_id, status)] += 1
+            domains[(day, campaign_id, domain_id, status)] += 1
+        months: Counter = Counter()
+        for (day, campaign_id, domain_id, status), count in domains.items():
+            months[(day[:7], campaign_id, domain_id, status)] += count
+        self._conn.executemany(
+            "INSERT INTO outcomes (ts, day, campaign, account, domain, email, status, smtp_code, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", outcomes
+        )
+        for table, period, counts in (("by_account", "day", accounts), ("by_domain", "day", domains),
+                                      ("by_domain_month", "month", months)):
+            column = "account" if table == "by_account" else "domain"
+            self._conn.executemany(
+                f"INSERT INTO {table} ({period}, campaign, {column}, status, count) VALUES (?, ?, ?, ?, ?) "
+                f"ON CONFLICT DO UPDATE SET count = count + excluded.count",
+                (key + (count,) for key, count in counts.items())
+            )
+
+    def _checkpoint(self, fingerprint: str, path: str, offset: int, complete: bool) -> None:
+        self._conn.execute(
+            "INSERT INTO log_files (fingerprint, path, offset, complete, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(fingerprint) DO UPDATE SET path = excluded.path, offset = excluded.offset, "
+            "complete = excluded.complete, updated_at = excluded.updated_at",
+            (fingerprint, path, offset, int(complete), time.time())
+        )
+
+    def _store(self, fingerprint: str, path: str, start: int, end: int, rows: List[tuple], complete: bool) -> bool:
+        """Add the outcomes read from start to end of a file, unless another indexer already stored them"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read the checkpoint under the write lock; it only matches if nobody indexed past `start`
+            row = self._conn.execute(
+                "SELECT offset, complete FROM log_files WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+            if (row[0] if row else 0) != start or (row and row[1]):
+                self._conn.rollback()
+                return False
+            self._add(rows)
+            self._checkpoint(fingerprint, path, end, complete)
+            self._conn.commit()
+        except BaseException:
+            self._conn.rollback()
+            # Ids of labels inserted in the rolled-back transaction are gone
+            self._labels.clear()
+            raise
+        return True
+
+    def index_file(self, path: str, stats: IndexStats) -> None:
+        is_events = os.path.basename(path).startswith("events.jsonl")
+        # Rotated files (gzipped) never change again; the live ones may still be appended to
+        complete = path.endswith(".gz")
+        with _open(path) as f:
+            first = f.readline()
+            if not first.endswith(b"\n"):
+                return  # Nothing complete to read yet
+            fingerprint = _fingerprint(first)
+            row = self._conn.execute(
+                "SELECT offset, complete FROM log_files WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+            offset = row[0] if row else 0
+            if row and (row[1] or (not complete and os.path.getsize(path) <= offset)):
+                stats.skipped += 1
+                return
+            stats.files += 1
+            f.seek(offset)
+            start = offset
+            rows = []
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Still being written; read it next time
+                offset += len(line)
+                stats.lines += 1
+                if is_events:
+                    parsed = parse_event_line(line)
+                else:
+                    parsed = parse_text_line(line)
+                    parsed = parsed and parsed + ("",)
+                if parsed is not None:
+                    rows.append(parsed)
+                if len(rows) >= BATCH_LINES:
+                    if not self._store(fingerprint, path, start, offset, rows, False):
+                        return  # Another indexer is working through this file
+                    stats.outcomes += len(rows)
+                    start = offset
+                    rows = []
+            if self._store(fingerprint, path, start, offset, rows, complete):
+                stats.outcomes += len(rows)
+
+    def index(self, log_dir: str = "logs") -> IndexStats:
+        """Index whatever was logged since the last call"""
+        stats = IndexStats()
+        for path in log_files(log_dir):
+            try:
+                self.index_file(path, stats)
+            except (OSError, EOFError) as e:
+                # A file rotated away mid-read, or a truncated gzip: picked up again next time
+                print(f"⚠ Could not index {path}: {e}")
+        return stats
+
+    def _sum(self, table: str, key: str, period: str, lo: Optional[str], hi: Optional[str],
+             campaign_id: Optional[int], totals: Dict) -> None:
+        where, params = [], []
+        if lo:
+            where.append(f"{period} >= ?")
+            params.append(lo)
+        if hi:
+            where.append(f"{period} <= ?")
+            params.append(hi)
+        if campaign_id is not None:
+            where.append("campaign = ?")
+            params.append(campaign_id)
+        sql = (f"SELECT {key}, status, SUM(count) FROM {table} "
+               f"{'WHERE ' + ' AND '.join(where) if where else ''} GROUP BY {key}, status")
+        for name, status, count in self._conn.execute(sql, params):
+            totals.setdefault(name, dict.fromkeys(STATUSES, 0))[status] += count
+
+    def report(
+        self,
+        by: str,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        campaign: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Tuple[str, Dict[str, int]]]:
+        """Outcome counts per account, domain or day (days are YYYY-MM-DD, until inclusive), busiest first"""
+        campaign_id = None if campaign is None else (self._labels.get(campaign, -1) if campaign else NONE)
+        totals: Dict = {}
+        if by == "domain":
+            # There is a row per domain per day, so whole months come from the monthly rollup
+            for table, period, lo, hi in _split_months(since, until):
+                self._sum(table, "domain", period, lo, hi, campaign_id, totals)
+        elif by in ("account", "day"):
+            self._sum("by_account", by, "day", since, until, campaign_id, totals)
+        else:
+            raise ValueError(f"unknown breakdown: {by}")
+
+        if by == "day":
+            return sorted(totals.items())[:limit] if limit else sorted(totals.items())
+        names = {id_: value for value, id_ in self._labels.items()}
+        rows = sorted(((names.get(id_, "-"), counts) for id_, counts in totals.items()),
+                      key=lambda item: (-sum(item[1].values()), item[0]))
+        return rows[:limit] if limit else rows
+
+    def recipients(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        status: Optional[str] = None,
+        email: Optional[str] = None
+    ) -> Iterator[Tuple[str, str, str, str, Optional[int], Optional[str]]]:
+        """(time, email, account, status, smtp_code, error) for each matching outcome, oldest first"""
+        where, params = [], []
+        if since:
+            where.append("o.day >= ?")
+            params.append(since)
+        if until:
+            where.append("o.day <= ?")
+            params.append(until)
+        if status:
+            where.append("o.status = ?")
+            params.append(status)
+        if email:
+            where.append("o.email = ?")
+            params.append(email.lower())
+        sql = ("SELECT o.ts, o.email, COALESCE(l.value, '-'), o.status, o.smtp_code, o.error FROM outcomes o "
+               "LEFT JOIN labels l ON l.id = o.account "
+               f"{'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY o.ts")
+        for ts, address, account, outcome, smtp_code, error in self._conn.execute(sql, params):
+            yield time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)), address, account, outcome, smtp_code, error
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
+
+
+def _day(value: str) -> str:
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a YYYY-MM-DD date: {value}") from None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index campaign logs and report who was mailed, from where, and what failed")
+    parser.add_argument("--db", default=os.getenv("HISTORY_DB", "history.db"))
+    parser.add_argument("--log-dir", default=os.getenv("LOG_DIR", "logs"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("index", help="read new log lines into the index")
+    report = commands.add_parser("report", help="sent/failed/deferred/switched counts")
+    report.add_argument("--by", choices=["account", "domain", "day"], default="account")
+    report.add_argument("--limit", type=int)
+    recipients = commands.add_parser("recipients", help="one line per outcome")
+    recipients.add_argument("--status", choices=STATUSES)
+    recipients.add_argument("--email")
+    for command in (report, recipients):
+        command.add_argument("--since", type=_day, help="first day, YYYY-MM-DD")
+        command.add_argument("--until", type=_day, help="last day, YYYY-MM-DD")
+        command.add_argument("--no-index", action="store_true", help="skip reading new log lines first")
+    report.add_argument("--campaign")
+    args = parser.parse_args()
+
+    history = CampaignHistory(args.db)
+    try:
+        if args.command == "index" or not args.no_index:
+            started = time.monotonic()
+            stats = history.index(args.log_dir)
+            if args.command == "index":
+                print(f"{stats.summary()} in {time.monotonic() - started:.1f}s")
+
+        if args.command == "report":
+            rows = history.report(args.by, args.since, args.until, args.campaign, args.limit)
+            width = max([len(args.by)] + [len(name) for name, _ in rows])
+            print(f"{args.by:<{width}} " + " ".join(f"{s:>9}" for s in STATUSES))
+            for name, counts in rows:
+                print(f"{name:<{width}} " + " ".join(f"{counts[s]:>9}" for s in STATUSES))
+        elif args.command == "recipients":
+            for when, address, account, status, smtp_code, error in history.recipients(
+                args.since, args.until, args.status, args.email
+            ):
+                print("\t".join([when, address, account, status, str(smtp_code or ""), error or ""]))
+    finally:
+        history.close()
+
+
+if __name__ == "__main__":
+    main()
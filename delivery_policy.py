@@ -0,0 +1,175 @@
+import random
+import smtplib
+import time
+from typing import Optional, Tuple
+
+# What an SMTP failure means for the recipient and for the sending account
+ACCOUNT_LIMIT = "account_limit"          # account hit a sending limit: switch account, retry now
+ACCOUNT_AUTH = "account_auth"            # account credentials rejected: switch account, retry now
+TEMPORARY = "temporary"                  # 4xx deferral / dropped connection: retry later with backoff
+RECIPIENT_PERMANENT = "recipient_permanent"  # mailbox does not exist: never retry, suppress
+PERMANENT = "permanent"                  # other 5xx: give up on this recipient
+
+# What happens to the recipient after a failed send
+SWITCH = "switch"    # resend now from another account
+DEFER = "defer"      # resend after a backoff delay
+GIVE_UP = "give_up"  # record the recipient as failed
+
+_LIMIT_HINTS = ("limit exceeded", "quota", "rate limit", "too many", "daily user sending")
+_RECIPIENT_HINTS = ("user unknown", "no such user", "does not exist", "mailbox unavailable",
+                    "recipient address rejected", "address rejected", "invalid recipient", "5.1.1", "5.1.10")
+
+
+def classify_smtp_error(code: Optional[int], message: str = "") -> str:
+    """Map an SMTP reply code and text to one of the failure classes above"""
+    text = (message or "").lower()
+    if code in (530, 534, 535):
+        return ACCOUNT_AUTH
+    if code is None or 400 <= code < 500:
+        # Includes 4xx rate limiting: the account's pacer and breaker slow it down instead
+        return TEMPORARY
+    if any(hint in text for hint in _LIMIT_HINTS):
+        return ACCOUNT_LIMIT
+    if any(hint in text for hint in _RECIPIENT_HINTS) or code in (551, 553):
+        return RECIPIENT_PERMANENT
+    if code == 550:
+        # Bare 550 from the provider has historically meant the account is blocked
+        return ACCOUNT_LIMIT
+    return PERMANENT
+
+
+def classify_exception(error: Exception) -> Tuple[str, Optional[int], str]:
+    """Classify any exception raised by a send: (failure class, SMTP code, message)"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        code, reply = next(iter(error.recipients.values()), (None, b""))
+        message = reply.decode('utf-8', errors='ignore') if isinstance(reply, bytes) else str(reply)
+        return classify_smtp_error(code, message), code, message
+    if isinstance(error, smtplib.SMTPConnectError):
+        # No session yet (timeout or refused greeting): nothing to do with the recipient or the account
+        message = error.smtp_error.decode('utf-8', errors='ignore') \
+            if isinstance(error.smtp_error, bytes) else str(error.smtp_error)
+        return TEMPORARY, error.smtp_code, message
+    if isinstance(error, smtplib.SMTPResponseException):
+        message = error.smtp_error.decode('utf-8', errors='ignore') \
+            if isinstance(error.smtp_error, bytes) else str(error.smtp_error)
+        return classify_smtp_error(error.smtp_code, message), error.smtp_code, message
+    if isinstance(error, (smtplib.SMTPServerDisconnected, OSError)):
+        return TEMPORARY, None, str(error)
+    return PERMANENT, None, str(error)
+
+
+def failure_action(error_class: str, attempts: int, is_retry: bool, max_attempts: int) -> str:
+    """SWITCH, DEFER or GIVE_UP for a recipient whose send failed with error_class on its attempts-th try"""
+    if error_class in (ACCOUNT_LIMIT, ACCOUNT_AUTH):
+        # The account's fault, not the recipient's: one more try from another account
+        return GIVE_UP if is_retry else SWITCH
+    if error_class == TEMPORARY:
+        return GIVE_UP if attempts >= max_attempts else DEFER
+    return GIVE_UP
+
+
+def backoff_delay(attempt: int, base: float = 300, cap: float = 6 * 3600, rng=random) -> float:
+    """Exponential backoff with equal jitter: half the window fixed, half random"""
+    window = min(cap, base * (2 ** max(attempt - 1, 0)))
+    return window / 2 + rng.uniform(0, window / 2)
+
+
+class FailureDecision:
+    """What a failed send means for the recipient (action, and retry_at when deferred), its account and its domain"""
+
+    def __init__(self, error_class: str, smtp_code: Optional[int], action: str, retry_at: Optional[float] = None):
+        self.error_class = error_class
+        self.smtp_code = smtp_code
+        self.action = action
+        self.retry_at = retry_at
+
+    @property
+    def account_fault(self) -> bool:
+        """The account hit a limit or was refused: take it out of rotation"""
+        return self.error_class in (ACCOUNT_LIMIT, ACCOUNT_AUTH)
+
+    @property
+    def soft_error(self) -> bool:
+        """A 4xx or a dropped connection: the account's pacer and breaker back off"""
+        return self.error_class == TEMPORARY
+
+    @property
+    def slows_domain(self) -> bool:
+        """A 4xx from the receiving side (greylisting, rate limit) rather than a dropped connection"""
+        return self.error_class == TEMPORARY and bool(self.smtp_code)
+
+
+def decide_failure(
+    error_class: str,
+    smtp_code: Optional[int],
+    attempts: int,
+    is_retry: bool,
+    max_attempts: int,
+    now: float,
+    retry_base: float = 300,
+    rng=random
+) -> FailureDecision:
+    """The decision after a send failed on its attempts-th try; main.py and the simulation both use it"""
+    action = failure_action(error_class, attempts, is_retry, max_attempts)
+    retry_at = now + backoff_delay(attempts, base=retry_base, rng=rng) if action == DEFER else None
+    return FailureDecision(error_class, smtp_code, action, retry_at)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and stays open for a cool-down that doubles on each re-open"""
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 300, max_cooldown: float = 4 * 3600, clock=time):
+        self.clock = clock
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.opens = 0
+        self.open_until = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self.open_until > self.clock.time()
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        # Once the cool-down passes the breaker is half-open: the next send is the trial
+        return self.open_until <= (now if now is not None else self.clock.time())
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opens = 0
+
+    def record_failure(self) -> bool:
+        """Count a failure; returns True if this failure opened the breaker"""
+        self.failures += 1
+        if self.failures < self.failure_threshold:
+            return False
+        cooldown = min(self.max_cooldown, self.base_cooldown * (2 ** self.opens))
+        self.opens += 1
+        self.failures = 0
+        self.open_until = self.clock.time() + cooldown
+        return True
+
+
+class AdaptivePacer:
+    """Per-account delay between sends: shrinks slowly while sends succeed, doubles on soft errors"""
+
+    def __init__(self, min_delay: float = 5, max_delay: float = 120, initial: float = 10,
+                 speedup: float = 0.95, slowdown: float = 2.0, jitter: float = 0.3, rng=random):
+        self.rng = rng
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.delay = min(max(initial, min_delay), max_delay)
+        self.speedup = speedup
+        self.slowdown = slowdown
+        self.jitter = jitter
+
+    def on_success(self) -> None:
+        self.delay = max(self.min_delay, self.delay * self.speedup)
+
+    def on_soft_error(self) -> None:
+        self.delay = min(self.max_delay, self.delay * self.slowdown)
+
+    def next_delay(self) -> float:
+        # Jitter keeps the cadence from looking machine-generated; never below the floor
+        return max(self.min_delay, self.delay * self.rng.uniform(1 - self.jitter, 1 + self.jitter))
@@ -0,0 +1,142 @@
+import heapq
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+def recipient_domain(email: str) -> str:
+    return email.rpartition("@")[2].lower()
+
+
+class TokenBucket:
+    """`rate` sends per second on average, with bursts of up to `burst`; a rate of 0 means unlimited"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated_at = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def take(self, now: float) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def ready_at(self, now: float) -> float:
+        """When the next token will be available"""
+        if self.rate <= 0:
+            return now
+        self._refill(now)
+        return now + max(0.0, 1 - self.tokens) / self.rate
+
+    def drain(self, now: float) -> None:
+        self._refill(now)
+        self.tokens = 0
+
+
+class DomainScheduler:
+    """Recipients queued per receiving domain and handed out round-robin across domains.
+
+    Each domain has its own token bucket, so a big group at one domain is sent at that domain's pace
+    while the other domains keep going. Domains that are out of tokens wait in a heap keyed by the
+    time their next token arrives, so picking the next recipient doesn't scan throttled domains.
+    Schedulers created with limits_from share its token buckets, so campaigns sent side by side
+    together stay within each domain's rate. clock (monotonic() only) defaults to the time module.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float = 0,
+        burst: float = 1,
+        limits_from: Optional["DomainScheduler"] = None,
+        clock=time
+    ):
+        # Shared buckets only make sense on one clock
+        self.clock = clock if limits_from is None else limits_from.clock
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        # Schedulers sharing limits keep their own queues but spend the same per-domain tokens
+        self._cond = threading.Condition() if limits_from is None else limits_from._cond
+        self._queues: Dict[str, Deque[Any]] = {}
+        self._buckets: Dict[str, TokenBucket] = {} if limits_from is None else limits_from._buckets
+        # Every domain with queued recipients is in exactly one of these
+        self._ready: Deque[str] = deque()
+        self._waiting: List[Tuple[float, str]] = []
+        self._size = 0
+
+    def __len__(self) -> int:
+        with self._cond:
+            return self._size
+
+    def backlog(self, domain: str) -> int:
+        with self._cond:
+            queue = self._queues.get(domain)
+            return len(queue) if queue else 0
+
+    def put(self, domain: str, item: Any) -> None:
+        with self._cond:
+            queue = self._queues.get(domain)
+            if queue is None:
+                queue = self._queues[domain] = deque()
+                self._ready.append(domain)
+            queue.append(item)
+            self._size += 1
+            self._cond.notify()
+
+    def get(self, timeout: float = 0.5) -> Optional[Any]:
+        """Next recipient from the next domain in turn that may send now; None if none within timeout"""
+        deadline = self.clock.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = self.clock.monotonic()
+                while self._waiting and self._waiting[0][0] <= now:
+                    self._ready.append(heapq.heappop(self._waiting)[1])
+                while self._ready:
+                    domain = self._ready.popleft()
+                    bucket = self._buckets.get(domain)
+                    if bucket is None:
+                        bucket = self._buckets[domain] = TokenBucket(self.rate, self.burst, now)
+                    if not bucket.take(now):
+                        heapq.heappush(self._waiting, (bucket.ready_at(now), domain))
+                        continue
+                    queue = self._queues[domain]
+                    item = queue.popleft()
+                    if queue:
+                        self._ready.append(domain)
+                    else:
+                        del self._queues[domain]
+                    self._size -= 1
+                    return item
+                wake_at = min(self._waiting[0][0], deadline) if self._waiting else deadline
+                if now >= deadline:
+                    return None
+                self._cond.wait(max(wake_at - now, 0.005))
+
+    def next_ready_at(self) -> Optional[float]:
+        """Earliest time get() may return a recipient (now if one is ready); None if nothing is queued"""
+        with self._cond:
+            if self._ready:
+                return self.clock.monotonic()
+            return self._waiting[0][0] if self._waiting else None
+
+    def slow_down(self, domain: str) -> None:
+        """The domain deferred a send (greylisting, rate limit): spend its tokens so it pauses for a while"""
+        if self.rate <= 0:
+            return
+        with self._cond:
+            now = self.clock.monotonic()
+            bucket = self._buckets.get(domain)
+            if bucket is None:
+                bucket = self._buckets[domain] = TokenBucket(self.rate, self.burst, now)
+            bucket.drain(now)
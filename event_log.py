@@ -0,0 +1,122 @@
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+# Per-recipient outcomes (structured, to events.jsonl) and per-recipient console lines
+EVENTS_LOGGER = "email_sender.events"
+CONSOLE_LOGGER = "email_sender.console"
+
+events = logging.getLogger(EVENTS_LOGGER)
+console = logging.getLogger(CONSOLE_LOGGER)
+console.propagate = False
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Writes to sys.stdout as it is at the time, so contextlib.redirect_stdout applies"""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+# Until start_logging() takes over, e.g. when main.run() is called from another program, print straight to stdout
+console.setLevel(logging.INFO)
+_fallback = _StdoutHandler()
+_fallback.setFormatter(logging.Formatter('%(message)s'))
+console.addHandler(_fallback)
+
+
+def log_event(event: str, **fields) -> None:
+    """Record one structured event, e.g. log_event("sent", email=..., account=..., send_ms=...)"""
+    events.info(event, extra={"event": {"event": event, **fields}})
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level and the event's fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {"ts": round(record.created, 3), "level": record.levelname}
+        payload.update(getattr(record, "event", None) or {"message": record.getMessage()})
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """Rotates when the file reaches max_bytes or every rotate_every seconds; old files are gzipped"""
+
+    def __init__(self, filename: str, max_bytes: int = 0, backup_count: int = 10,
+                 rotate_every: Optional[float] = None):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.rotate_every = rotate_every
+        self._rollover_at = time.time() + rotate_every if rotate_every else None
+        self.namer = lambda name: f"{name}.gz"
+        self.rotator = self._compress
+
+    @staticmethod
+    def _compress(source: str, dest: str) -> None:
+        with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+    def shouldRollover(self, record: logging.LogRecord) -> int:
+        if self._rollover_at is not None and time.time() >= self._rollover_at:
+            # Nothing to rotate if the file is still empty
+            return int(os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0)
+        return super().shouldRollover(record)
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        if self.rotate_every:
+            self._rollover_at = time.time() + self.rotate_every
+
+
+def start_logging(
+    log_dir: str = "logs",
+    max_bytes: int = 50 * 1024 * 1024,
+    backup_count: int = 20,
+    rotate_every: Optional[float] = 86400,
+    quiet: bool = False
+) -> QueueListener:
+    """Route all logging through a queue to a background thread; callers never wait on disk or the terminal.
+
+    Writes logs/email_sender.log (text) and logs/events.jsonl (one JSON object per recipient outcome).
+    With quiet, per-recipient console lines are dropped. Call .stop() on the result to flush.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    text = CompressingRotatingFileHandler(
+        os.path.join(log_dir, "email_sender.log"), max_bytes, backup_count, rotate_every
+    )
+    text.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    text.addFilter(lambda record: record.name not in (EVENTS_LOGGER, CONSOLE_LOGGER))
+    structured = CompressingRotatingFileHandler(
+        os.path.join(log_dir, "events.jsonl"), max_bytes, backup_count, rotate_every
+    )
+    structured.setFormatter(JsonLinesFormatter())
+    structured.addFilter(lambda record: record.name == EVENTS_LOGGER)
+    terminal = logging.StreamHandler(sys.stdout)
+    terminal.setFormatter(logging.Formatter('%(message)s'))
+    terminal.addFilter(lambda record: record.name == CONSOLE_LOGGER)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+    console.handlers = [QueueHandler(log_queue)]
+    console.setLevel(logging.WARNING if quiet else logging.INFO)
+
+    listener = QueueListener(log_queue, text, structured, terminal, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -1,11 +1,41 @@
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
-from typing import Optional
+from typing import Dict, Iterable, List, Optional
+import base64
+import json
 import os
+import random
+import tempfile
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
+from metrics import registry as metrics
 
 load_dotenv()
 
+# Refresh the JWT this many seconds before its "exp" claim instead of waiting for a 401
+TOKEN_REFRESH_MARGIN = int(os.getenv('WBL_TOKEN_REFRESH_MARGIN', '300'))
+JOB_TYPE_CACHE_FILE = os.getenv('WBL_JOB_TYPE_CACHE', '.job_type_cache.json')
+JOB_TYPE_CACHE_TTL = int(os.getenv('WBL_JOB_TYPE_CACHE_TTL', '86400'))
+# Seconds before an API call gives up, so a hung backend can't stall a campaign's shutdown
+API_TIMEOUT = float(os.getenv('WBL_API_TIMEOUT', '30'))
+# Outbox claims older than this belong to a reporter that died mid-post and go back to the outbox
+STALE_CLAIM_SECONDS = 900
+
+
+def _jwt_expiry(token: str) -> Optional[float]:
+    """Read the exp claim from a JWT without verifying it (only used to schedule a refresh)"""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+        return float(exp) if exp is not None else None
+    except (IndexError, ValueError, TypeError):
+        return None
+
 
 class JobActivityLogger:
 
@@ -18,6 +48,15 @@ class JobActivityLogger:
         self.employee_id = int(os.getenv('EMPLOYEE_ID', '411'))
         self.selected_candidate_id = int(os.getenv('SELECTED_CANDIDATE_ID', '570'))
 
+        # One keep-alive connection pool for every API call
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._token_lock = threading.Lock()
+        self._job_type_id: Optional[int] = None
+        self._job_type_expires = 0.0
+
         # Auto-login if token is missing
         if not self.api_token:
             if self.wbl_email and self.wbl_password:
@@ -30,18 +69,15 @@ class JobActivityLogger:
             "Content-Type": "application/json"
         }
 
-    def save_vendor_contact(self, data: dict) -> bool:
-        """Save vendor contact to API (if needed for email recipients)"""
-        if not self.api_token:
-            return False
-
+    def _vendor_contact_endpoint(self, path: str = "vendor_contact") -> str:
         base_url = self.api_url.rstrip('/')
         if not self.api_url.endswith('/api'):
             base_url = f"{self.api_url}/api"
+        return f"{base_url}/{path.strip('/')}"
 
-        endpoint = f"{base_url}/vendor_contact"
-
-        payload = {
+    @staticmethod
+    def _vendor_contact_payload(data: dict) -> dict:
+        return {
             "full_name": data.get('full_name') or 'Unknown',
             "email": data.get('email'),
             "phone": data.get('phone'),
@@ -51,20 +87,130 @@ class JobActivityLogger:
             "source_email": os.getenv('EMAIL_USER')  # From email account used
         }
 
+    @metrics.timed("api_save_vendor_contact")
+    def save_vendor_contact(self, data: dict) -> bool:
+        """Save vendor contact to API (if needed for email recipients)"""
+        if not self.api_token:
+            return False
+        self._ensure_fresh_token()
+
+        endpoint = self._vendor_contact_endpoint()
+        payload = self._vendor_contact_payload(data)
+
         try:
-            response = requests.post(endpoint, json=payload, headers=self.headers)
+            response = self.session.post(endpoint, json=payload, headers=self.headers, timeout=API_TIMEOUT)
             response.raise_for_status()
             return True
         except Exception as e:
             print(f"Failed to save vendor contact: {e}")
             return False
 
+    def _post_with_retry(self, endpoint: str, payload, max_attempts: int = 4, backoff: float = 0.5) -> bool:
+        """POST with retries on connection errors, 429 and 5xx (exponential backoff with jitter)"""
+        last_error = ""
+        for attempt in range(max_attempts):
+            try:
+                response = self.session.post(endpoint, json=payload, headers=self.headers, timeout=API_TIMEOUT)
+                if response.status_code == 401 and attempt == 0:
+                    with self._token_lock:
+                        self._auto_login()
+                    continue
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                    return True
+                last_error = f"HTTP {response.status_code}"
+            except requests.exceptions.HTTPError as e:
+                # Other 4xx: the payload itself was rejected, retrying won't help
+                print(f"Failed to save vendor contact: {e}")
+                return False
+            except requests.exceptions.RequestException as e:
+                last_error = str(e)
+            if attempt < max_attempts - 1:
+                time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+        print(f"Failed to save vendor contact after {max_attempts} attempts: {last_error}")
+        return False
+
+    def save_vendor_contacts_bulk(
+        self,
+        contacts: Iterable[dict],
+        checkpoint_path: str = "vendor_contacts_uploaded.txt",
+        workers: int = 8,
+        batch_size: int = 1,
+        bulk_path: Optional[str] = None
+    ) -> dict:
+        """Upload a stream of contact dicts with bounded concurrency; resumable via a checkpoint file.
+
+        With bulk_path set (a backend endpoint accepting a JSON list) contacts are posted batch_size
+        at a time, otherwise one POST per contact. Emails already in the checkpoint are skipped.
+        Returns a summary with uploaded/skipped/failed counts and throughput.
+        """
+        summary = {"uploaded": 0, "skipped": 0, "failed": 0, "invalid": 0}
+        if not self.api_token:
+            print(" Cannot upload vendor contacts: No API token configured")
+            return summary
+        self._ensure_fresh_token()
+
+        done = set()
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                done = {line.strip() for line in f if line.strip()}
+
+        endpoint = self._vendor_contact_endpoint(bulk_path or "vendor_contact")
+        lock = threading.Lock()
+        in_flight = threading.BoundedSemaphore(workers * 2)
+        started = time.perf_counter()
+
+        def upload(batch: List[dict]) -> None:
+            try:
+                payloads = [self._vendor_contact_payload(c) for c in batch]
+                ok = self._post_with_retry(endpoint, payloads if bulk_path else payloads[0])
+                with lock:
+                    if ok:
+                        summary["uploaded"] += len(batch)
+                        checkpoint.write("".join(f"{c['email']}\n" for c in batch))
+                        checkpoint.flush()
+                    else:
+                        summary["failed"] += len(batch)
+            finally:
+                in_flight.release()
+
+        batch_size = batch_size if bulk_path else 1
+        with open(checkpoint_path, "a") as checkpoint, ThreadPoolExecutor(max_workers=workers) as executor:
+            batch: List[dict] = []
+            for contact in contacts:
+                email = (contact.get('email') or '').strip().lower()
+                if not email:
+                    summary["invalid"] += 1
+                    continue
+                if email in done:
+                    summary["skipped"] += 1
+                    continue
+                done.add(email)
+                batch.append({**contact, "email": email})
+                if len(batch) >= batch_size:
+                    in_flight.acquire()
+                    executor.submit(upload, batch)
+                    batch = []
+            if batch:
+                in_flight.acquire()
+                executor.submit(upload, batch)
+
+        elapsed = time.perf_counter() - started
+        summary["seconds"] = round(elapsed, 3)
+        summary["per_second"] = round(summary["uploaded"] / elapsed, 1) if elapsed > 0 else 0.0
+        print(f" Vendor contacts: {summary['uploaded']} uploaded, {summary['skipped']} already uploaded, "
+              f"{summary['failed']} failed, {summary['invalid']} without email "
+              f"({summary['per_second']}/s over {summary['seconds']}s)")
+        return summary
+
+    @metrics.timed("api_log_activity")
     def log_activity(
         self,
         activity_count: int,
         notes: str = "",
         candidate_id: int = 0,
-        activity_date: Optional[str] = None
+        activity_date: Optional[str] = None,
+        idempotency_key: Optional[str] = None
     ) -> bool:
         """Log activity to job activity table"""
         if not self.api_token:
@@ -77,6 +223,8 @@ class JobActivityLogger:
         if candidate_id == 0 and self.selected_candidate_id != 0:
             candidate_id = self.selected_candidate_id
 
+        self._ensure_fresh_token()
+
         job_type_id = self._get_job_type_id()
         if job_type_id is None:
             print(" Cannot log activity: Job type not found")
@@ -99,8 +247,11 @@ class JobActivityLogger:
 
         # Try up to 2 times: initial + retry after token refresh
         for attempt in range(2):
+            headers = self.headers
+            if idempotency_key:
+                headers = {**self.headers, "Idempotency-Key": idempotency_key}
             try:
-                response = requests.post(endpoint, json=payload, headers=self.headers)
+                response = self.session.post(endpoint, json=payload, headers=headers, timeout=API_TIMEOUT)
                 if response.status_code == 401 and attempt == 0:
                     # Token might be expired, try to refresh
                     self._auto_login()
@@ -134,6 +285,7 @@ class JobActivityLogger:
                 return False
         return False
 
+    @metrics.timed("api_login")
     def _auto_login(self) -> None:
         """Automatically login and get token using stored credentials"""
         if not (self.wbl_email and self.wbl_password):
@@ -146,13 +298,14 @@ class JobActivityLogger:
             login_url = f"{self.api_url}/api/login"
 
         try:
-            response = requests.post(
+            response = self.session.post(
                 login_url,
                 data={
                     "username": self.wbl_email,
                     "password": self.wbl_password
                 },
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+                timeout=API_TIMEOUT
             )
             response.raise_for_status()
             data = response.json()
@@ -162,6 +315,10 @@ class JobActivityLogger:
                 # Update .env file
                 self._update_env_token(token)
                 self.api_token = token
+                self.headers = {
+                    "Authorization": f"Bearer {self.api_token}",
+                    "Content-Type": "application/json"
+                }
                 print(f"  Token obtained and saved: {token[:20]}...")
             else:
                 print("  ERROR: No access_token in login response")
@@ -169,25 +326,89 @@ class JobActivityLogger:
         except Exception as e:
             print(f"  Auto-login failed: {e}")
 
+    def _ensure_fresh_token(self) -> None:
+        """Log in again ahead of time when the token is about to expire"""
+        expires_at = _jwt_expiry(self.api_token) if self.api_token else None
+        if expires_at is None or expires_at - time.time() > TOKEN_REFRESH_MARGIN:
+            return
+        with self._token_lock:
+            # Another thread may have refreshed it while we waited
+            expires_at = _jwt_expiry(self.api_token)
+            if expires_at is not None and expires_at - time.time() <= TOKEN_REFRESH_MARGIN:
+                self._auto_login()
+
     def _update_env_token(self, token: str) -> None:
-        """Update the WBL_API_TOKEN in .env file"""
+        """Update the WBL_API_TOKEN in .env file (written to a temp file and swapped in atomically)"""
         env_file = ".env"
         try:
-            with open(env_file, 'r') as f:
-                content = f.read()
+            lines = []
+            if os.path.exists(env_file):
+                with open(env_file, 'r') as f:
+                    lines = f.read().splitlines()
 
             # Replace or add the token
-            if "WBL_API_TOKEN=" in content:
-                content = content.replace(f"WBL_API_TOKEN={os.getenv('WBL_API_TOKEN', '')}", f"WBL_API_TOKEN={token}")
-            else:
-                content += f"\nWBL_API_TOKEN={token}\n"
-
-            with open(env_file, 'w') as f:
-                f.write(content)
+            replaced = False
+            for i, line in enumerate(lines):
+                if line.startswith("WBL_API_TOKEN="):
+                    lines[i] = f"WBL_API_TOKEN={token}"
+                    replaced = True
+            if not replaced:
+                lines.append(f"WBL_API_TOKEN={token}")
+
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(env_file)), prefix=".env.")
+            with os.fdopen(fd, 'w') as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp_path, env_file)
+            os.environ['WBL_API_TOKEN'] = token
         except Exception as e:
             print(f"  Failed to update .env with token: {e}")
 
+    def _load_cached_job_type_id(self) -> Optional[int]:
+        try:
+            with open(JOB_TYPE_CACHE_FILE) as f:
+                cache = json.load(f)
+            entry = cache.get(f"{self.api_url}|{self.job_unique_id}")
+            if entry and entry["expires_at"] > time.time():
+                self._job_type_expires = entry["expires_at"]
+                return entry["id"]
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+
+    def _store_cached_job_type_id(self, job_type_id: int) -> None:
+        self._job_type_id = job_type_id
+        self._job_type_expires = time.time() + JOB_TYPE_CACHE_TTL
+        try:
+            cache = {}
+            if os.path.exists(JOB_TYPE_CACHE_FILE):
+                with open(JOB_TYPE_CACHE_FILE) as f:
+                    cache = json.load(f)
+            cache[f"{self.api_url}|{self.job_unique_id}"] = {
+                "id": job_type_id, "expires_at": self._job_type_expires
+            }
+            tmp_path = f"{JOB_TYPE_CACHE_FILE}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, JOB_TYPE_CACHE_FILE)
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Could not cache job type ID: {e}")
+
     def _get_job_type_id(self) -> Optional[int]:
+        """Job type id for JOB_UNIQUE_ID, cached in memory and on disk for JOB_TYPE_CACHE_TTL seconds"""
+        if self._job_type_id is not None and self._job_type_expires > time.time():
+            return self._job_type_id
+        cached = self._load_cached_job_type_id()
+        if cached is not None:
+            self._job_type_id = cached
+            return cached
+        job_type_id = self._fetch_job_type_id()
+        if job_type_id is not None:
+            self._store_cached_job_type_id(job_type_id)
+        return job_type_id
+
+    @metrics.timed("api_job_types")
+    def _fetch_job_type_id(self) -> Optional[int]:
+        self._ensure_fresh_token()
         base_url = self.api_url.rstrip('/')
         if not self.api_url.endswith('/api'):
             base_url = f"{self.api_url}/api"
@@ -197,7 +418,7 @@ class JobActivityLogger:
         # Try up to 2 times: initial + retry after token refresh
         for attempt in range(2):
             try:
-                response = requests.get(endpoint, headers=self.headers)
+                response = self.session.get(endpoint, headers=self.headers, timeout=API_TIMEOUT)
                 if response.status_code == 401 and attempt == 0:
                     # Token might be expired, try to refresh
                     self._auto_login()
@@ -232,6 +453,187 @@ class JobActivityLogger:
         return None
 
 
+_outbox_locks: Dict[str, threading.Lock] = {}
+_outbox_locks_guard = threading.Lock()
+
+
+def _outbox_lock(outbox_dir: str) -> threading.Lock:
+    """One lock per outbox directory, so reporters sharing it never post the same report at once"""
+    with _outbox_locks_guard:
+        return _outbox_locks.setdefault(os.path.abspath(outbox_dir), threading.Lock())
+
+
+class ActivityReporter:
+    """Reports sends to the WBL backend incrementally from a background thread.
+
+    Counts are batched into reports every `flush_every` sends or `flush_interval` seconds. Each report
+    is written to an on-disk outbox before it is posted and removed only once the backend accepted
+    it, so reports survive crashes and are replayed on the next start.
+
+    Reports carry the candidate they are for (0: the logger's SELECTED_CANDIDATE_ID), so reporters
+    for different candidates can share an outbox; whichever replays a report posts it for its own candidate.
+    A report is claimed by renaming it into claimed/ before it is posted, so reporters in several
+    processes sharing the outbox never post the same report twice.
+    """
+
+    def __init__(
+        self,
+        activity_logger: JobActivityLogger,
+        notes: str = "Vendor email campaign progress",
+        outbox_dir: str = "activity_outbox",
+        flush_every: int = 25,
+        flush_interval: float = 300,
+        candidate_id: int = 0
+    ):
+        self.activity_logger = activity_logger
+        self.notes = notes
+        self.candidate_id = candidate_id
+        self.outbox_dir = outbox_dir
+        self.claimed_dir = os.path.join(outbox_dir, "claimed")
+        self.rejected_dir = os.path.join(outbox_dir, "rejected")
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        # Sends of this run the backend accepted; replayed reports from earlier runs are not counted
+        self.reported_count = 0
+        self._created_ids = set()
+        self._unreported = 0
+        self._lock = threading.Lock()
+        self._submit_lock = _outbox_lock(outbox_dir)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        os.makedirs(self.claimed_dir, exist_ok=True)
+        os.makedirs(self.rejected_dir, exist_ok=True)
+
+    def start(self) -> "ActivityReporter":
+        self._thread = threading.Thread(target=self._loop, name="activity-reporter", daemon=True)
+        self._thread.start()
+        return self
+
+    def record_send(self, count: int = 1) -> None:
+        """Count sent emails; never blocks on the network"""
+        with self._lock:
+            self._unreported += count
+            if self._unreported >= self.flush_every:
+                self._wake.set()
+
+    def _loop(self) -> None:
+        # Replay whatever a previous run left in the outbox
+        self._submit_outbox()
+        while not self._stopping.is_set():
+            self._wake.wait(timeout=self.flush_interval)
+            self._wake.clear()
+            self._write_report()
+            self._submit_outbox()
+
+    def _write_report(self, final: bool = False) -> None:
+        with self._lock:
+            count, self._unreported = self._unreported, 0
+        if count <= 0:
+            return
+        report_id = uuid.uuid4().hex
+        self._created_ids.add(report_id)
+        report = {
+            "id": report_id,
+            "activity_count": count,
+            "activity_date": date.today().isoformat(),
+            "candidate_id": self.candidate_id,
+            "notes": f"{self.notes}: sent {count} emails{' (final)' if final else ''} [report {report_id[:12]}]",
+        }
+        # Time-ordered names make replay happen in the order reports were created
+        path = os.path.join(self.outbox_dir, f"{time.time_ns()}_{report_id}.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(report, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _submit_outbox(self) -> None:
+        with self._submit_lock:
+            self._submit_pending_reports()
+
+    def _recover_claims(self, stale_after: float = STALE_CLAIM_SECONDS) -> None:
+        """Put reports claimed by a reporter that died before finishing back in the outbox"""
+        cutoff = time.time() - stale_after
+        with os.scandir(self.claimed_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.rename(entry.path, os.path.join(self.outbox_dir, entry.name))
+                except FileNotFoundError:
+                    pass
+
+    def _claim(self, name: str) -> Optional[str]:
+        """Move a report into claimed/; None if another reporter got it first"""
+        claimed = os.path.join(self.claimed_dir, name)
+        try:
+            os.rename(os.path.join(self.outbox_dir, name), claimed)
+        except FileNotFoundError:
+            return None
+        # rename keeps the write time; the claim time is what _recover_claims() looks at
+        os.utime(claimed)
+        return claimed
+
+    def _submit_pending_reports(self) -> None:
+        self._recover_claims()
+        for name in sorted(os.listdir(self.outbox_dir)):
+            if not name.endswith(".json"):
+                continue
+            path = self._claim(name)
+            if path is None:
+                continue
+            try:
+                with open(path) as f:
+                    report = json.load(f)
+                fields = dict(
+                    activity_count=report["activity_count"],
+                    notes=report["notes"],
+                    activity_date=report["activity_date"],
+                    candidate_id=report.get("candidate_id", 0),
+                    idempotency_key=report["id"]
+                )
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                # Retrying won't fix it; set it aside for a person to look at
+                print(f"  ⚠️ Moving unreadable activity report {name} to {self.rejected_dir}: {e}")
+                self._reject(path)
+                continue
+
+            ok = self.activity_logger.log_activity(**fields)
+            if not ok:
+                # Keep it (and everything after it) for the next flush
+                self._unclaim(path)
+                return
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Already handled by another reporter
+                pass
+            if report["id"] in self._created_ids:
+                self.reported_count += report["activity_count"]
+
+    def _reject(self, path: str) -> None:
+        try:
+            os.rename(path, os.path.join(self.rejected_dir, os.path.basename(path)))
+        except FileNotFoundError:
+            pass
+
+    def _unclaim(self, path: str) -> None:
+        try:
+            os.rename(path, os.path.join(self.outbox_dir, os.path.basename(path)))
+        except FileNotFoundError:
+            pass
+
+    def close(self, timeout: float = 30) -> None:
+        """Flush remaining counts and try once more to deliver the outbox"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._write_report(final=True)
+        self._submit_outbox()
+
+
 # Convenience function for simple usage
 def log_job_activity(count: int, notes: str = "") -> bool:
     logger = JobActivityLogger()
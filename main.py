@@ -1,51 +1,136 @@
 #vendor emails
 
 
+import argparse
 import json
 import smtplib
+import ssl
 import os
-import csv
 import logging
 import time
-import random
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
+import queue
+import threading
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor, wait
 from dotenv import load_dotenv
 from datetime import datetime
-from job_activity_logger import JobActivityLogger
+from job_activity_logger import JobActivityLogger, ActivityReporter
+from smtp_pool import SMTPConnectionPool
+from async_smtp import AsyncSMTPPool
+from metrics import registry as metrics, MetricsExporter, profiled
+from event_log import console, log_event, start_logging
+from message_template import MessageTemplate, recipient_context
+from message_spool import MessageSpool
+from recipient_ingest import IngestStats, expand_sources, iter_recipients
+from send_ledger import SendLedger, PENDING, SENT, FAILED, DEFERRED, SENDING
+from suppression_index import SuppressionIndex, CONTACTED, BOUNCED
+from address_validator import AddressValidator, DISPOSABLE_DOMAINS
+from account_scheduler import AccountScheduler
+from shard_lease import ShardLease, accounts_for_shard
+from domain_throttle import DomainScheduler, recipient_domain
+from bounce_processor import BounceStore, open_source, process_bounces
+from delivery_policy import (
+    classify_exception, decide_failure,
+    ACCOUNT_LIMIT, ACCOUNT_AUTH, TEMPORARY, RECIPIENT_PERMANENT, SWITCH, DEFER
+)
 
 # Load environment variables
 load_dotenv()
 
-# Setup logging
-os.makedirs("logs", exist_ok=True)
-logging.basicConfig(
-    filename=f"logs/email_sender_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log",
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
 # Load email accounts from JSON file
 with open(os.getenv("EMAIL_ACCOUNTS_FILE"), 'r') as f:
     email_accounts = json.load(f)
 
-current_account_index = 0
-emails_sent_with_current_account = 0
-MAX_EMAILS_PER_ACCOUNT = 100
-PROGRESS_FILE = "last_index.txt"
+# Default rolling 24h quota; an account can override it with "DAILY_QUOTA" in email_accounts.json
+MAX_EMAILS_PER_ACCOUNT = int(os.getenv("MAX_EMAILS_PER_ACCOUNT", "100"))
+SEND_DELAY_RANGE = (5, 15)
+# Number of accounts sending at the same time (defaults to all accounts)
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "0")) or len(email_accounts)
+ACCOUNT_USAGE_DB = os.getenv("ACCOUNT_USAGE_DB", "account_usage.db")
+# Wait for quota to come back instead of stopping when every account is used up
+PAUSE_ON_EXHAUSTED = os.getenv("PAUSE_ON_EXHAUSTED", "0") == "1"
+# Temporary (4xx) failures are retried with exponential backoff starting at RETRY_BASE_DELAY seconds
+MAX_SEND_ATTEMPTS = int(os.getenv("MAX_SEND_ATTEMPTS", "5"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "300"))
+# Keep the run alive for deferred retries due within this many seconds
+RETRY_WAIT_LIMIT = float(os.getenv("RETRY_WAIT_LIMIT", "900"))
+# Activity reports to the WBL backend: every N sends or every M seconds, whichever comes first
+ACTIVITY_FLUSH_EVERY = int(os.getenv("ACTIVITY_FLUSH_EVERY", "25"))
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "300"))
+ACTIVITY_OUTBOX_DIR = os.getenv("ACTIVITY_OUTBOX_DIR", "activity_outbox")
+# Stage timing export (Prometheus textfile and/or JSON snapshot) and optional cProfile output
+METRICS_PROM_FILE = os.getenv("METRICS_PROM_FILE", "")
+METRICS_JSON_FILE = os.getenv("METRICS_JSON_FILE", "")
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "15"))
+PROFILE_OUTPUT = os.getenv("PROFILE_OUTPUT", "")
+# Logs go to LOG_DIR/email_sender.log and LOG_DIR/events.jsonl, rotated by size and age and gzipped
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "20"))
+LOG_ROTATE_SECONDS = float(os.getenv("LOG_ROTATE_SECONDS", "86400"))
+# Quiet console: a progress line every PROGRESS_INTERVAL seconds instead of one line per recipient
+QUIET = os.getenv("QUIET", "0") == "1"
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "10"))
+SEND_LEDGER_DB = os.getenv("SEND_LEDGER_DB", "send_ledger.db")
+SUPPRESSION_DB = os.getenv("SUPPRESSION_DB", "suppression.db")
+# Mailboxes read for bounces before each campaign: mbox files, Maildirs or imap(s):// URLs, comma-separated
+BOUNCE_SOURCES = os.getenv("BOUNCE_SOURCES", "")
+BOUNCE_DB = os.getenv("BOUNCE_DB", "bounces.db")
+# Vendors contacted by any campaign within this many days are skipped
+SUPPRESSION_COOLDOWN_DAYS = float(os.getenv("SUPPRESSION_COOLDOWN_DAYS", "30"))
+# Pre-flight address validation
+VALIDATE_DOMAINS = os.getenv("VALIDATE_DOMAINS", "1") != "0"
+DISPOSABLE_DOMAINS_FILE = os.getenv("DISPOSABLE_DOMAINS_FILE", "")
+# Comma-separated CSV files or globs with an 'Email' column
+VENDOR_CSV_FILES = os.getenv("VENDOR_CSV_FILES", "vendoremails.csv")
+# Render every message into this on-disk spool before sending (empty = render as each email is sent)
+SPOOL_DIR = os.getenv("SPOOL_DIR", "")
+# Sharded runs: SHARD_COUNT workers sharing SEND_LEDGER_DB split the recipients and the accounts between them
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "1"))
+SHARD_INDEX = os.getenv("SHARD_INDEX", "")  # empty: take the first free shard
+SHARD_LEASE_TTL = float(os.getenv("SHARD_LEASE_TTL", "60"))
+# Sends to any one receiving domain (0 = unlimited); recipients are interleaved across domains either way
+DOMAIN_RATE_PER_MINUTE = float(os.getenv("DOMAIN_RATE_PER_MINUTE", "10"))
+DOMAIN_BURST = int(os.getenv("DOMAIN_BURST", "3"))
+# Recipients per domain waiting in the feed; the rest stay in the ledger until the domain catches up
+DOMAIN_BACKLOG = max(2 * DOMAIN_BURST, 4)
 
 SMTP_HOST = os.getenv("SMTP_SERVER")
 SMTP_PORT = int(os.getenv("SMTP_PORT"))
 REPLY_TO_EMAIL = os.getenv("REPLY_TO_EMAIL")
+SMTP_IDLE_TIMEOUT = int(os.getenv("SMTP_IDLE_TIMEOUT", "300"))
+# "smtplib" (one blocking session per worker thread) or "async" (all sessions on one event loop, pipelined)
+SMTP_TRANSPORT = os.getenv("SMTP_TRANSPORT", "smtplib")
+SMTP_TLS_VERIFY = os.getenv("SMTP_TLS_VERIFY", "1") != "0"
+
+
+def _tls_context() -> ssl.SSLContext:
+    context = ssl.create_default_context()
+    if not SMTP_TLS_VERIFY:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+# Authenticated SMTP sessions, one per account, reused across sends
+if SMTP_TRANSPORT == "async":
+    smtp_pool = AsyncSMTPPool(SMTP_HOST, SMTP_PORT, idle_timeout=SMTP_IDLE_TIMEOUT, tls_context=_tls_context())
+else:
+    smtp_pool = SMTPConnectionPool(SMTP_HOST, SMTP_PORT, idle_timeout=SMTP_IDLE_TIMEOUT)
+
+FROM_HEADER = "Sai madhavi <saimadhavi.ip@gmail.com>"
 
 # Path to resume PDF
 RESUME_PATH = "Sai_madhavi.pdf"  # Place your PDF file here
 
-# Subject and Body
+# Subject and Body; {placeholders} are filled from each recipient's CSV columns (e.g. {company},
+# {first_name|there} with a fallback). Column names are lower-cased with spaces as underscores.
 subject = "AI Engineer | USC "
 
-text_body = """Hi,
+# Recipients already sent under the same campaign id are skipped on re-runs
+CAMPAIGN_ID = os.getenv("CAMPAIGN_ID", subject.strip())
+
+text_body = """Hi {first_name|there},
 
 I’m an AI Engineer with experience building production-grade Agentic AI and RAG systems. I’ve worked on large-scale GenAI platforms with multi-agent orchestration, memory systems, secure tool use, and cloud-native deployment.
 
@@ -71,135 +156,723 @@ Best regards,
 🔗 LinkedIn: https://www.linkedin.com/in/sai-madhavi/
 """
 
-def get_next_email_account(force_switch=False):
-    global current_account_index, emails_sent_with_current_account
-    if force_switch or emails_sent_with_current_account >= MAX_EMAILS_PER_ACCOUNT:
-        current_account_index = (current_account_index + 1) % len(email_accounts)
-        emails_sent_with_current_account = 0
-        print(f"\nSwitching to email account: {email_accounts[current_account_index]['EMAIL_USER']}\n")
-    account = email_accounts[current_account_index]
-    emails_sent_with_current_account += 1
-    return account
-
-
-def send_email(to_email):
-    account = get_next_email_account()
-
-    msg = MIMEMultipart()
-    msg["Subject"] = subject
-    msg["From"] = "Sai madhavi <saimadhavi.ip@gmail.com>"
-    msg["To"] = to_email
-    msg["Reply-To"] = REPLY_TO_EMAIL
-
-    # Attach body
-    msg.attach(MIMEText(text_body, "plain"))
-
-    # Attach resume PDF
-    if os.path.exists(RESUME_PATH):
-        with open(RESUME_PATH, "rb") as f:
-            part = MIMEApplication(f.read(), Name=os.path.basename(RESUME_PATH))
-        part['Content-Disposition'] = f'attachment; filename="{os.path.basename(RESUME_PATH)}"'
-        msg.attach(part)
-    else:
-        print(f"⚠ Resume file not found: {RESUME_PATH}")
 
-    # Send the email
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-        server.starttls()
-        server.login(account["EMAIL_USER"], account["EMAIL_PASS"])
-        server.send_message(msg)
+class Campaign:
+    """One campaign: its message and attachment, the CSV files it goes to, and the candidate its sends are
+    reported for (0: SELECTED_CANDIDATE_ID). weight is its share of the account pool when campaigns run together.
+    """
+
+    def __init__(self, campaign_id, subject, text_body, resume_path, csv_files, candidate_id=0, weight=1.0):
+        self.campaign_id = campaign_id
+        self.subject = subject
+        self.text_body = text_body
+        self.resume_path = resume_path
+        self.csv_files = csv_files
+        self.candidate_id = candidate_id
+        self.weight = weight
+        self._template = None
+
+    @classmethod
+    def configured(cls):
+        """The campaign set up in this file (and CAMPAIGN_ID/VENDOR_CSV_FILES)"""
+        return cls(CAMPAIGN_ID, subject, text_body, RESUME_PATH, VENDOR_CSV_FILES)
+
+    @property
+    def template(self):
+        # Built on first use, so the attachment is read and encoded once per campaign
+        if self._template is None:
+            self._template = MessageTemplate(
+                self.subject, self.text_body, FROM_HEADER, REPLY_TO_EMAIL, self.resume_path
+            )
+        return self._template
+
+
+# The configured campaign's message; set at the start of each run
+message_template = None
+
+def get_message_template():
+    """Campaign message built once; reset at the start of each run"""
+    global message_template
+    if message_template is None:
+        message_template = Campaign.configured().template
+    return message_template
+
+
+def send_email(to_email, account, data=None, context=None, template=None):
+    template = template or get_message_template()
+    if data is None:
+        with metrics.timer("render", account["EMAIL_USER"]):
+            data = template.render(to_email, context)
+
+    # Send the pre-rendered email over the account's pooled session
+    smtp_pool.sendmail(account, template.envelope_from, [to_email], data)
 
     return account["EMAIL_USER"]
 
-# 🔹 Fetch emails from CSV file
-def fetch_vendor_emails():
-    EMAIL_CSV = "vendoremails.csv"  # Your CSV file in the same directory
-    emails = []
-    total_rows = 0
-    if os.path.exists(EMAIL_CSV):
-        with open(EMAIL_CSV, newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                total_rows += 1
-                email = row.get("Email", "").strip()
-                if email:  # skip empty emails
-                    emails.append(email)
+# 🔹 Stream recipients from CSV files
+def fetch_vendor_recipients(stats=None, suppression=None, validator=None, lease=None, fields=(), csv_files=None):
+    """Yield (email, template context) for each normalized, de-duplicated, deliverable-looking recipient
+    in csv_files (default VENDOR_CSV_FILES); the context holds only the CSV values the message template uses"""
+    csv_files = csv_files or VENDOR_CSV_FILES
+    sources = csv_files.split(",")
+    if not expand_sources(sources):
+        print(f"⚠ CSV file not found: {csv_files}")
+        return
+    rows = iter_recipients(sources, email_column="Email", stats=stats)
+    if lease is not None:
+        # Only this worker's shard; the other shards' workers register theirs
+        rows = (row for row in rows if lease.owns(row["Email"]))
+    if suppression is not None:
+        rows = _unsuppressed(rows, suppression, stats)
+    if validator is not None:
+        # Bad syntax, disposable and undeliverable domains never reach SMTP
+        rows = validator.filter(rows, key=itemgetter("Email"))
+    for row in rows:
+        if stats is not None:
+            stats.deliverable += 1
+        yield row["Email"], (recipient_context(row, fields) if fields else None)
+
+
+def _unsuppressed(rows, suppression, stats):
+    """Skip opted-out/bounced vendors and those contacted within the cool-down window"""
+    cooldown = SUPPRESSION_COOLDOWN_DAYS * 86400
+    for row in rows:
+        if suppression.is_suppressed(row["Email"], cooldown):
+            if stats is not None:
+                stats.suppressed += 1
+            continue
+        yield row
+
+
+class RecipientFeed:
+    """Hand-off from the reader thread to the send workers, interleaved and rate-limited by recipient domain.
+
+    put() never blocks; the reader keeps the feed to about maxsize recipients and DOMAIN_BACKLOG per domain.
+    """
+
+    def __init__(self, maxsize=1000, domain_rate=0, domain_burst=1, limits_from=None):
+        self.maxsize = maxsize
+        # Feeds of campaigns running side by side share one set of per-domain limits
+        self._domains = DomainScheduler(
+            domain_rate, domain_burst, limits_from._domains if limits_from is not None else None
+        )
+        self._retries = queue.Queue()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.finished = threading.Event()
+
+    def __len__(self):
+        return len(self._domains)
+
+    def put(self, item, stop_event):
+        if stop_event.is_set():
+            return False
+        self._domains.put(recipient_domain(item[0]), item)
+        return True
+
+    def backlog(self, domain):
+        return self._domains.backlog(domain)
+
+    def wait_for_room(self, stop_event):
+        while len(self) >= self.maxsize and not stop_event.wait(0.05):
+            pass
+
+    def slow_down(self, email):
+        """The recipient's domain deferred a send; give it a rest before its next one"""
+        self._domains.slow_down(recipient_domain(email))
+
+    def retry(self, item):
+        self._retries.put(item)
+
+    def get(self, stop_event):
+        """Next (email, attempts, is_retry, context), or None once the feed is drained or stopped"""
+        while not stop_event.is_set():
+            item = self.poll(timeout=0.5)
+            if item is not None:
+                return item
+            if self.drained():
+                return None
+        return None
+
+    def poll(self, timeout=0):
+        """Next item if one may be sent within timeout, else None"""
+        try:
+            item = self._retries.get_nowait()
+        except queue.Empty:
+            item = self._domains.get(timeout=timeout)
+        if item is not None:
+            with self._lock:
+                self._in_flight += 1
+        return item
+
+    def drained(self):
+        """True once the reader has finished and every item has been handed out and dealt with"""
+        return self.finished.is_set() and self.idle()
+
+    def done(self):
+        """Called by a worker when it has finished with an item from get()"""
+        with self._lock:
+            self._in_flight -= 1
+
+    def idle(self):
+        with self._lock:
+            return self._in_flight == 0 and len(self._domains) == 0 and self._retries.empty()
+
+
+def _register_recipients(campaign, ledger, suppression, validator, stats, lease=None):
+    """Add every CSV recipient to the ledger; already-known recipients keep their state"""
+    with metrics.timer("ingest"):
+        recipients = fetch_vendor_recipients(
+            stats, suppression, validator, lease, campaign.template.fields, campaign.csv_files
+        )
+        added = ledger.add_recipients(campaign.campaign_id, recipients)
+    print(stats.summary())
+    logging.info(stats.summary())
+    print(validator.summary())
+    logging.info(validator.summary())
+    if lease is None and added != stats.deliverable:
+        print(f"Resuming campaign '{campaign.campaign_id}': {stats.deliverable - added} recipients already in the ledger")
+
+
+def _render_to_spool(campaign, spool, email, context=None):
+    """Render a recipient's message into the spool ahead of the send workers, unless it is already there"""
+    if spool is None or spool.contains(email):
+        return False
+    with metrics.timer("render"):
+        data = campaign.template.render(email, context)
+    return spool.add(email, data)
+
+
+def _feed_domain(campaign, feed, ledger, spool, shard, domain, after, limit, stop_event):
+    """Queue up to `limit` more pending recipients at one domain; returns the last one, or None if that was all"""
+    rows = ledger.pending_in_domain(campaign.campaign_id, domain, after, limit, shard=shard)
+    for email, context in rows:
+        _render_to_spool(campaign, spool, email, context)
+        feed.put((email, 0, False, context), stop_event)
+    return rows[-1][0] if len(rows) == limit else None
+
+
+def _feed_pending(campaign, feed, ledger, spool, shard, stop_event):
+    """Hand out pending recipients a few per receiving domain at a time.
+
+    Domains are taken from the ledger in turn while the feed has room, and each one is topped up as
+    the workers drain it, so a domain with thousands of recipients holds DOMAIN_BACKLOG places in the
+    feed and can't crowd out the others. Returns False if stopped first.
+    """
+    cursors = {}  # domain -> last recipient queued, for domains with more pending
+    last_domain = ""
+    more_domains = True
+    while not stop_event.is_set():
+        for domain, after in list(cursors.items()):
+            want = DOMAIN_BACKLOG - feed.backlog(domain)
+            if want > 0:
+                last = _feed_domain(campaign, feed, ledger, spool, shard, domain, after, want, stop_event)
+                if last is None:
+                    del cursors[domain]
                 else:
-                    print(f"DEBUG: Skipping row {total_rows} - No email found in 'Email' column")
-        print(f"DEBUG: Processed {total_rows} total rows, found {len(emails)} valid emails.")
-    else:
-        print(f"⚠ CSV file not found: {EMAIL_CSV}")
-    return emails
+                    cursors[domain] = last
+        while more_domains and len(feed) < feed.maxsize and not stop_event.is_set():
+            domains = ledger.pending_domains(campaign.campaign_id, last_domain, shard=shard)
+            if not domains:
+                more_domains = False
+            for domain in domains:
+                last_domain = domain
+                last = _feed_domain(campaign, feed, ledger, spool, shard, domain, "", DOMAIN_BACKLOG, stop_event)
+                if last is not None:
+                    cursors[domain] = last
+                if len(feed) >= feed.maxsize:
+                    break
+        if not more_domains and not cursors:
+            return True
+        stop_event.wait(0.05)
+    return False
+
+
+def _feed_recipients(
+    campaign, feed, ledger, suppression, validator, scheduler, spool, lease, stats, stop_event, register=True
+):
+    """Reader thread for one campaign; register=False when its recipients were registered beforehand,
+    and no forecast is printed without a scheduler"""
+    shard = lease.key if lease is not None else None
+    campaign_id = campaign.campaign_id
+    try:
+        # Register every CSV recipient, then hand out only the ones not yet sent
+        if register:
+            _register_recipients(campaign, ledger, suppression, validator, stats, lease)
+        if scheduler is not None:
+            _print_forecast(scheduler, ledger.counts(campaign_id, shard=shard).get(PENDING, 0))
+        if not _feed_pending(campaign, feed, ledger, spool, shard, stop_event):
+            return
+
+        # Deferred (4xx) recipients are retried as their backoff expires, if that is soon enough
+        while not stop_event.is_set():
+            feed.wait_for_room(stop_event)
+            for email, attempts, context in ledger.claim_due_retries(campaign_id, shard=shard):
+                _render_to_spool(campaign, spool, email, context)
+                if not feed.put((email, attempts, False, context), stop_event):
+                    return
+            next_retry = ledger.next_retry_at(campaign_id, shard=shard)
+            if feed.idle() and (next_retry is None or next_retry - time.time() > RETRY_WAIT_LIMIT):
+                if next_retry is not None:
+                    when = datetime.fromtimestamp(next_retry).strftime('%Y-%m-%d %H:%M')
+                    print(f"Deferred recipients of '{campaign_id}' remain; the next retry is due around {when} "
+                          f"(re-run to retry)")
+                return
+            stop_event.wait(1)
+    finally:
+        feed.finished.set()
+
+
+class CampaignProgress:
+    """Thread-safe counters for the current run; durable per-recipient state lives in the send ledger"""
+
+    def __init__(self):
+        self.sent_count = 0
+        self.failed_count = 0
+        self.deferred_count = 0
+        self.interrupted = False
+        self._lock = threading.Lock()
+
+    def record(self, sent):
+        with self._lock:
+            if sent:
+                self.sent_count += 1
+            else:
+                self.failed_count += 1
 
-def run():
-    print("Starting email campaign...")
-    logging.info("Starting email campaign")
-    activity_logger = JobActivityLogger()
-    vendor_emails = fetch_vendor_emails()  # All emails from CSV
-    print(f"Loaded {len(vendor_emails)} emails from CSV")
-    logging.info(f"Loaded {len(vendor_emails)} emails from CSV")
-    
-    if len(vendor_emails) == 0:
-        print("⚠️ No emails found in CSV file. Exiting.")
-        return
+    def record_deferred(self):
+        with self._lock:
+            self.deferred_count += 1
 
-    # Resume logic
-    start_index = 0
-    if os.path.exists(PROGRESS_FILE):
-        try:
-            with open(PROGRESS_FILE, "r") as f:
-                start_index = int(f.read().strip())
-            print(f"Resuming from index {start_index}")
-        except:
-            start_index = 0
-    
-    sent_count = 0
-    for i in range(start_index, len(vendor_emails)):
-        email = vendor_emails[i]
+
+def _print_progress(progress, stop_event, interval):
+    """Quiet console mode: one progress line every `interval` seconds instead of a line per recipient"""
+    started = time.monotonic()
+    while not stop_event.wait(interval):
+        elapsed = time.monotonic() - started
+        print(f"Progress: {progress.sent_count} sent, {progress.failed_count} failed, "
+              f"{progress.deferred_count} deferred ({progress.sent_count / elapsed:.1f}/s)")
+
+
+def _send_worker(campaign, scheduler, feed, ledger, suppression, progress, reporter, spool, lease, stop_event):
+    """Send queued emails, each from the account the scheduler picks; pacing is kept per account"""
+    while not stop_event.is_set():
+        item = feed.get(stop_event)
+        if item is None:
+            return
         try:
-            sender_email = send_email(email)
-            sent_count += 1
-            logging.info(f"SUCCESS: Sent to {email} using {sender_email}")
-            print(f"✅ Sent to {email} using {sender_email}")
-            
-            # Save progress
-            with open(PROGRESS_FILE, "w") as f:
-                f.write(str(i + 1))
-            
-            # Random delay between 5 to 15 seconds
-            time.sleep(random.uniform(5, 15))
-            
-        except smtplib.SMTPResponseException as e:
-            error_code = e.smtp_code
-            error_msg = e.smtp_error.decode('utf-8', errors='ignore')
-            if error_code == 550 or "limit exceeded" in error_msg.lower():
-                print(f"⚠️ Limit reached for {email_accounts[current_account_index]['EMAIL_USER']}. Switching...")
-                get_next_email_account(force_switch=True)
-                # Retry the same email with the new account
-                try:
-                    sender_email = send_email(email)
-                    sent_count += 1
-                    print(f"✅ Sent to {email} using {sender_email} (after switch)")
-                    with open(PROGRESS_FILE, "w") as f:
-                        f.write(str(i + 1))
-                except Exception as retry_e:
-                    print(f"❌ Failed even after switch: {retry_e}")
+            _send_one(
+                campaign, scheduler, feed, ledger, suppression, progress, reporter, spool, lease, stop_event, *item
+            )
+        finally:
+            feed.done()
+
+
+def _send_one(
+    campaign, scheduler, feed, ledger, suppression, progress, reporter, spool, lease, stop_event,
+    email, attempts, is_retry, context=None
+):
+    account = scheduler.acquire(stop_event, wait_for_capacity=PAUSE_ON_EXHAUSTED, max_wait=RETRY_WAIT_LIMIT)
+    if account is None:
+        # Pool is out of quota; the recipient stays pending in the ledger for the next run
+        stop_event.set()
+        return
+
+    claimed = lease.claim(email) if lease is not None else ledger.claim_send(campaign.campaign_id, email)
+    if not claimed:
+        # Already handled by another worker or process, or this worker's lease on the shard has passed on
+        scheduler.release(account, sent=False, delay=0)
+        if lease is not None and lease.lost.is_set():
+            stop_event.set()
+        return
+    # Rendered ahead if it is in the spool, otherwise rendered now
+    spooled = spool.claim(email) if spool is not None else None
+
+    sent = False
+    soft_error = False
+    finished = True
+    user = account['EMAIL_USER']
+    campaign_id = campaign.campaign_id
+    started = time.perf_counter()
+    try:
+        send_email(email, account, spooled.data if spooled is not None else None, context, campaign.template)
+        sent = True
+        send_ms = round((time.perf_counter() - started) * 1000, 1)
+        progress.record(sent=True)
+        reporter.record_send()
+        ledger.record(campaign_id, email, SENT, account=user, smtp_code=250)
+        suppression.add(email, CONTACTED)
+        log_event(SENT, campaign=campaign_id, email=email, account=user, smtp_code=250,
+                  attempt=attempts + 1, switched=is_retry, send_ms=send_ms)
+        suffix = " (after switch)" if is_retry else ""
+        console.info(f"✅ Sent to {email} using {user}{suffix}")
+        logging.info(f"SUCCESS: Sent to {email} using {user}")
+    except Exception as e:
+        send_ms = round((time.perf_counter() - started) * 1000, 1)
+        error_class, error_code, error_msg = classify_exception(e)
+        attempts += 1
+        outcome = dict(campaign=campaign_id, email=email, account=user, smtp_code=error_code,
+                       error_class=error_class, error=error_msg, attempt=attempts, send_ms=send_ms)
+        decision = decide_failure(error_class, error_code, attempts, is_retry, MAX_SEND_ATTEMPTS,
+                                  time.time(), retry_base=RETRY_BASE_DELAY)
+        soft_error = decision.soft_error
+        if decision.account_fault:
+            reason = "Limit reached" if error_class == ACCOUNT_LIMIT else "Login rejected"
+            print(f"⚠️ {reason} for {user}. Switching...")
+            scheduler.mark_unhealthy(account)
+        if decision.account_fault or soft_error:
+            smtp_pool.invalidate(account)
+        if decision.slows_domain:
+            feed.slow_down(email)
+
+        action = decision.action
+        if action == SWITCH:
+            # Retry the same email with another account
+            finished = False
+            log_event("switched", **outcome)
+            ledger.record(campaign_id, email, PENDING, user, error_code, error_msg)
+            feed.retry((email, attempts, True, context))
+        elif action == DEFER:
+            retry_at = decision.retry_at
+            when = datetime.fromtimestamp(retry_at).strftime('%H:%M:%S')
+            log_event(DEFERRED, retry_at=round(retry_at, 3), **outcome)
+            console.info(f"⏳ Deferred {email} ({error_code or 'connection'}): retrying around {when}")
+            finished = False
+            progress.record_deferred()
+            ledger.record(campaign_id, email, DEFERRED, user, error_code, error_msg, next_attempt_at=retry_at)
+        else:
+            log_event(FAILED, **outcome)
+            if error_class in (ACCOUNT_LIMIT, ACCOUNT_AUTH):
+                console.info(f"❌ Failed even after switch: {e}")
+            elif error_class == TEMPORARY:
+                console.info(f"❌ Giving up on {email} after {attempts} attempts: {e}")
+            else:
+                console.info(f"❌ Failed to send to {email}: {e}")
+            logging.error(f"FAILED: Could not send to {email} - {e}")
+            progress.record(sent=False)
+            ledger.record(campaign_id, email, FAILED, user, error_code, error_msg)
+            if error_class == RECIPIENT_PERMANENT:
+                # Mailbox doesn't exist: never mail it again from any campaign
+                suppression.add(email, BOUNCED)
+    finally:
+        if spooled is not None:
+            # Sent or failed for good leaves the spool; anything to be retried goes back to new/
+            if finished:
+                spool.complete(spooled)
             else:
-                print(f"❌ SMTP Error: {e}")
-        except Exception as e:
-            logging.error(f"FAILED: Could not send to {email} - {str(e)}")
-            print(f"❌ Failed to send to {email}: {e}")
+                spool.release(spooled)
+        delay = scheduler.release(account, sent=sent, soft_error=soft_error)
+        # The deliberate pause, so it can be compared with time spent on the wire
+        metrics.observe("pacing_delay", delay, user)
+
+
+def _print_forecast(scheduler, pending):
+    forecast = scheduler.forecast(pending, mean_delay=sum(SEND_DELAY_RANGE) / 2)
+    finish = datetime.fromtimestamp(forecast["finish_at"]).strftime('%Y-%m-%d %H:%M')
+    message = (f"Account pool: {forecast['capacity']} sends left in the 24h window across "
+               f"{forecast['accounts_available']} account(s) for {pending} pending emails")
+    print(message)
+    logging.info(message)
+    if forecast["runs_out"]:
+        resume = datetime.fromtimestamp(forecast["capacity_returns_at"]).strftime('%Y-%m-%d %H:%M')
+        action = "pausing" if PAUSE_ON_EXHAUSTED else "stopping"
+        print(f"⚠️ Pool will run out around {finish}; {action} until capacity returns around {resume}")
+    else:
+        print(f"Estimated completion around {finish}")
 
-    logging.info(f"Campaign completed: {sent_count} successful sends out of {len(vendor_emails)} attempts")
 
-    # Log total sent emails to API
-    if sent_count > 0:
-        print(f"\nLogging activity to WBL backend...")
-        activity_logger.log_activity(
-            activity_count=sent_count,
-            notes=f"Vendor email campaign completed. Sent {sent_count} emails."
+def build_address_validator():
+    disposable = None
+    if DISPOSABLE_DOMAINS_FILE and os.path.exists(DISPOSABLE_DOMAINS_FILE):
+        disposable = DISPOSABLE_DOMAINS | set(AddressValidator.load_domain_list(DISPOSABLE_DOMAINS_FILE))
+    return AddressValidator(disposable_domains=disposable, check_domains=VALIDATE_DOMAINS)
+
+
+def _open_spool(campaign):
+    if not SPOOL_DIR:
+        return None
+    spool = MessageSpool(SPOOL_DIR, campaign.campaign_id)
+    recovered = spool.recover()
+    if recovered:
+        print(f"Recovered {recovered} spooled message(s) left claimed by an earlier run")
+    return spool
+
+
+def _close_spool(spool, counts):
+    """Drop a finished campaign's spool; one with recipients still to send keeps its rendered messages"""
+    if spool is not None and not any(counts.get(status) for status in (PENDING, DEFERRED, SENDING)):
+        spool.remove()
+
+
+def render_campaign():
+    """Register recipients and render every pending message into the spool without sending anything"""
+    if not SPOOL_DIR:
+        print("⚠ Set SPOOL_DIR to render a campaign ahead of sending")
+        return
+    campaign = Campaign.configured()
+    ledger = SendLedger(SEND_LEDGER_DB)
+    suppression = SuppressionIndex(SUPPRESSION_DB)
+    spool = _open_spool(campaign)
+    try:
+        _register_recipients(campaign, ledger, suppression, build_address_validator(), IngestStats())
+        rendered = sum(
+            _render_to_spool(campaign, spool, email, context)
+            for email, context in ledger.pending(campaign.campaign_id, with_context=True)
         )
-        logging.info(f"API logging completed for {sent_count} emails")
+    finally:
+        ledger.close()
+        suppression.close()
+    counts = spool.counts()
+    print(f"Spooled {rendered} message(s) for '{campaign.campaign_id}' in {spool.root} ({counts['new']} ready to send)")
+    print(f"Inspect with: python message_spool.py '{campaign.campaign_id}' --spool {SPOOL_DIR} --list 20")
+
+
+def _send_campaign(campaign, accounts, ledger, suppression, validator, spool, reporter, lease, stats, progress):
+    """Send every pending recipient (of the leased shard, when sharded) from `accounts`; False if interrupted"""
+    # Per-account sends in the last 24h survive restarts
+    scheduler = AccountScheduler(
+        accounts, ACCOUNT_USAGE_DB, default_quota=MAX_EMAILS_PER_ACCOUNT, pacing=SEND_DELAY_RANGE
+    )
+    stop_event = threading.Event()
+
+    # CSV rows are registered in the ledger, then pending recipients are streamed to the send workers
+    # Each shard's worker has its own token buckets, so the workers split every domain's rate between them
+    shards = SHARD_COUNT if lease is not None else 1
+    feed = RecipientFeed(domain_rate=DOMAIN_RATE_PER_MINUTE / shards, domain_burst=DOMAIN_BURST / shards)
+    feeder = threading.Thread(
+        target=_feed_recipients,
+        args=(campaign, feed, ledger, suppression, validator, scheduler, spool, lease, stats, stop_event),
+        daemon=True
+    )
+    feeder.start()
+
+    workers = min(MAX_CONCURRENCY, len(accounts))
+    print(f"Sending with up to {workers} account(s) at a time")
+    logging.info(f"Sending with up to {workers} account(s) at a time")
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = [
+        executor.submit(
+            _send_worker, campaign, scheduler, feed, ledger, suppression, progress, reporter, spool, lease, stop_event
+        )
+        for _ in range(workers)
+    ]
+    completed = True
+    try:
+        pending = set(futures)
+        while pending:
+            # Short waits keep the main thread responsive to Ctrl-C
+            _, pending = wait(pending, timeout=0.5)
+    except KeyboardInterrupt:
+        print("\n⚠️ Interrupted. Finishing in-flight emails and stopping...")
+        logging.info("Campaign interrupted by user")
+        completed = False
+        progress.interrupted = True
+        stop_event.set()
+        wait(futures)
+    finally:
+        stop_event.set()
+        executor.shutdown(wait=True)
+        feeder.join()
+        scheduler.close()
+
+    for future in futures:
+        if future.exception() is not None:
+            logging.error(f"Send worker crashed: {future.exception()}")
+    return completed
+
+
+def _send_shards(campaign, ledger, suppression, validator, spool, reporter, progress):
+    """Work through the shard this worker leases, then any shard whose worker has died; returns recipients found"""
+    if SHARD_COUNT > len(email_accounts):
+        print(f"⚠ {SHARD_COUNT} shards but only {len(email_accounts)} account(s); some shards cannot send")
+    lease = ShardLease(ledger, campaign.campaign_id, SHARD_COUNT, ttl=SHARD_LEASE_TTL)
+    shard = lease.acquire(int(SHARD_INDEX) if SHARD_INDEX else None)
+    if shard is None:
+        print(f"⚠ No free shard for '{campaign.campaign_id}'; every shard is leased by a running worker")
+        return 0
+
+    found = 0
+    while shard is not None:
+        accounts = accounts_for_shard(email_accounts, shard, SHARD_COUNT)
+        message = f"Worker {lease.owner} leased shard {shard + 1}/{SHARD_COUNT} with {len(accounts)} account(s)"
+        print(message)
+        logging.info(message)
+        interrupted = ledger.counts(campaign.campaign_id, shard=lease.key).get(SENDING, 0)
+        if interrupted:
+            print(f"⚠ {interrupted} recipient(s) in this shard were mid-send when a worker stopped; "
+                  f"they stay '{SENDING}' (delivery unknown) rather than risk a duplicate")
+        completed = True
+        stats = IngestStats()
+        try:
+            if accounts:
+                completed = _send_campaign(
+                    campaign, accounts, ledger, suppression, validator, spool, reporter, lease, stats, progress
+                )
+        finally:
+            lease.release()
+        found += stats.unique
+        if not completed:
+            break
+        # Take over shards whose workers stopped renewing their lease
+        shard = lease.reclaim()
+    return found
+
+
+def _process_bounces(suppression):
+    """Suppress addresses that bounced since the last run, before anyone is mailed"""
+    sources = [open_source(spec.strip()) for spec in BOUNCE_SOURCES.split(",") if spec.strip()]
+    store = BounceStore(BOUNCE_DB)
+    try:
+        stats = process_bounces(sources, suppression, store)
+    except Exception as e:
+        # Bounce processing only saves quota; the campaign goes ahead without it
+        print(f"⚠ Could not process bounces: {e}")
+        logging.warning(f"Could not process bounces: {e}")
+        return
+    finally:
+        store.close()
+    print(stats.summary())
+    logging.info(stats.summary())
+
+
+class CampaignServices:
+    """Clients that can outlive one campaign: the API session and token, the send ledger, the suppression
+    index and its Bloom filter, and the DNS cache. run() builds its own unless a caller (the daemon) passes them in.
+    """
+
+    def __init__(self):
+        self.activity_logger = JobActivityLogger()
+        self.ledger = SendLedger(SEND_LEDGER_DB)
+        self.suppression = SuppressionIndex(SUPPRESSION_DB)
+        self.validator = build_address_validator()
+
+    def close(self):
+        self.ledger.close()
+        self.suppression.close()
+        smtp_pool.close_all()
+
+
+def start_activity_reporter(services, campaign):
+    """Background reporting of a campaign's sends to its candidate's WBL job activity"""
+    return ActivityReporter(
+        services.activity_logger,
+        notes=f"Vendor email campaign '{campaign.campaign_id}'",
+        outbox_dir=ACTIVITY_OUTBOX_DIR,
+        flush_every=ACTIVITY_FLUSH_EVERY,
+        flush_interval=ACTIVITY_FLUSH_INTERVAL,
+        candidate_id=campaign.candidate_id
+    ).start()
+
+
+def run(services=None, campaign=None):
+    """Send campaign (default: the one configured in this file); returns a summary of the run"""
+    print("Starting email campaign...")
+    logging.info("Starting email campaign")
+    owns_services = services is None
+    if owns_services:
+        services = CampaignServices()
+    if BOUNCE_SOURCES:
+        _process_bounces(services.suppression)
+    campaign = campaign or Campaign.configured()
+    campaign_id = campaign.campaign_id
+    # Sends are reported to the WBL backend in the background while the campaign runs
+    reporter = start_activity_reporter(services, campaign)
+
+    # Resume state is per recipient in the ledger, so edits to the CSV are safe
+    ledger = services.ledger
+    suppression = services.suppression
+    # A daemon keeps one index across jobs; pick up opt-outs other processes added since the last one
+    suppression.refresh()
+    validator = services.validator
+    validator.rejections.clear()
+    # Rendered messages wait on disk so rendering never holds up a send worker
+    spool = _open_spool(campaign)
+
+    # Build the message and encode the attachment once for the whole campaign
+    global message_template
+    message_template = campaign.template
+
+    progress = CampaignProgress()
+    progress_done = threading.Event()
+    if QUIET:
+        threading.Thread(
+            target=_print_progress, args=(progress, progress_done, PROGRESS_INTERVAL), daemon=True
+        ).start()
+    try:
+        if SHARD_COUNT > 1:
+            found = _send_shards(campaign, ledger, suppression, validator, spool, reporter, progress)
+        else:
+            in_flight = ledger.counts(campaign_id).get(SENDING, 0)
+            if in_flight:
+                print(f"⚠ {in_flight} recipient(s) are being sent by another process or were mid-send when a run "
+                      f"stopped; they stay '{SENDING}' (delivery unknown) rather than risk a duplicate")
+            stats = IngestStats()
+            _send_campaign(
+                campaign, email_accounts, ledger, suppression, validator, spool, reporter, None, stats, progress
+            )
+            found = stats.unique
+    finally:
+        progress_done.set()
+        counts = ledger.counts(campaign_id)
+        # Shard workers share the spool: it may only go once every shard's worker has finished with it
+        spool_done = SHARD_COUNT <= 1 or ledger.shards_released(campaign_id, SHARD_COUNT)
+        if owns_services:
+            services.close()
+        else:
+            # Sessions and caches stay warm for the next campaign; state is flushed for other processes
+            suppression.flush()
+            smtp_pool.close_idle()
+        # Report whatever hasn't been flushed yet; undelivered reports stay in the outbox for next time
+        print(f"\nLogging activity to WBL backend...")
+        reporter.close()
+
+    if spool_done:
+        _close_spool(spool, counts)
+    if found == 0:
+        print("⚠️ No emails found in CSV file.")
+
+    sent_count = progress.sent_count
+    logging.info(f"Campaign completed: {sent_count} successful sends out of {found} emails")
+    logging.info(f"Ledger totals for '{campaign_id}': {counts}")
+    print(f"Ledger totals for '{campaign_id}': {counts}")
+
+    logging.info(f"API logging completed: {reporter.reported_count} emails reported this run")
+    return {
+        "campaign": campaign_id,
+        "recipients": found,
+        "sent": sent_count,
+        "failed": progress.failed_count,
+        "interrupted": progress.interrupted,
+        "ledger": counts,
+    }
+
+@profiled(PROFILE_OUTPUT)
+def main():
+    parser = argparse.ArgumentParser(description="Send the vendor email campaign")
+    parser.add_argument("--render-only", action="store_true",
+                        help="render the campaign into SPOOL_DIR for inspection and exit without sending")
+    parser.add_argument("--quiet", action="store_true", help="print periodic progress instead of every recipient")
+    args = parser.parse_args()
+    global QUIET
+    QUIET = QUIET or args.quiet
+    listener = start_logging(LOG_DIR, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_SECONDS or None, quiet=QUIET)
+    try:
+        if args.render_only:
+            render_campaign()
+            return
+
+        exporter = MetricsExporter(
+            metrics, prometheus_path=METRICS_PROM_FILE, json_path=METRICS_JSON_FILE, interval=METRICS_INTERVAL
+        ).start()
+        try:
+            run()
+        finally:
+            exporter.stop()
+    finally:
+        # Drains whatever is still queued to the log files and the terminal
+        listener.stop()
+
 
 if __name__ == "__main__":
-    run()
+    main()
@@ -0,0 +1,200 @@
+import argparse
+import hashlib
+import mmap
+import os
+import re
+import shutil
+import time
+from email.utils import formatdate
+from typing import Dict, Iterator, Optional
+
+from recipient_ingest import normalize_email
+
+# Claims older than this are assumed to belong to a drainer that died and are put back in new/
+STALE_CLAIM_SECONDS = 900
+
+
+def _slug(campaign: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", campaign).strip("_") or "campaign"
+
+
+def _name(email: str) -> str:
+    # One file per recipient, so re-rendering is idempotent and a recipient can be claimed by name
+    return hashlib.blake2b(normalize_email(email).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class SpooledMessage:
+    """A claimed message; .data is a zero-copy view of the rendered bytes, valid until close()"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        # Copy-on-write, so restamping the Date header touches one page in memory and never the file
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_COPY)
+        newline = self._map.find(b"\n")
+        self.recipient = self._map[:newline].decode("utf-8")
+        self._view = memoryview(self._map)
+        self.data = self._view[newline + 1:]
+        self._stamp_date(newline + 1)
+
+    def _stamp_date(self, start: int) -> None:
+        """Replace the render-time Date header with the send time; a message can sit in the spool for days"""
+        end = self._map.find(b"\r\n\r\n", start)
+        if end < 0:
+            end = len(self._map)
+        at = self._map.find(b"\r\nDate: ", start, end)
+        if at < 0:
+            return
+        at += len(b"\r\nDate: ")
+        old_end = self._map.find(b"\r\n", at)
+        stamp = formatdate(localtime=True).encode("ascii")
+        if old_end - at == len(stamp):
+            self._map[at:old_end] = stamp
+        else:
+            # Only when the width changed (a rendered message from elsewhere); costs one copy
+            self.data.release()
+            self.data = memoryview(self._map[start:at] + stamp + self._map[old_end:])
+
+    def close(self) -> None:
+        self.data.release()
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+
+class MessageSpool:
+    """Maildir-style spool of pre-rendered messages for one campaign.
+
+    Messages are written to tmp/ and renamed into new/ once complete. A drainer claims one by renaming
+    it into cur/, so any number of threads or processes can drain the same spool without sending a
+    message twice. Each file is the recipient address on the first line followed by the message bytes.
+    """
+
+    def __init__(self, root: str, campaign: str):
+        self.root = os.path.join(root, _slug(campaign))
+        self.tmp = os.path.join(self.root, "tmp")
+        self.new = os.path.join(self.root, "new")
+        self.cur = os.path.join(self.root, "cur")
+        for path in (self.tmp, self.new, self.cur):
+            os.makedirs(path, exist_ok=True)
+
+    def contains(self, email: str) -> bool:
+        name = _name(email)
+        return os.path.exists(os.path.join(self.new, name)) or os.path.exists(os.path.join(self.cur, name))
+
+    def add(self, email: str, data: bytes) -> bool:
+        """Spool a rendered message; returns False if the recipient is already spooled"""
+        if self.contains(email):
+            return False
+        name = _name(email)
+        tmp_path = os.path.join(self.tmp, f"{name}.{os.getpid()}")
+        with open(tmp_path, "wb") as f:
+            f.write(email.encode("utf-8") + b"\n")
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self.new, name))
+        return True
+
+    def claim(self, email: str) -> Optional[SpooledMessage]:
+        """Take a recipient's message out of new/; None if it isn't spooled or another drainer has it"""
+        name = _name(email)
+        claimed = os.path.join(self.cur, name)
+        try:
+            os.rename(os.path.join(self.new, name), claimed)
+        except FileNotFoundError:
+            return None
+        # rename keeps the render time; the claim time is what recover() looks at
+        os.utime(claimed)
+        return SpooledMessage(claimed)
+
+    def claim_next(self) -> Optional[SpooledMessage]:
+        """Take any message out of new/, for drainers that aren't fed recipients"""
+        with os.scandir(self.new) as entries:
+            for entry in entries:
+                claimed = os.path.join(self.cur, entry.name)
+                try:
+                    os.rename(entry.path, claimed)
+                except FileNotFoundError:
+                    continue
+                os.utime(claimed)
+                return SpooledMessage(claimed)
+        return None
+
+    def complete(self, message: SpooledMessage) -> None:
+        """The message was delivered or permanently failed; drop it from the spool"""
+        message.close()
+        try:
+            os.unlink(message.path)
+        except FileNotFoundError:
+            pass
+
+    def release(self, message: SpooledMessage) -> None:
+        """Put a claimed message back in new/ so it can be retried"""
+        message.close()
+        try:
+            os.rename(message.path, os.path.join(self.new, os.path.basename(message.path)))
+        except FileNotFoundError:
+            pass
+
+    def recover(self, stale_after: float = STALE_CLAIM_SECONDS) -> int:
+        """Return claims abandoned by a crashed drainer to new/, and clear half-written renders"""
+        cutoff = time.time() - stale_after
+        recovered = 0
+        with os.scandir(self.cur) as entries:
+            for entry in entries:
+                if entry.stat().st_mtime < cutoff:
+                    try:
+                        os.rename(entry.path, os.path.join(self.new, entry.name))
+                        recovered += 1
+                    except FileNotFoundError:
+                        pass
+        with os.scandir(self.tmp) as entries:
+            for entry in entries:
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+        return recovered
+
+    def remove(self) -> None:
+        """Delete the campaign's spool once it is complete; anything left in it will never be sent"""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def counts(self) -> Dict[str, int]:
+        return {folder: sum(1 for _ in os.scandir(getattr(self, folder))) for folder in ("new", "cur")}
+
+    def messages(self, folder: str = "new") -> Iterator[str]:
+        """Paths of spooled messages, for inspection"""
+        with os.scandir(getattr(self, folder)) as entries:
+            for entry in entries:
+                yield entry.path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a campaign's spool of rendered messages")
+    parser.add_argument("campaign")
+    parser.add_argument("--spool", default="spool")
+    parser.add_argument("--list", type=int, metavar="N", help="list the first N queued recipients")
+    parser.add_argument("--show", metavar="EMAIL", help="print the rendered message for a recipient")
+    args = parser.parse_args()
+
+    spool = MessageSpool(args.spool, args.campaign)
+    counts = spool.counts()
+    print(f"{spool.root}: {counts['new']} queued, {counts['cur']} being sent")
+    if args.list:
+        for i, path in enumerate(spool.messages()):
+            if i >= args.list:
+                break
+            with open(path, "rb") as f:
+                print(f"  {f.readline().decode('utf-8').strip()}  ({os.path.getsize(path)} bytes)")
+    if args.show:
+        path = os.path.join(spool.new, _name(args.show))
+        if not os.path.exists(path):
+            path = os.path.join(spool.cur, _name(args.show))
+        if not os.path.exists(path):
+            print(f"⚠ {args.show} is not in the spool")
+            return
+        with open(path, "rb") as f:
+            f.readline()
+            print(f.read().decode("utf-8", errors="replace"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import base64
+import os
+import re
+import string
+from email.header import Header
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid, parseaddr
+from typing import Dict, List, Mapping, Optional
+
+# Stands in for the personalized body while the MIME skeleton is serialized
+_BODY_MARKER = "@@PERSONALIZED_BODY@@"
+
+
+def context_key(column: str) -> str:
+    """Template name for a CSV column: "Full Name" -> full_name, "Job-Title" -> job_title"""
+    return re.sub(r"[^a-z0-9]+", "_", (column or "").strip().lower()).strip("_")
+
+
+class CompiledTemplate:
+    """A text template with {field} and {field|default} placeholders, compiled once into a Python function.
+
+    Fields come from the recipient's CSV row (see context_key); an empty or missing field renders the
+    default, or nothing. {{ and }} are literal braces.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.fields: List[str] = []
+        parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(source):
+            if literal:
+                parts.append(repr(literal))
+            if field is None:
+                continue
+            if conversion:
+                raise ValueError(f"Conversions are not supported in template field {{{field}!{conversion}}}")
+            name, _, default = field.partition("|")
+            if spec:
+                default += ":" + spec
+            key = context_key(name)
+            if not key:
+                raise ValueError(f"Empty field name in template: {{{field}}}")
+            if key not in self.fields:
+                self.fields.append(key)
+            parts.append(f"(get({key!r}) or {default!r})")
+        # One string join per render instead of re-parsing the template each time
+        code = f"def render(context):\n    get = context.get\n    return ''.join(({', '.join(parts)},))\n"
+        namespace: Dict = {}
+        exec(compile(code, "<template>", "exec"), namespace)
+        self._render = namespace["render"]
+
+    @property
+    def is_static(self) -> bool:
+        return not self.fields
+
+    def render(self, context: Optional[Mapping[str, str]] = None) -> str:
+        return self._render(context or {})
+
+
+def recipient_context(row: Mapping[str, str], fields: List[str]) -> Optional[Dict[str, str]]:
+    """The values a template needs from one CSV row, or None if it has none of them"""
+    values = {}
+    for column, value in row.items():
+        key = context_key(column)
+        if key and value and value.strip():
+            values[key] = value.strip()
+    if "first_name" not in values:
+        name = values.get("full_name") or values.get("name")
+        if name:
+            values["first_name"] = name.split()[0]
+    context = {field: values[field] for field in fields if field in values}
+    return context or None
+
+
+class MessageTemplate:
+    """Campaign message rendered to bytes once; each send only adds the per-recipient parts.
+
+    Subject and body may contain {field} placeholders filled from the recipient's CSV columns. The
+    MIME structure and the attachment are still serialized once; a personalized send only encodes
+    its own subject and text part.
+    """
+
+    def __init__(
+        self,
+        subject: str,
+        text_body: str,
+        from_header: str,
+        reply_to: Optional[str] = None,
+        attachment_path: Optional[str] = None
+    ):
+        self.from_header = from_header
+        self.envelope_from = parseaddr(from_header)[1]
+        # make_msgid() looks up the FQDN on every call unless a domain is given
+        self._msgid_domain = self.envelope_from.rpartition("@")[2] or None
+
+        self.subject_template = CompiledTemplate(subject)
+        self.body_template = CompiledTemplate(text_body)
+        self.fields = self.subject_template.fields + [
+            f for f in self.body_template.fields if f not in self.subject_template.fields
+        ]
+
+        msg = MIMEMultipart()
+        if self.subject_template.is_static:
+            msg["Subject"] = self.subject_template.render()
+        msg["From"] = from_header
+        if reply_to:
+            msg["Reply-To"] = reply_to
+
+        # Attach body
+        if self.body_template.is_static:
+            msg.attach(MIMEText(self.body_template.render(), "plain"))
+        else:
+            part = MIMEText("", "plain", "utf-8")
+            part.set_payload(_BODY_MARKER)
+            msg.attach(part)
+
+        # Attach resume PDF (read and base64-encoded once per campaign)
+        self.has_attachment = False
+        if attachment_path and os.path.exists(attachment_path):
+            with open(attachment_path, "rb") as f:
+                part = MIMEApplication(f.read(), Name=os.path.basename(attachment_path))
+            part['Content-Disposition'] = f'attachment; filename="{os.path.basename(attachment_path)}"'
+            msg.attach(part)
+            self.has_attachment = True
+        elif attachment_path:
+            print(f"⚠ Resume file not found: {attachment_path}")
+
+        raw = msg.as_bytes(policy=msg.policy.clone(linesep="\r\n"))
+        head, _, body = raw.partition(b"\r\n\r\n")
+        self._head = head + b"\r\n"
+        self._body = b"\r\n" + body
+        self._body_prefix, _, self._body_suffix = self._body.partition(_BODY_MARKER.encode("ascii"))
+
+    def render(self, to_email: str, context: Optional[Mapping[str, str]] = None) -> bytes:
+        """Return the full message bytes for one recipient, personalized from its CSV context"""
+        # Strip line breaks so a bad CSV value can't inject extra headers
+        to_email = to_email.replace("\r", "").replace("\n", "")
+        headers = (
+            f"To: {to_email}\r\n"
+            f"Message-ID: {make_msgid(domain=self._msgid_domain)}\r\n"
+            f"Date: {formatdate(localtime=True)}\r\n"
+        )
+        if not self.subject_template.is_static:
+            subject = self.subject_template.render(context).replace("\r", " ").replace("\n", " ")
+            if not subject.isascii():
+                subject = Header(subject, "utf-8").encode(linesep="\r\n")
+            headers += f"Subject: {subject}\r\n"
+        if self.body_template.is_static:
+            return self._head + headers.encode("utf-8") + self._body
+        text = self.body_template.render(context).encode("utf-8")
+        encoded = base64.encodebytes(text).replace(b"\n", b"\r\n").rstrip(b"\r\n")
+        return b"".join((self._head, headers.encode("utf-8"), self._body_prefix, encoded, self._body_suffix))
@@ -0,0 +1,222 @@
+import bisect
+import cProfile
+import functools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# Upper bounds in seconds; wide enough for a 1ms render and a 60s SMTP timeout
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile: upper bound of the bucket holding the q-th observation"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+        return float("inf")
+
+
+class Timer:
+    """Context manager that records elapsed time; set .code to label the outcome"""
+
+    __slots__ = ("registry", "stage", "account", "code", "started")
+
+    def __init__(self, registry: "MetricsRegistry", stage: str, account: str = "", code: str = ""):
+        self.registry = registry
+        self.stage = stage
+        self.account = account
+        self.code = code
+        self.started = 0.0
+
+    def __enter__(self) -> "Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc is not None and not self.code:
+            self.code = str(getattr(exc, "smtp_code", "") or exc_type.__name__)
+        self.registry.observe(self.stage, time.perf_counter() - self.started, self.account, self.code or "ok")
+        return False
+
+
+class MetricsRegistry:
+    """Per-stage latency histograms labelled by account and result code"""
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, account: str = "", code: str = "ok") -> None:
+        key = (stage, account, code)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, stage: str, account: str = "", code: str = "") -> Timer:
+        return Timer(self, stage, account, code)
+
+    def timed(self, stage: str):
+        """Decorator form of timer() for functions without account labels"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _copy(self) -> Dict[Tuple[str, str, str], Histogram]:
+        with self._lock:
+            copies = {}
+            for key, h in self._histograms.items():
+                c = Histogram()
+                c.counts, c.count, c.sum = list(h.counts), h.count, h.sum
+                copies[key] = c
+            return copies
+
+    def snapshot(self) -> dict:
+        series = []
+        for (stage, account, code), h in sorted(self._copy().items()):
+            series.append({
+                "stage": stage, "account": account, "code": code,
+                "count": h.count, "sum": round(h.sum, 6),
+                "mean": round(h.sum / h.count, 6) if h.count else 0.0,
+                "p50": h.quantile(0.5), "p90": h.quantile(0.9), "p99": h.quantile(0.99),
+            })
+        return {"generated_at": time.time(), "series": series}
+
+    def prometheus_text(self) -> str:
+        name = "email_sender_stage_seconds"
+        lines = [f"# HELP {name} Time spent in each stage of the send path",
+                 f"# TYPE {name} histogram"]
+        for (stage, account, code), h in sorted(self._copy().items()):
+            labels = f'stage="{stage}",account="{_escape(account)}",code="{_escape(code)}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS + (float("inf"),), h.counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {h.sum:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomic(path: str, content: str) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class MetricsExporter:
+    """Writes a Prometheus textfile and/or JSON snapshot every `interval` seconds and on stop"""
+
+    def __init__(self, registry: "MetricsRegistry", prometheus_path: Optional[str] = None,
+                 json_path: Optional[str] = None, interval: float = 15):
+        self.registry = registry
+        self.prometheus_path = prometheus_path
+        self.json_path = json_path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "MetricsExporter":
+        if self.prometheus_path or self.json_path:
+            self._thread = threading.Thread(target=self._loop, name="metrics-exporter", daemon=True)
+            self._thread.start()
+        return self
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def export(self) -> None:
+        try:
+            if self.prometheus_path:
+                _write_atomic(self.prometheus_path, self.registry.prometheus_text())
+            if self.json_path:
+                _write_atomic(self.json_path, json.dumps(self.registry.snapshot(), indent=2))
+        except OSError as e:
+            print(f"⚠ Could not write metrics: {e}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.export()
+
+
+def profiled(output_path: Optional[str]):
+    """Decorator that runs the function under cProfile and dumps stats to output_path, if set.
+
+    Threads started during the call (send workers, feeder, reporters) are profiled too and their
+    stats merged into the same file.
+    """
+    def decorator(fn):
+        if not output_path:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            thread_profilers = []
+
+            def start_thread_profiler(*_):
+                sys.setprofile(None)
+                profiler = cProfile.Profile()
+                thread_profilers.append(profiler)
+                profiler.enable()
+
+            main_profiler = cProfile.Profile()
+            threading.setprofile(start_thread_profiler)
+            try:
+                return main_profiler.runcall(fn, *args, **kwargs)
+            finally:
+                threading.setprofile(None)
+                stats = pstats.Stats(main_profiler)
+                for profiler in thread_profilers:
+                    try:
+                        profiler.create_stats()
+                        stats.add(profiler)
+                    except (TypeError, ValueError):
+                        pass
+                stats.dump_stats(output_path)
+                print(f"Profile written to {output_path} (view with: python -m pstats {output_path})")
+        return wrapper
+    return decorator
+
+
+# Shared registry used by main.py, smtp_pool.py and job_activity_logger.py
+registry = MetricsRegistry()
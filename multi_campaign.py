@@ -0,0 +1,331 @@
+"""Send several campaigns at once from the shared account pool, each getting a weighted share of the sends.
+
+Every campaign has its own message, attachment, recipient CSVs and candidate, and its sends are reported
+to that candidate's WBL job activity. All campaigns lease accounts from one AccountScheduler, so the pool
+is paced and kept within its quotas exactly as for a single campaign, and the per-domain limits apply to
+all of them together.
+
+Example campaigns.json:
+    [
+      {"campaign_id": "AI Engineer | USC", "candidate_id": 570, "weight": 2,
+       "subject": "AI Engineer | USC", "body": "Hi {first_name|there}, ...",
+       "resume_path": "Sai_madhavi.pdf", "csv_files": ["vendors/ai/*.csv"]},
+      {"candidate_id": 612, "subject": "Data Engineer | Open to relocation", "body": "...",
+       "csv_files": "vendors/data.csv"}
+    ]
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Optional, Tuple
+
+import main as campaign
+from account_scheduler import AccountScheduler
+from campaign_daemon import validate_job
+from event_log import start_logging
+from metrics import registry as metrics, MetricsExporter
+from recipient_ingest import IngestStats
+from send_ledger import PENDING
+
+CAMPAIGNS_FILE = os.getenv("CAMPAIGNS_FILE", "campaigns.json")
+
+
+def load_campaigns(path: str) -> List["campaign.Campaign"]:
+    """Campaign definitions from a JSON list; raises ValueError describing the first bad one"""
+    with open(path, encoding="utf-8") as f:
+        definitions = json.load(f)
+    if not isinstance(definitions, list) or not definitions:
+        raise ValueError("expected a non-empty JSON list of campaigns")
+    campaigns = []
+    for number, definition in enumerate(definitions, 1):
+        if not isinstance(definition, dict):
+            raise ValueError(f"campaign {number}: must be a JSON object")
+        candidate_id = definition.get("candidate_id")
+        weight = definition.get("weight", 1)
+        # The text fields are the ones a campaign_daemon job has
+        error = validate_job({k: v for k, v in definition.items() if k not in ("candidate_id", "weight")})
+        for field in ("subject", "body", "csv_files"):
+            if error is None and field not in definition:
+                error = f"{field} is required"
+        if error is None and (isinstance(candidate_id, bool) or not isinstance(candidate_id, int) or candidate_id <= 0):
+            error = "candidate_id must be a positive integer"
+        if error is None and (isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0):
+            error = "weight must be a positive number"
+        if error is not None:
+            raise ValueError(f"campaign {number}: {error}")
+        csv_files = definition["csv_files"]
+        campaigns.append(campaign.Campaign(
+            definition.get("campaign_id", definition["subject"].strip()),
+            definition["subject"],
+            definition["body"],
+            definition.get("resume_path"),
+            ",".join(csv_files) if isinstance(csv_files, list) else csv_files,
+            candidate_id=candidate_id,
+            weight=float(weight),
+        ))
+    ids = [c.campaign_id for c in campaigns]
+    duplicates = sorted({campaign_id for campaign_id in ids if ids.count(campaign_id) > 1})
+    if duplicates:
+        raise ValueError(f"campaign ids must be unique: {', '.join(duplicates)}")
+    return campaigns
+
+
+class CampaignLane:
+    """One campaign's share of a run: its recipient feed, spool, activity reporter and counters"""
+
+    def __init__(self, definition, feed, spool, reporter):
+        self.campaign = definition
+        self.feed = feed
+        self.spool = spool
+        self.reporter = reporter
+        self.progress = campaign.CampaignProgress()
+        self.stats = IngestStats()
+        # Virtual time at which this campaign's last recipient finished its turn
+        self.finish_tag = 0.0
+
+
+class FairShareFeed:
+    """Hands the send workers recipients from every campaign, each in proportion to its weight.
+
+    Start-time fair queueing: each recipient handed out advances its campaign's tag by 1/weight, and the
+    campaign with the lowest tag goes next. A campaign with nothing ready is skipped and its tag catches
+    up to the others' when it next sends, so one held back by its domain limits or its reader gets its
+    share from then on rather than a burst to make up for lost time. Sends nobody else wants go to
+    whichever campaign has recipients ready, so the pool is never left idle for the sake of fairness.
+    """
+
+    def __init__(self, lanes: List[CampaignLane], poll_interval: float = 0.01):
+        self.lanes = lanes
+        self.poll_interval = poll_interval
+        self._virtual_time = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, stop_event: threading.Event) -> Optional[Tuple[CampaignLane, tuple]]:
+        """Next (lane, item), or None once every campaign is drained or the run is stopped"""
+        while not stop_event.is_set():
+            with self._lock:
+                for lane in sorted(self.lanes, key=lambda lane: lane.finish_tag):
+                    item = lane.feed.poll()
+                    if item is None:
+                        continue
+                    start = max(lane.finish_tag, self._virtual_time)
+                    self._virtual_time = start
+                    lane.finish_tag = start + 1 / lane.campaign.weight
+                    return lane, item
+                if all(lane.feed.drained() for lane in self.lanes):
+                    return None
+            stop_event.wait(self.poll_interval)
+        return None
+
+
+class TotalProgress:
+    """All campaigns' counters added up, for the quiet-mode progress line"""
+
+    def __init__(self, lanes: List[CampaignLane]):
+        self.lanes = lanes
+
+    @property
+    def sent_count(self) -> int:
+        return sum(lane.progress.sent_count for lane in self.lanes)
+
+    @property
+    def failed_count(self) -> int:
+        return sum(lane.progress.failed_count for lane in self.lanes)
+
+    @property
+    def deferred_count(self) -> int:
+        return sum(lane.progress.deferred_count for lane in self.lanes)
+
+
+def _send_worker(fair_feed, scheduler, ledger, suppression, stop_event):
+    while not stop_event.is_set():
+        taken = fair_feed.get(stop_event)
+        if taken is None:
+            return
+        lane, item = taken
+        try:
+            campaign._send_one(
+                lane.campaign, scheduler, lane.feed, ledger, suppression, lane.progress, lane.reporter,
+                lane.spool, None, stop_event, *item
+            )
+        finally:
+            lane.feed.done()
+
+
+def _register(lanes, ledger, suppression, validator):
+    """Register every campaign's recipients before sending starts, one campaign at a time"""
+    for lane in lanes:
+        print(f"\nCampaign '{lane.campaign.campaign_id}' for candidate {lane.campaign.candidate_id} "
+              f"(weight {lane.campaign.weight:g})")
+        validator.rejections.clear()
+        campaign._register_recipients(lane.campaign, ledger, suppression, validator, lane.stats)
+
+
+def _send_all(lanes, ledger, suppression):
+    """Send every campaign's pending recipients over the shared pool; False if interrupted"""
+    scheduler = AccountScheduler(
+        campaign.email_accounts, campaign.ACCOUNT_USAGE_DB,
+        default_quota=campaign.MAX_EMAILS_PER_ACCOUNT, pacing=campaign.SEND_DELAY_RANGE
+    )
+    pending = sum(ledger.counts(lane.campaign.campaign_id).get(PENDING, 0) for lane in lanes)
+    campaign._print_forecast(scheduler, pending)
+    stop_event = threading.Event()
+    feeders = [
+        threading.Thread(
+            target=campaign._feed_recipients,
+            args=(lane.campaign, lane.feed, ledger, suppression, None, None, lane.spool, None, lane.stats, stop_event),
+            kwargs={"register": False},
+            daemon=True
+        )
+        for lane in lanes
+    ]
+    for feeder in feeders:
+        feeder.start()
+
+    # As many workers as a single campaign would have: the pool, not the campaign count, sets throughput
+    workers = min(campaign.MAX_CONCURRENCY, len(campaign.email_accounts))
+    print(f"Sending {len(lanes)} campaign(s) with up to {workers} account(s) at a time")
+    logging.info(f"Sending {len(lanes)} campaign(s) with up to {workers} account(s) at a time")
+    fair_feed = FairShareFeed(lanes)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = [
+        executor.submit(_send_worker, fair_feed, scheduler, ledger, suppression, stop_event)
+        for _ in range(workers)
+    ]
+    completed = True
+    try:
+        remaining = set(futures)
+        while remaining:
+            _, remaining = wait(remaining, timeout=0.5)
+    except KeyboardInterrupt:
+        print("\n⚠️ Interrupted. Finishing in-flight emails and stopping...")
+        logging.info("Multi-campaign run interrupted by user")
+        completed = False
+        for lane in lanes:
+            lane.progress.interrupted = True
+        stop_event.set()
+        wait(futures)
+    finally:
+        stop_event.set()
+        executor.shutdown(wait=True)
+        for feeder in feeders:
+            feeder.join()
+        scheduler.close()
+
+    for future in futures:
+        if future.exception() is not None:
+            logging.error(f"Send worker crashed: {future.exception()}")
+    return completed
+
+
+def run_campaigns(campaigns, services=None) -> List[dict]:
+    """Send several campaigns side by side over the shared account pool; returns a summary per campaign"""
+    print(f"Starting {len(campaigns)} email campaigns...")
+    logging.info(f"Starting {len(campaigns)} email campaigns: {', '.join(c.campaign_id for c in campaigns)}")
+    if campaign.SHARD_COUNT > 1:
+        print("⚠ SHARD_COUNT is ignored when running several campaigns; they share the whole account pool")
+    owns_services = services is None
+    if owns_services:
+        services = campaign.CampaignServices()
+    if campaign.BOUNCE_SOURCES:
+        campaign._process_bounces(services.suppression)
+    ledger = services.ledger
+    suppression = services.suppression
+    # A daemon keeps one index across jobs; pick up opt-outs other processes added since the last one
+    suppression.refresh()
+
+    lanes = []
+    limits = None
+    for definition in campaigns:
+        # One set of per-domain limits for all campaigns: a vendor's domain sees one sender, not several
+        feed = campaign.RecipientFeed(
+            domain_rate=campaign.DOMAIN_RATE_PER_MINUTE, domain_burst=campaign.DOMAIN_BURST, limits_from=limits
+        )
+        limits = limits or feed
+        lanes.append(CampaignLane(
+            definition, feed, campaign._open_spool(definition), campaign.start_activity_reporter(services, definition)
+        ))
+
+    progress_done = threading.Event()
+    if campaign.QUIET:
+        threading.Thread(
+            target=campaign._print_progress, args=(TotalProgress(lanes), progress_done, campaign.PROGRESS_INTERVAL),
+            daemon=True
+        ).start()
+    try:
+        _register(lanes, ledger, suppression, services.validator)
+        _send_all(lanes, ledger, suppression)
+    finally:
+        progress_done.set()
+        counts = {lane.campaign.campaign_id: ledger.counts(lane.campaign.campaign_id) for lane in lanes}
+        if owns_services:
+            services.close()
+        else:
+            suppression.flush()
+            campaign.smtp_pool.close_idle()
+        print(f"\nLogging activity to WBL backend...")
+        for lane in lanes:
+            lane.reporter.close()
+
+    results = []
+    total_sent = sum(lane.progress.sent_count for lane in lanes)
+    for lane in lanes:
+        definition = lane.campaign
+        campaign._close_spool(lane.spool, counts[definition.campaign_id])
+        share = lane.progress.sent_count / total_sent if total_sent else 0.0
+        message = (f"'{definition.campaign_id}' (candidate {definition.candidate_id}, weight {definition.weight:g}): "
+                   f"{lane.progress.sent_count} sent ({share:.0%} of all sends), {lane.progress.failed_count} failed; "
+                   f"ledger totals {counts[definition.campaign_id]}")
+        print(message)
+        logging.info(message)
+        results.append({
+            "campaign": definition.campaign_id,
+            "candidate_id": definition.candidate_id,
+            "weight": definition.weight,
+            "recipients": lane.stats.unique,
+            "sent": lane.progress.sent_count,
+            "failed": lane.progress.failed_count,
+            "interrupted": lane.progress.interrupted,
+            "ledger": counts[definition.campaign_id],
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send several campaigns at once from the shared account pool")
+    parser.add_argument("campaigns", nargs="?", default=CAMPAIGNS_FILE, help="JSON file of campaign definitions")
+    parser.add_argument("--check", action="store_true", help="validate the campaign definitions and exit")
+    parser.add_argument("--quiet", action="store_true", help="print periodic progress instead of every recipient")
+    args = parser.parse_args()
+
+    try:
+        campaigns = load_campaigns(args.campaigns)
+    except (OSError, ValueError) as e:
+        print(f"⚠ Could not load {args.campaigns}: {e}")
+        return
+    if args.check:
+        total = sum(c.weight for c in campaigns)
+        for c in campaigns:
+            print(f"'{c.campaign_id}': candidate {c.candidate_id}, {c.weight / total:.0%} of the pool, "
+                  f"recipients from {c.csv_files}, attachment {c.resume_path or 'none'}")
+        return
+
+    campaign.QUIET = campaign.QUIET or args.quiet
+    listener = start_logging(campaign.LOG_DIR, campaign.LOG_MAX_BYTES, campaign.LOG_BACKUP_COUNT,
+                             campaign.LOG_ROTATE_SECONDS or None, quiet=campaign.QUIET)
+    exporter = MetricsExporter(
+        metrics, prometheus_path=campaign.METRICS_PROM_FILE, json_path=campaign.METRICS_JSON_FILE,
+        interval=campaign.METRICS_INTERVAL
+    ).start()
+    try:
+        run_campaigns(campaigns)
+    finally:
+        exporter.stop()
+        listener.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import csv
+import glob
+import hashlib
+import os
+import sqlite3
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+def normalize_email(value: Optional[str]) -> str:
+    """Canonical form used for dedup and lookups: trimmed and lower-cased"""
+    return (value or "").strip().lower()
+
+
+def expand_sources(patterns: Iterable[str]) -> List[str]:
+    """Expand file names / globs into an ordered list of existing files (each listed once)"""
+    files = []
+    seen = set()
+    for pattern in patterns:
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if path not in seen and os.path.isfile(path):
+                seen.add(path)
+                files.append(path)
+    return files
+
+
+class SpillingDeduper:
+    """Exact seen-set that keeps at most max_memory keys in RAM and spills older keys to SQLite on disk"""
+
+    def __init__(self, max_memory: int = 500_000, spill_dir: Optional[str] = None):
+        self.max_memory = max_memory
+        self.spill_dir = spill_dir
+        self._memory = set()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_path: Optional[str] = None
+
+    @staticmethod
+    def _key(value: str) -> bytes:
+        # 16-byte digests keep both the RAM set and the spill table compact
+        return hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+
+    def _spill(self) -> None:
+        if self._db is None:
+            fd, self._db_path = tempfile.mkstemp(prefix="dedup_", suffix=".sqlite", dir=self.spill_dir)
+            os.close(fd)
+            self._db = sqlite3.connect(self._db_path)
+            self._db.execute("PRAGMA journal_mode=OFF")
+            self._db.execute("PRAGMA synchronous=OFF")
+            self._db.execute("CREATE TABLE seen (key BLOB PRIMARY KEY) WITHOUT ROWID")
+        self._db.executemany("INSERT OR IGNORE INTO seen (key) VALUES (?)", ((k,) for k in self._memory))
+        self._db.commit()
+        self._memory.clear()
+
+    def add(self, value: str) -> bool:
+        """Record value; return True if it had not been seen before"""
+        key = self._key(value)
+        if key in self._memory:
+            return False
+        if self._db is not None:
+            if self._db.execute("SELECT 1 FROM seen WHERE key = ?", (key,)).fetchone():
+                return False
+        self._memory.add(key)
+        if len(self._memory) >= self.max_memory:
+            self._spill()
+        return True
+
+    @property
+    def spilled(self) -> bool:
+        return self._db is not None
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        if self._db_path and os.path.exists(self._db_path):
+            os.remove(self._db_path)
+        self._db_path = None
+        self._memory.clear()
+
+
+class IngestStats:
+    """Counters reported once at the end of ingestion instead of per row"""
+
+    def __init__(self):
+        self.files = 0
+        self.rows = 0
+        self.empty = 0
+        self.duplicates = 0
+        self.unique = 0
+        self.suppressed = 0
+        # Left after suppression and validation, i.e. handed on to be registered
+        self.deliverable = 0
+
+    def summary(self) -> str:
+        text = (f"Processed {self.rows} rows from {self.files} file(s): "
+                f"{self.unique} unique, {self.duplicates} duplicates, {self.empty} without email")
+        if self.suppressed:
+            text += f", {self.suppressed} suppressed"
+        return text
+
+
+def _email_field(fieldnames: Optional[List[str]], email_column: str) -> Optional[str]:
+    if not fieldnames:
+        return None
+    if email_column in fieldnames:
+        return email_column
+    for name in fieldnames:
+        if name and name.strip().lower() == email_column.lower():
+            return name
+    return None
+
+
+def iter_recipients(
+    sources: Iterable[str],
+    email_column: str = "Email",
+    stats: Optional[IngestStats] = None,
+    max_memory: int = 500_000
+) -> Iterator[Dict[str, str]]:
+    """Stream deduplicated recipient rows from one or more CSV files or globs.
+
+    Each yielded row keeps every CSV column; the email column is replaced by its normalized form.
+    """
+    stats = stats if stats is not None else IngestStats()
+    deduper = SpillingDeduper(max_memory=max_memory)
+    try:
+        for path in expand_sources(sources):
+            stats.files += 1
+            with open(path, newline='', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                field = _email_field(reader.fieldnames, email_column)
+                if field is None:
+                    print(f"⚠ No '{email_column}' column in {path}, skipping file")
+                    continue
+                for row in reader:
+                    stats.rows += 1
+                    email = normalize_email(row.get(field))
+                    if not email:
+                        stats.empty += 1
+                        continue
+                    if not deduper.add(email):
+                        stats.duplicates += 1
+                        continue
+                    stats.unique += 1
+                    row[field] = email
+                    if field != email_column:
+                        row[email_column] = email
+                    yield row
+    finally:
+        deduper.close()
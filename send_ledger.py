@@ -0,0 +1,344 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from shard_lease import shard_of
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+DEFERRED = "deferred"
+# Claimed by a sharded worker right before it sends; left as-is if that worker dies mid-send
+SENDING = "sending"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sends (
+    campaign   TEXT    NOT NULL,
+    email      TEXT    NOT NULL,
+    status     TEXT    NOT NULL DEFAULT 'pending',
+    account    TEXT,
+    smtp_code  INTEGER,
+    error      TEXT,
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    created_at REAL    NOT NULL,
+    updated_at REAL    NOT NULL,
+    sent_at    REAL,
+    next_attempt_at REAL,
+    context    TEXT,
+    PRIMARY KEY (campaign, email)
+);
+CREATE INDEX IF NOT EXISTS idx_sends_status ON sends (campaign, status, email);
+CREATE TABLE IF NOT EXISTS shard_leases (
+    campaign   TEXT    NOT NULL,
+    shard      INTEGER NOT NULL,
+    owner      TEXT    NOT NULL,
+    expires_at REAL    NOT NULL,
+    PRIMARY KEY (campaign, shard)
+);
+"""
+
+RETRY_INDEX = "CREATE INDEX IF NOT EXISTS idx_sends_retry ON sends (campaign, status, next_attempt_at)"
+# Queries must spell the domain exactly like this for SQLite to use the expression index
+DOMAIN = "substr(email, instr(email, '@') + 1)"
+DOMAIN_INDEX = f"CREATE INDEX IF NOT EXISTS idx_sends_domain ON sends (campaign, status, {DOMAIN}, email)"
+
+
+def _load_context(value: Optional[str]) -> Optional[dict]:
+    return json.loads(value) if value else None
+
+
+class SendLedger:
+    """Durable per-recipient send state in a WAL-mode SQLite file, with batched commits"""
+
+    def __init__(self, path: str = "send_ledger.db", batch_size: int = 50, flush_interval: float = 2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._buffer: List[Tuple] = []
+        self._last_flush = time.monotonic()
+
+        # One connection shared by all lanes; other processes are handled by WAL + busy_timeout
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=30000")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sends)")}
+        if "next_attempt_at" not in columns:
+            # Ledgers created before deferred retries existed
+            self._conn.execute("ALTER TABLE sends ADD COLUMN next_attempt_at REAL")
+        if "context" not in columns:
+            # Ledgers created before per-recipient personalization
+            self._conn.execute("ALTER TABLE sends ADD COLUMN context TEXT")
+        self._conn.execute(RETRY_INDEX)
+        self._conn.execute(DOMAIN_INDEX)
+        self._conn.commit()
+        self._conn.create_function("shard_of", 2, shard_of, deterministic=True)
+
+    @staticmethod
+    def _shard_clause(shard: Optional[Tuple[int, int]]) -> Tuple[str, tuple]:
+        """SQL filter for one (index, count) shard of the recipients; empty when not sharded"""
+        if shard is None or shard[1] <= 1:
+            return "", ()
+        return " AND shard_of(email, ?) = ?", (shard[1], shard[0])
+
+    def add_recipients(
+        self,
+        campaign: str,
+        emails: Iterable[Union[str, Tuple[str, Optional[dict]]]],
+        chunk_size: int = 5000
+    ) -> int:
+        """Register recipients (emails, or (email, template context) pairs); known recipients keep their state"""
+        added = 0
+        chunk = []
+        for item in emails:
+            email, context = (item, None) if isinstance(item, str) else item
+            chunk.append((email, json.dumps(context, ensure_ascii=False) if context else None))
+            if len(chunk) >= chunk_size:
+                added += self._insert(campaign, chunk)
+                chunk = []
+        if chunk:
+            added += self._insert(campaign, chunk)
+        return added
+
+    def _insert(self, campaign: str, rows: List[Tuple[str, Optional[str]]]) -> int:
+        now = time.time()
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO sends (campaign, email, context, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                ((campaign, email, context, now, now) for email, context in rows)
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def pending(
+        self,
+        campaign: str,
+        page_size: int = 1000,
+        shard: Optional[Tuple[int, int]] = None,
+        with_context: bool = False
+    ) -> Iterator:
+        """Stream recipients never attempted (or handed back for another account), via the status index.
+
+        Yields emails, or (email, template context) pairs with with_context.
+        """
+        clause, params = self._shard_clause(shard)
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT email, context FROM sends WHERE campaign = ? AND status = ? AND email > ?{clause} "
+                    "ORDER BY email LIMIT ?",
+                    (campaign, PENDING, last, *params, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            for email, context in rows:
+                yield (email, _load_context(context)) if with_context else email
+            last = rows[-1][0]
+
+    def pending_domains(
+        self,
+        campaign: str,
+        after: str = "",
+        limit: int = 100,
+        shard: Optional[Tuple[int, int]] = None
+    ) -> List[str]:
+        """Receiving domains with pending recipients, in order, starting after `after`"""
+        clause, params = self._shard_clause(shard)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT {DOMAIN} FROM sends WHERE campaign = ? AND status = ? AND {DOMAIN} > ?{clause} "
+                f"ORDER BY {DOMAIN} LIMIT ?",
+                (campaign, PENDING, after, *params, limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def pending_in_domain(
+        self,
+        campaign: str,
+        domain: str,
+        after: str = "",
+        limit: int = 10,
+        shard: Optional[Tuple[int, int]] = None
+    ) -> List[Tuple[str, Optional[dict]]]:
+        """The next pending (email, template context) pairs at one domain, starting after email `after`"""
+        clause, params = self._shard_clause(shard)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT email, context FROM sends WHERE campaign = ? AND status = ? AND {DOMAIN} = ? AND email > ?"
+                f"{clause} ORDER BY email LIMIT ?",
+                (campaign, PENDING, domain, after, *params, limit)
+            ).fetchall()
+        return [(email, _load_context(context)) for email, context in rows]
+
+    def claim_due_retries(
+        self,
+        campaign: str,
+        now: Optional[float] = None,
+        limit: int = 1000,
+        shard: Optional[Tuple[int, int]] = None
+    ) -> List[Tuple[str, int, Optional[dict]]]:
+        """Move deferred recipients whose retry time has come back to pending; returns (email, attempts, context)"""
+        clause, params = self._shard_clause(shard)
+        with self._lock:
+            self._flush_locked()
+            rows = self._conn.execute(
+                f"SELECT email, attempts, context FROM sends WHERE campaign = ? AND status = ? AND next_attempt_at <= ?{clause} "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (campaign, DEFERRED, now if now is not None else time.time(), *params, limit)
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE sends SET status = ?, next_attempt_at = NULL WHERE campaign = ? AND email = ? AND status = ?",
+                ((PENDING, campaign, email, DEFERRED) for email, _, _ in rows)
+            )
+            self._conn.commit()
+            return [(email, attempts, _load_context(context)) for email, attempts, context in rows]
+
+    def next_retry_at(self, campaign: str, shard: Optional[Tuple[int, int]] = None) -> Optional[float]:
+        clause, params = self._shard_clause(shard)
+        with self._lock:
+            self._flush_locked()
+            return self._conn.execute(
+                f"SELECT MIN(next_attempt_at) FROM sends WHERE campaign = ? AND status = ?{clause}",
+                (campaign, DEFERRED, *params)
+            ).fetchone()[0]
+
+    def record(
+        self,
+        campaign: str,
+        email: str,
+        status: str,
+        account: Optional[str] = None,
+        smtp_code: Optional[int] = None,
+        error: Optional[str] = None,
+        next_attempt_at: Optional[float] = None
+    ) -> None:
+        """Queue the outcome of one attempt; committed with the next batch"""
+        now = time.time()
+        sent_at = now if status == SENT else None
+        with self._lock:
+            self._buffer.append((status, account, smtp_code, error, now, sent_at, next_attempt_at, campaign, email))
+            if (len(self._buffer) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def _write_buffer_locked(self) -> None:
+        """Apply buffered outcomes in the current transaction; the caller commits"""
+        if self._buffer:
+            self._conn.executemany(
+                "UPDATE sends SET status = ?, account = ?, smtp_code = ?, error = ?, "
+                "attempts = attempts + 1, updated_at = ?, sent_at = COALESCE(?, sent_at), next_attempt_at = ? "
+                "WHERE campaign = ? AND email = ?",
+                self._buffer
+            )
+            self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def _flush_locked(self) -> None:
+        if self._buffer:
+            self._write_buffer_locked()
+            self._conn.commit()
+        self._last_flush = time.monotonic()
+
+    def acquire_shard(self, campaign: str, shard: int, owner: str, ttl: float, abandoned_only: bool = False) -> bool:
+        """Take (or extend) the lease on a shard if it is free, expired, or already ours.
+
+        With abandoned_only, only a lease whose owner stopped renewing it is taken over; shards that
+        were never started or were released after finishing are left alone.
+        """
+        now = time.time()
+        with self._lock:
+            if abandoned_only:
+                cursor = self._conn.execute(
+                    "UPDATE shard_leases SET owner = ?, expires_at = ? "
+                    "WHERE campaign = ? AND shard = ? AND owner != '' AND expires_at < ?",
+                    (owner, now + ttl, campaign, shard, now)
+                )
+            else:
+                cursor = self._conn.execute(
+                    "INSERT INTO shard_leases (campaign, shard, owner, expires_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (campaign, shard) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                    "WHERE shard_leases.expires_at < ? OR shard_leases.owner IN ('', excluded.owner)",
+                    (campaign, shard, owner, now + ttl, now)
+                )
+            self._conn.commit()
+            return cursor.rowcount == 1
+
+    def renew_shard(self, campaign: str, shard: int, owner: str, ttl: float) -> bool:
+        """Heartbeat: push our lease's expiry forward; False if another worker has taken the shard"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE shard_leases SET expires_at = ? WHERE campaign = ? AND shard = ? AND owner = ?",
+                (time.time() + ttl, campaign, shard, owner)
+            )
+            self._conn.commit()
+            return cursor.rowcount == 1
+
+    def release_shard(self, campaign: str, shard: int, owner: str) -> None:
+        with self._lock:
+            self._flush_locked()
+            self._conn.execute(
+                "UPDATE shard_leases SET owner = '', expires_at = 0 WHERE campaign = ? AND shard = ? AND owner = ?",
+                (campaign, shard, owner)
+            )
+            self._conn.commit()
+
+    def shards_released(self, campaign: str, shards: int) -> bool:
+        """True once every shard of the campaign has been leased and then released by its worker"""
+        with self._lock:
+            released = self._conn.execute(
+                "SELECT COUNT(*) FROM shard_leases WHERE campaign = ? AND shard < ? AND owner = ''", (campaign, shards)
+            ).fetchone()[0]
+        return released == shards
+
+    def claim_send(
+        self,
+        campaign: str,
+        email: str,
+        shard: Optional[int] = None,
+        shards: int = 1,
+        owner: str = ""
+    ) -> bool:
+        """Mark a pending recipient as being sent; False if another worker (thread or process) has it.
+
+        With a shard, only while we still hold that shard's lease. The check and the update are one
+        statement, so a worker whose lease has expired (and been taken over) can never send a recipient
+        the new owner is responsible for, and two unsharded processes never both send one recipient.
+        """
+        now = time.time()
+        sql = "UPDATE sends SET status = ?, updated_at = ? WHERE campaign = ? AND email = ? AND status = ?"
+        params = (SENDING, now, campaign, email, PENDING)
+        if shard is not None:
+            sql += (" AND shard_of(email, ?) = ? AND EXISTS (SELECT 1 FROM shard_leases "
+                    "WHERE campaign = ? AND shard = ? AND owner = ? AND expires_at > ?)")
+            params += (shards, shard, campaign, shard, owner, now)
+        with self._lock:
+            # Earlier outcomes for this recipient (e.g. handed back for another account) must land first;
+            # they go in the same commit as the claim
+            self._write_buffer_locked()
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor.rowcount == 1
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def counts(self, campaign: str, shard: Optional[Tuple[int, int]] = None) -> Dict[str, int]:
+        clause, params = self._shard_clause(shard)
+        with self._lock:
+            self._flush_locked()
+            rows = self._conn.execute(
+                f"SELECT status, COUNT(*) FROM sends WHERE campaign = ?{clause} GROUP BY status", (campaign, *params)
+            ).fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import socket
+import threading
+from typing import List, Optional, Tuple
+
+
+def shard_of(email: str, shards: int) -> int:
+    """Stable shard for a recipient: the same on every host, process and Python version"""
+    digest = hashlib.blake2b(email.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+def accounts_for_shard(accounts: List[dict], shard: int, shards: int) -> List[dict]:
+    """The accounts owned by a shard; every account belongs to exactly one shard"""
+    ordered = sorted(accounts, key=lambda a: a["EMAIL_USER"])
+    return [a for i, a in enumerate(ordered) if i % shards == shard]
+
+
+class ShardLease:
+    """One worker's lease on a shard of a campaign, held in the send ledger and renewed by a heartbeat.
+
+    A worker that stops renewing (crashed, hung, lost the disk) loses its shard after `ttl` seconds
+    and another worker can take it over, along with the shard's accounts.
+    """
+
+    def __init__(self, ledger, campaign: str, shards: int, ttl: float = 60, owner: Optional[str] = None):
+        self.ledger = ledger
+        self.campaign = campaign
+        self.shards = shards
+        self.ttl = ttl
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.shard: Optional[int] = None
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        return (self.shard, self.shards)
+
+    def acquire(self, preferred: Optional[int] = None) -> Optional[int]:
+        """Lease the preferred shard, or else the first free one"""
+        candidates = [preferred] if preferred is not None else range(self.shards)
+        return self._take(candidates, abandoned_only=False)
+
+    def reclaim(self) -> Optional[int]:
+        """Lease a shard whose worker stopped renewing its lease"""
+        return self._take(range(self.shards), abandoned_only=True)
+
+    def _take(self, candidates, abandoned_only: bool) -> Optional[int]:
+        for shard in candidates:
+            if self.ledger.acquire_shard(self.campaign, shard, self.owner, self.ttl, abandoned_only):
+                self.shard = shard
+                self.lost.clear()
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._heartbeat, name=f"shard-{shard}-lease", daemon=True)
+                self._thread.start()
+                return shard
+        return None
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                renewed = self.ledger.renew_shard(self.campaign, self.shard, self.owner, self.ttl)
+            except Exception as e:
+                print(f"⚠ Could not renew lease on shard {self.shard}: {e}")
+                continue
+            if not renewed:
+                print(f"⚠ Lost the lease on shard {self.shard}; another worker has taken it over")
+                self.lost.set()
+                return
+
+    def owns(self, email: str) -> bool:
+        return self.shard is not None and shard_of(email, self.shards) == self.shard
+
+    def claim(self, email: str) -> bool:
+        """Reserve a recipient for sending; False if it's no longer pending or the lease is gone"""
+        return self.ledger.claim_send(self.campaign, email, self.shard, self.shards, self.owner)
+
+    def release(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.shard is not None and not self.lost.is_set():
+            self.ledger.release_shard(self.campaign, self.shard, self.owner)
+        self.shard = None
@@ -0,0 +1,431 @@
+"""Replay a campaign on a virtual clock against a synthetic SMTP backend, to tune pacing and account policies.
+
+The account scheduler (quotas, leasing, adaptive pacing, circuit breakers), the per-domain token
+buckets, error classification, backoff and the switch/defer/give-up decisions are the production
+code; only time, randomness and the SMTP server are simulated. 100k recipients replay in under ten
+seconds and a million in about a minute, however many days of sending that takes.
+
+Example:
+    python simulation.py --recipients 1000000 --accounts 40 --quota 500 --defer-rate 0.03 --provider-quota 450
+"""
+import argparse
+import contextlib
+import heapq
+import io
+import json
+import math
+import os
+import random
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from account_scheduler import AccountScheduler
+from delivery_policy import classify_smtp_error, decide_failure, SWITCH, DEFER
+from domain_throttle import DomainScheduler, recipient_domain
+from recipient_ingest import expand_sources, iter_recipients
+
+DAY = 86400
+
+
+class VirtualClock:
+    """The clock handed to the schedulers in place of the time module: time() and monotonic() are simulated seconds"""
+
+    def __init__(self, start: float):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class SyntheticSMTP:
+    """An SMTP provider and the receiving side, as probabilities.
+
+    Each account has a provider-side limit of sends per rolling 24h (which may be lower than the quota
+    the scheduler enforces); beyond it the provider answers 550 "quota exceeded". Otherwise a send is
+    dropped, deferred with a 4xx, bounced as an unknown user, or accepted. Latency is log-normal.
+    """
+
+    def __init__(
+        self,
+        rng: random.Random,
+        latency_ms: float = 800,
+        latency_sigma: float = 0.5,
+        defer_rate: float = 0.02,
+        drop_rate: float = 0.002,
+        bounce_rate: float = 0.01,
+        provider_quota: Optional[int] = None
+    ):
+        self.rng = rng
+        self.mu = math.log(latency_ms / 1000)
+        self.sigma = latency_sigma
+        self.defer_rate = defer_rate
+        self.drop_rate = drop_rate
+        self.bounce_rate = bounce_rate
+        self.provider_quota = provider_quota
+        self._accepted: Dict[str, Deque[float]] = {}
+
+    def send(self, user: str, now: float) -> Tuple[float, Optional[int], str]:
+        """(latency, SMTP code, reply text); code 250 is success, None a dropped connection"""
+        latency = self.rng.lognormvariate(self.mu, self.sigma)
+        if self.provider_quota is not None:
+            accepted = self._accepted.setdefault(user, deque())
+            while accepted and accepted[0] <= now - DAY:
+                accepted.popleft()
+            if len(accepted) >= self.provider_quota:
+                return latency, 550, "5.4.5 Daily user sending quota exceeded"
+        roll = self.rng.random()
+        if roll < self.drop_rate:
+            return latency, None, "Connection unexpectedly closed"
+        roll -= self.drop_rate
+        if roll < self.defer_rate:
+            return latency, 450, "4.2.1 Mailbox temporarily unavailable, try again later"
+        roll -= self.defer_rate
+        if roll < self.bounce_rate:
+            return latency, 550, "5.1.1 User unknown"
+        if self.provider_quota is not None:
+            self._accepted[user].append(now + latency)
+        return latency, 250, "2.0.0 OK"
+
+
+class SimulationReport:
+    def __init__(self, recipients: int, accounts: int, started_at: float):
+        self.recipients = recipients
+        self.accounts = accounts
+        self.started_at = started_at
+        self.finished_at = started_at
+        self.complete = False
+        self.attempts = 0
+        self.sent = 0
+        self.failed: Counter = Counter()      # failure class -> recipients given up on
+        self.wasted: Counter = Counter()      # failure class -> attempts that sent nothing
+        self.deferred_left = 0
+        self.pending_left = 0
+        self.quota_exhausted: Dict[str, float] = {}   # account -> first time it used up its quota
+        self.provider_limited: Counter = Counter()    # account -> times the provider refused it
+        self.pool_exhausted = 0
+        self.paused_seconds = 0.0
+        self.per_day: Counter = Counter()
+        self.wall_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        days = [self.per_day.get(d, 0) for d in range(int((self.finished_at - self.started_at) // DAY) + 1)]
+        return {
+            "recipients": self.recipients,
+            "accounts": self.accounts,
+            "complete": self.complete,
+            "duration_hours": round((self.finished_at - self.started_at) / 3600, 2),
+            "finished_at": time.strftime("%Y-%m-%d %H:%M", time.localtime(self.finished_at)),
+            "attempts": self.attempts,
+            "sent": self.sent,
+            "failed": dict(self.failed),
+            "wasted_attempts": sum(self.wasted.values()),
+            "wasted_by_class": dict(self.wasted),
+            "still_pending": self.pending_left,
+            "still_deferred": self.deferred_left,
+            "accounts_out_of_quota": len(self.quota_exhausted),
+            "first_out_of_quota_hours": round((min(self.quota_exhausted.values()) - self.started_at) / 3600, 2)
+            if self.quota_exhausted else None,
+            "accounts_refused_by_provider": len(self.provider_limited),
+            "provider_refusals": sum(self.provider_limited.values()),
+            "pool_exhausted_times": self.pool_exhausted,
+            "paused_hours": round(self.paused_seconds / 3600, 2),
+            "sent_per_day": {"min": min(days), "mean": round(sum(days) / len(days)), "max": max(days)},
+            "wall_seconds": round(self.wall_seconds, 2),
+        }
+
+    def summary(self) -> str:
+        d = self.as_dict()
+        wasted = ", ".join(f"{count} {name}" for name, count in sorted(self.wasted.items())) or "none"
+        failed = ", ".join(f"{count} {name}" for name, count in sorted(self.failed.items())) or "none"
+        lines = [
+            f"Recipients: {d['recipients']} across {d['accounts']} account(s)",
+            (f"Completion: {d['duration_hours'] / 24:.1f} days after start (around {d['finished_at']})"
+             if d["complete"] else
+             f"Not finished after {d['duration_hours'] / 24:.1f} days: {d['still_pending']} pending, "
+             f"{d['still_deferred']} deferred"),
+            f"Sent: {d['sent']} in {d['attempts']} attempts; "
+            f"per day min {d['sent_per_day']['min']}, mean {d['sent_per_day']['mean']}, max {d['sent_per_day']['max']}",
+            f"Failed: {failed}",
+            f"Wasted attempts: {d['wasted_attempts']} ({wasted})",
+            f"Accounts out of quota: {d['accounts_out_of_quota']} of {d['accounts']}"
+            + (f", the first after {d['first_out_of_quota_hours']:.1f}h" if self.quota_exhausted else ""),
+            f"Refused by the provider: {d['provider_refusals']} time(s) across {d['accounts_refused_by_provider']} account(s)",
+            f"Pool exhausted {d['pool_exhausted_times']} time(s), {d['paused_hours']:.1f}h waiting for capacity",
+            f"Simulated in {d['wall_seconds']:.1f}s",
+        ]
+        return "\n".join(lines)
+
+
+class CampaignSimulation:
+    """One campaign on the virtual clock, with `concurrency` send workers like _send_campaign.
+
+    Workers take switched recipients first, then the next domain in turn from the domain scheduler,
+    then wait for an account from the account scheduler. The feed holds up to feed_size recipients,
+    domain_backlog per domain, topped up as they go, and deferred recipients are fed back once every
+    recipient has been queued once, as the ledger-driven feeder does. Unlike a single run, the
+    simulation carries on through pauses for capacity and long retry waits, up to max_days.
+    """
+
+    def __init__(
+        self,
+        domains: Iterable[Tuple[str, int]],
+        scheduler: AccountScheduler,
+        backend: SyntheticSMTP,
+        clock: VirtualClock,
+        rng: random.Random,
+        concurrency: int,
+        max_attempts: int,
+        retry_base: float,
+        domain_rate: float,
+        domain_burst: int,
+        feed_size: int = 1000,
+        max_days: float = 365
+    ):
+        domains = list(domains)
+        self.scheduler = scheduler
+        self.backend = backend
+        self.clock = clock
+        self.rng = rng
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.feed = DomainScheduler(domain_rate, domain_burst, clock=clock)
+        self.domain_backlog = max(2 * domain_burst, 4)
+        self.feed_size = feed_size
+        self.deadline = clock.now + max_days * DAY
+        self.report = SimulationReport(sum(count for _, count in domains), len(scheduler.accounts), clock.now)
+
+        # Items are [domain, attempts] lists, plus a third element once switched to another account
+        self._unfed = deque(domains)
+        self._more: Dict[str, int] = {}        # domain -> recipients not yet in the feed
+        self._switched: Deque[list] = deque()
+        self._deferred: List[Tuple[float, int, list]] = []
+        self._in_flight: List[Tuple[float, int, dict, list, Optional[int], str]] = []
+        self._waiting: Deque[list] = deque()   # taken by a worker that is waiting for an account
+        self._idle_workers = concurrency
+        self._seq = 0
+        self._paused_since: Optional[float] = None
+
+    def _fill(self) -> None:
+        """Queue new domains while the feed has room"""
+        while self._unfed and len(self.feed) < self.feed_size:
+            domain, count = self._unfed.popleft()
+            first = min(count, self.domain_backlog)
+            for _ in range(first):
+                self.feed.put(domain, [domain, 0])
+            if count > first:
+                self._more[domain] = count - first
+
+    def _take(self) -> Optional[list]:
+        if self._switched:
+            return self._switched.popleft()
+        item = self.feed.get(timeout=0)
+        if item is not None and item[1] == 0:
+            # A first attempt left the feed: top its domain back up, as the feeder does
+            left = self._more.pop(item[0], 0)
+            if left:
+                self.feed.put(item[0], [item[0], 0])
+                if left > 1:
+                    self._more[item[0]] = left - 1
+        return item
+
+    def _dispatch(self) -> Optional[float]:
+        """Start sends while workers, recipients and accounts allow; returns when an account may free up"""
+        while True:
+            if self._waiting:
+                item = self._waiting.popleft()
+            elif self._idle_workers:
+                item = self._take()
+                if item is None:
+                    return None
+                self._idle_workers -= 1
+            else:
+                return None
+            account, wake_at, exhausted = self.scheduler.try_acquire()
+            if account is None:
+                # The worker holds on to its recipient until an account is free
+                self._waiting.appendleft(item)
+                if exhausted and self._paused_since is None:
+                    self._paused_since = self.clock.now
+                    self.report.pool_exhausted += 1
+                return wake_at
+            if self._paused_since is not None:
+                self.report.paused_seconds += self.clock.now - self._paused_since
+                self._paused_since = None
+            latency, code, message = self.backend.send(account["EMAIL_USER"], self.clock.now)
+            self._seq += 1
+            heapq.heappush(self._in_flight, (self.clock.now + latency, self._seq, account, item, code, message))
+
+    def _finish(self, account: dict, item: list, code: Optional[int], message: str) -> None:
+        """What _send_one does with the outcome of one send"""
+        report = self.report
+        user = account["EMAIL_USER"]
+        report.attempts += 1
+        if code == 250:
+            report.sent += 1
+            report.per_day[int((self.clock.now - report.started_at) // DAY)] += 1
+            self.scheduler.release(account, sent=True)
+            if user not in report.quota_exhausted and self.scheduler.remaining(account) == 0:
+                report.quota_exhausted[user] = self.clock.now
+            return
+
+        error_class = classify_smtp_error(code, message)
+        report.wasted[error_class] += 1
+        item[1] += 1
+        decision = decide_failure(error_class, code, item[1], len(item) > 2, self.max_attempts,
+                                  self.clock.now, retry_base=self.retry_base, rng=self.rng)
+        if decision.account_fault:
+            report.provider_limited[user] += 1
+            self.scheduler.mark_unhealthy(account)
+        if decision.slows_domain:
+            self.feed.slow_down(item[0])
+        if decision.action == SWITCH:
+            self._switched.append([item[0], item[1], True])
+        elif decision.action == DEFER:
+            self._seq += 1
+            heapq.heappush(self._deferred, (decision.retry_at, self._seq, [item[0], item[1]]))
+        else:
+            report.failed[error_class] += 1
+        self.scheduler.release(account, sent=False, soft_error=decision.soft_error)
+
+    def run(self) -> SimulationReport:
+        started = time.perf_counter()
+        self._fill()
+        while True:
+            # Deferred recipients come back once every recipient has been queued once
+            if not self._unfed and not self._more:
+                while self._deferred and self._deferred[0][0] <= self.clock.now and len(self.feed) < self.feed_size:
+                    item = heapq.heappop(self._deferred)[2]
+                    self.feed.put(item[0], item)
+            self._fill()
+            account_wake = self._dispatch()
+
+            now = self.clock.now
+            wakeups = []
+            if self._in_flight:
+                wakeups.append(self._in_flight[0][0])
+            if self._waiting and account_wake is not None:
+                wakeups.append(account_wake)
+            if self._idle_workers and not self._waiting:
+                ready_at = self.feed.next_ready_at()
+                if ready_at is not None:
+                    # A bucket a rounding error short of a token: step forward the way get() would wait
+                    wakeups.append(max(ready_at, now + 0.005))
+            if self._deferred and not self._unfed and not self._more:
+                wakeups.append(self._deferred[0][0])
+            wakeups = [t for t in wakeups if t > now]
+            if not wakeups or min(wakeups) > self.deadline:
+                break
+            self.clock.now = min(wakeups)
+
+            while self._in_flight and self._in_flight[0][0] <= self.clock.now:
+                _, _, account, item, code, message = heapq.heappop(self._in_flight)
+                self._finish(account, item, code, message)
+                self._idle_workers += 1
+
+        report = self.report
+        report.finished_at = self.clock.now
+        report.deferred_left = len(self._deferred)
+        report.pending_left = (len(self.feed) + len(self._waiting) + len(self._switched) + len(self._in_flight)
+                               + sum(self._more.values()) + sum(count for _, count in self._unfed))
+        report.complete = not report.deferred_left and not report.pending_left
+        report.wall_seconds = time.perf_counter() - started
+        return report
+
+
+def synthetic_domains(recipients: int, domains: int, skew: float, rng: random.Random) -> List[Tuple[str, int]]:
+    """Recipients spread over domains with Zipf-like sizes: a few big employers, a long tail of small ones"""
+    weights = [1 / (rank + 1) ** skew for rank in range(domains)]
+    counts = Counter(rng.choices(range(domains), weights=weights, k=recipients))
+    # The feeder takes domains in the ledger's (alphabetical) order
+    return sorted((f"vendor{rank:06d}.example.com", count) for rank, count in counts.items())
+
+
+def csv_domains(patterns: List[str]) -> List[Tuple[str, int]]:
+    counts = Counter(recipient_domain(row["Email"]) for row in iter_recipients(expand_sources(patterns)))
+    return sorted(counts.items())
+
+
+def simulate(args) -> SimulationReport:
+    rng = random.Random(args.seed)
+    if args.csv:
+        domains = csv_domains(args.csv)
+    else:
+        domains = synthetic_domains(args.recipients, args.domains, args.domain_skew, rng)
+    if args.accounts:
+        accounts = [{"EMAIL_USER": f"sender{i}@example.com", "EMAIL_PASS": ""} for i in range(args.accounts)]
+    else:
+        # Read directly rather than importing main, which also needs the SMTP settings
+        with open(os.getenv("EMAIL_ACCOUNTS_FILE", "email_accounts.json")) as f:
+            accounts = json.load(f)
+    clock = VirtualClock(time.time())
+    with contextlib.redirect_stdout(io.StringIO()):
+        # In memory: the real usage DB isn't touched, and nothing carries over between simulations
+        scheduler = AccountScheduler(
+            accounts, ":memory:", default_quota=args.quota, pacing=tuple(args.pacing), clock=clock, rng=rng
+        )
+        backend = SyntheticSMTP(
+            rng, args.latency_ms, args.latency_sigma, args.defer_rate, args.drop_rate, args.bounce_rate,
+            args.provider_quota
+        )
+        simulation = CampaignSimulation(
+            domains, scheduler, backend, clock, rng,
+            concurrency=min(args.concurrency or len(accounts), len(accounts)),
+            max_attempts=args.max_attempts,
+            retry_base=args.retry_base,
+            domain_rate=args.domain_rate,
+            domain_burst=args.domain_burst,
+            max_days=args.max_days
+        )
+        report = simulation.run()
+        scheduler.close()
+    return report
+
+
+def main():
+    # Same defaults as main.py, read from the environment without importing it
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    recipients = parser.add_argument_group("recipients")
+    recipients.add_argument("--recipients", type=int, default=100000, help="synthetic recipients")
+    recipients.add_argument("--domains", type=int, default=20000, help="synthetic recipient domains")
+    recipients.add_argument("--domain-skew", type=float, default=1.0, help="Zipf exponent of domain sizes")
+    recipients.add_argument("--csv", nargs="+", help="use the recipients of these CSV files instead")
+    policy = parser.add_argument_group("policy (defaults from the environment, as main.py reads it)")
+    policy.add_argument("--accounts", type=int, help="synthetic sending accounts (default: EMAIL_ACCOUNTS_FILE)")
+    policy.add_argument("--quota", type=int, default=int(os.getenv("MAX_EMAILS_PER_ACCOUNT", "100")),
+                        help="sends per account per 24h, unless the account sets DAILY_QUOTA")
+    policy.add_argument("--pacing", type=float, nargs=2, metavar=("MIN", "MAX"),
+                        default=[5, 15], help="seconds between sends per account")
+    policy.add_argument("--concurrency", type=int, default=int(os.getenv("MAX_CONCURRENCY", "0")),
+                        help="accounts sending at once (default: all)")
+    policy.add_argument("--max-attempts", type=int, default=int(os.getenv("MAX_SEND_ATTEMPTS", "5")))
+    policy.add_argument("--retry-base", type=float, default=float(os.getenv("RETRY_BASE_DELAY", "300")))
+    policy.add_argument("--domain-rate", type=float, default=float(os.getenv("DOMAIN_RATE_PER_MINUTE", "10")))
+    policy.add_argument("--domain-burst", type=int, default=int(os.getenv("DOMAIN_BURST", "3")))
+    backend = parser.add_argument_group("synthetic SMTP backend")
+    backend.add_argument("--latency-ms", type=float, default=800, help="median send latency")
+    backend.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread of the latency")
+    backend.add_argument("--defer-rate", type=float, default=0.02, help="share of sends answered 450")
+    backend.add_argument("--drop-rate", type=float, default=0.002, help="share of sends losing the connection")
+    backend.add_argument("--bounce-rate", type=float, default=0.01, help="share of recipients that don't exist")
+    backend.add_argument("--provider-quota", type=int, help="the provider's own 24h limit per account")
+    parser.add_argument("--max-days", type=float, default=365, help="stop simulating after this long")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = simulate(args)
+    print(report.summary())
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "report": report.as_dict()}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import smtplib
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from metrics import registry as metrics
+
+
+class _PooledSMTP(smtplib.SMTP):
+    """smtplib.SMTP that notes when a mail transaction has begun, so a failed send is only retried if
+    nothing of the message can have reached the server"""
+
+    transaction_started = False
+
+    def mail(self, sender, options=()):
+        self.transaction_started = True
+        return super().mail(sender, options)
+
+
+class SMTPConnectionPool:
+    """Keeps one authenticated SMTP session per email account and reuses it across sends"""
+
+    def __init__(self, host: str, port: int, idle_timeout: float = 300, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._sessions: Dict[str, Tuple[smtplib.SMTP, float]] = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, account: dict) -> smtplib.SMTP:
+        user = account["EMAIL_USER"]
+        # DNS + TCP connect + greeting
+        with metrics.timer("smtp_connect", user):
+            server = _PooledSMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            with metrics.timer("smtp_starttls", user):
+                server.starttls()
+            with metrics.timer("smtp_auth", user):
+                server.login(user, account["EMAIL_PASS"])
+        except Exception:
+            self._quit(server)
+            raise
+        return server
+
+    @staticmethod
+    def _quit(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_alive(server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def get_session(self, account: dict) -> smtplib.SMTP:
+        """Return a live session for the account, reconnecting if the pooled one is stale"""
+        key = account["EMAIL_USER"]
+        self.close_idle()
+        with self._lock:
+            entry = self._sessions.pop(key, None)
+
+        server: Optional[smtplib.SMTP] = None
+        if entry is not None:
+            server = entry[0]
+            if not self._is_alive(server):
+                self._quit(server)
+                server = None
+
+        if server is None:
+            server = self._connect(account)
+
+        with self._lock:
+            self._sessions[key] = (server, time.monotonic())
+        return server
+
+    @staticmethod
+    def _timed(user: str, server: smtplib.SMTP, action) -> None:
+        # MAIL FROM / RCPT TO / DATA; failures are labelled with the SMTP reply code
+        with metrics.timer("smtp_data", user) as timer:
+            action(server)
+            timer.code = "250"
+
+    def _run(self, account: dict, action) -> None:
+        user = account["EMAIL_USER"]
+        with metrics.timer("smtp_session", user):
+            server = self.get_session(account)
+        server.transaction_started = False
+        try:
+            self._timed(user, server, action)
+        except smtplib.SMTPServerDisconnected:
+            self.invalidate(account)
+            if server.transaction_started:
+                # Dropped after MAIL FROM: the message may already have been accepted, so don't send it twice
+                raise
+            # Pooled session was dropped by the server before the send began; reconnect once and retry
+            server = self.get_session(account)
+            server.transaction_started = False
+            self._timed(user, server, action)
+        self._touch(account)
+
+    def send(self, account: dict, msg) -> None:
+        """Send an email.message.Message through the account's pooled session"""
+        self._run(account, lambda server: server.send_message(msg))
+
+    def sendmail(self, account: dict, from_addr: str, to_addrs, data: bytes) -> None:
+        """Send pre-rendered message bytes through the account's pooled session"""
+        self._run(account, lambda server: server.sendmail(from_addr, to_addrs, data))
+
+    def _touch(self, account: dict) -> None:
+        key = account["EMAIL_USER"]
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is not None:
+                self._sessions[key] = (entry[0], time.monotonic())
+
+    def invalidate(self, account: dict) -> None:
+        """Drop the pooled session for an account (e.g. after an auth or limit error)"""
+        with self._lock:
+            entry = self._sessions.pop(account["EMAIL_USER"], None)
+        if entry is not None:
+            self._quit(entry[0])
+
+    def close_idle(self) -> None:
+        """Close sessions that have not been used within idle_timeout seconds"""
+        now = time.monotonic()
+        with self._lock:
+            stale = [key for key, (_, last_used) in self._sessions.items()
+                     if now - last_used > self.idle_timeout]
+            servers = [self._sessions.pop(key)[0] for key in stale]
+        for server in servers:
+            self._quit(server)
+
+    def close_all(self) -> None:
+        with self._lock:
+            servers = [server for server, _ in self._sessions.values()]
+            self._sessions.clear()
+        for server in servers:
+            self._quit(server)
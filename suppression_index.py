@@ -0,0 +1,182 @@
+import argparse
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from recipient_ingest import expand_sources, iter_recipients, normalize_email
+
+CONTACTED = "contacted"
+OPTED_OUT = "opted_out"
+BOUNCED = "bounced"
+
+# Reasons that suppress forever; CONTACTED only suppresses within the cool-down window
+PERMANENT_REASONS = (OPTED_OUT, BOUNCED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS suppression (
+    key        BLOB PRIMARY KEY,
+    email      TEXT NOT NULL,
+    reason     TEXT NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def _digest(email: str) -> bytes:
+    return hashlib.blake2b(normalize_email(email).encode("utf-8"), digest_size=16).digest()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 16-byte digests; answers "definitely absent" in O(1)"""
+
+    def __init__(self, expected_items: int, error_rate: float = 0.01):
+        expected_items = max(expected_items, 1000)
+        self.size = int(-expected_items * math.log(error_rate) / (math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / expected_items * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest: bytes):
+        # Double hashing: two 64-bit halves of the digest generate all k positions
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, digest: bytes) -> None:
+        for pos in self._positions(digest):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, digest: bytes) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+
+class SuppressionIndex:
+    """Cross-campaign list of contacted, opted-out and bounced addresses.
+
+    Lookups go through an in-memory Bloom filter first, so addresses never seen cost no disk access;
+    possible hits are confirmed against the SQLite table keyed by a 16-byte address digest. Addresses
+    other processes add only reach the filter on refresh(), which a long-lived index calls per campaign.
+    """
+
+    def __init__(self, path: str = "suppression.db", expected_items: int = 1_000_000, batch_size: int = 100):
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._buffer: List[Tuple] = []
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self.expected_items = expected_items
+        self._data_version = None
+        self._bloom = None
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """Rebuild the Bloom filter if another connection changed the table since it was built"""
+        with self._lock:
+            self._flush_locked()
+            # data_version only moves when some other connection commits
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return False
+            count = self._conn.execute("SELECT COUNT(*) FROM suppression").fetchone()[0]
+            bloom = BloomFilter(max(self.expected_items, count * 2))
+            for (key,) in self._conn.execute("SELECT key FROM suppression"):
+                bloom.add(key)
+            self._bloom = bloom
+            self._data_version = version
+            return True
+
+    def add(self, email: str, reason: str, when: Optional[float] = None) -> None:
+        """Record an address; committed in batches. Opt-outs and bounces are never downgraded"""
+        email = normalize_email(email)
+        if not email:
+            return
+        key = _digest(email)
+        with self._lock:
+            self._bloom.add(key)
+            self._buffer.append((key, email, reason, when or time.time()))
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+
+    def add_many(self, emails: Iterable[str], reason: str) -> int:
+        count = 0
+        for email in emails:
+            self.add(email, reason)
+            count += 1
+        self.flush()
+        return count
+
+    def _flush_locked(self) -> None:
+        if not self._buffer:
+            return
+        permanent = ", ".join(f"'{r}'" for r in PERMANENT_REASONS)
+        self._conn.executemany(
+            "INSERT INTO suppression (key, email, reason, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            f"reason = CASE WHEN suppression.reason IN ({permanent}) THEN suppression.reason "
+            "ELSE excluded.reason END, "
+            "updated_at = MAX(suppression.updated_at, excluded.updated_at)",
+            self._buffer
+        )
+        self._conn.commit()
+        self._buffer = []
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def lookup(self, email: str) -> Optional[Tuple[str, float]]:
+        """Return (reason, updated_at) for a suppressed address, or None"""
+        key = _digest(email)
+        with self._lock:
+            if key not in self._bloom:
+                return None
+            self._flush_locked()
+            row = self._conn.execute(
+                "SELECT reason, updated_at FROM suppression WHERE key = ?", (key,)
+            ).fetchone()
+        return row
+
+    def is_suppressed(self, email: str, cooldown_seconds: float) -> Optional[str]:
+        """Reason the address must be skipped now, or None if it may be mailed"""
+        row = self.lookup(email)
+        if row is None:
+            return None
+        reason, updated_at = row
+        if reason in PERMANENT_REASONS:
+            return reason
+        if time.time() - updated_at < cooldown_seconds:
+            return reason
+        return None
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add addresses to the suppression index")
+    parser.add_argument("reason", choices=[OPTED_OUT, BOUNCED, CONTACTED])
+    parser.add_argument("sources", nargs="+", help="CSV files or globs with an 'Email' column")
+    parser.add_argument("--db", default="suppression.db")
+    args = parser.parse_args()
+
+    if not expand_sources(args.sources):
+        print(f"⚠ No CSV files found: {', '.join(args.sources)}")
+        return
+    index = SuppressionIndex(args.db)
+    count = index.add_many((row["Email"] for row in iter_recipients(args.sources)), args.reason)
+    index.close()
+    print(f"Recorded {count} addresses as {args.reason}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Address validation with StubResolver, and DNSResolver's MX / A-record fallback with lookups patched out.
+
+Run: python -m pytest tests/
+"""
+import os
+import socket
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import address_validator  # noqa: E402
+from address_validator import (  # noqa: E402
+    AddressValidator, CachingResolver, DNSResolver, StubResolver, DISPOSABLE, INVALID_SYNTAX, NO_MAIL_HOST
+)
+
+
+class ValidatorTest(unittest.TestCase):
+    def validator(self, answers=None, **kwargs):
+        self.resolver = StubResolver(answers)
+        return AddressValidator(resolver=self.resolver, **kwargs)
+
+    def test_syntax(self):
+        validator = self.validator()
+        for email in ("plain@example.com", "First.Last+tag@Sub.Example.co.uk", " padded@example.com "):
+            self.assertIsNone(validator.check(email), email)
+        for email in ("no-at-sign", "two@@example.com", "a@b", "dot.@example.com", "a..b@example.com",
+                      "a@-example.com", "a@example.c0m", "x" * 250 + "@example.com"):
+            self.assertEqual(validator.check(email), INVALID_SYNTAX, email)
+        # Two domains looked up once each; bad syntax never reaches the resolver
+        self.assertEqual(self.resolver.lookups, 2)
+
+    def test_disposable_domains(self):
+        validator = self.validator()
+        self.assertEqual(validator.check("someone@mailinator.com"), DISPOSABLE)
+        self.assertEqual(validator.check("Someone@YOPMAIL.com"), DISPOSABLE)
+        custom = self.validator(disposable_domains={"burner.example"})
+        self.assertEqual(custom.check("a@burner.example"), DISPOSABLE)
+        self.assertIsNone(custom.check("a@mailinator.com"))
+        # Rejected offline: no lookup needed
+        self.assertEqual(self.resolver.lookups, 1)
+
+    def test_domains_without_mail_host(self):
+        validator = self.validator({"dead.example": False})
+        self.assertEqual(validator.check("a@dead.example"), NO_MAIL_HOST)
+        self.assertIsNone(validator.check("a@live.example"))
+        self.assertIsNone(self.validator({"dead.example": False}, check_domains=False).check("a@dead.example"))
+
+    def test_filter_resolves_each_domain_once(self):
+        validator = self.validator({"dead.example": False})
+        emails = [f"user{i}@{domain}" for i in range(50)
+                  for domain in ("live.example", "dead.example", "mailinator.com")] + ["bad@@x.com"]
+        kept = list(validator.filter(emails, chunk_size=40))
+        self.assertEqual(kept, [e for e in emails if e.endswith("@live.example")])
+        self.assertEqual(self.resolver.lookups, 2)
+        self.assertEqual(validator.rejections, {NO_MAIL_HOST: 50, DISPOSABLE: 50, INVALID_SYNTAX: 1})
+
+    def test_filter_by_key(self):
+        rows = [{"Email": "a@live.example"}, {"Email": "b@dead.example"}]
+        kept = list(self.validator({"dead.example": False}).filter(rows, key=lambda row: row["Email"]))
+        self.assertEqual(kept, rows[:1])
+
+
+class CachingResolverTest(unittest.TestCase):
+    def test_ttl(self):
+        stub = StubResolver({"a.example": True, "b.example": False})
+        resolver = CachingResolver(stub, ttl=60)
+        with mock.patch.object(address_validator.time, "monotonic", return_value=1000.0) as clock:
+            self.assertTrue(resolver.has_mail_host("a.example"))
+            self.assertFalse(resolver.has_mail_host("b.example"))
+            self.assertTrue(resolver.has_mail_host("a.example"))
+            self.assertFalse(resolver.has_mail_host("b.example"))
+            self.assertEqual(stub.lookups, 2)
+            clock.return_value = 1059.0
+            self.assertTrue(resolver.cached("a.example"))
+            clock.return_value = 1061.0
+            self.assertIsNone(resolver.cached("a.example"))
+            self.assertTrue(resolver.has_mail_host("a.example"))
+            self.assertEqual(stub.lookups, 3)
+
+    def test_lru_eviction(self):
+        stub = StubResolver()
+        resolver = CachingResolver(stub, maxsize=2)
+        for domain in ("a.example", "b.example", "a.example", "c.example"):
+            resolver.has_mail_host(domain)
+        self.assertIsNone(resolver.cached("b.example"))
+        self.assertTrue(resolver.cached("a.example"))
+        self.assertTrue(resolver.cached("c.example"))
+
+
+def mx(*exchanges):
+    return [SimpleNamespace(exchange=e) for e in exchanges]
+
+
+def gaierror(errno=socket.EAI_NONAME):
+    return socket.gaierror(errno, "Name or service not known")
+
+
+class DNSResolverTest(unittest.TestCase):
+    def lookup(self, resolve, getaddrinfo):
+        with mock.patch.object(address_validator.socket, "getaddrinfo", side_effect=getaddrinfo) as addr:
+            if address_validator.dns is not None:
+                with mock.patch.object(address_validator.dns.resolver, "resolve", side_effect=resolve):
+                    result = DNSResolver().has_mail_host("example.com")
+            else:
+                result = DNSResolver().has_mail_host("example.com")
+        return result, addr.called
+
+    @unittest.skipIf(address_validator.dns is None, "dnspython is not installed")
+    def test_mx_records(self):
+        self.assertEqual(self.lookup(lambda *a, **k: mx("mx1.example.com."), gaierror()), (True, False))
+        # Null MX (RFC 7505): the domain takes no mail
+        self.assertEqual(self.lookup(lambda *a, **k: mx("."), None), (False, False))
+
+    @unittest.skipIf(address_validator.dns is None, "dnspython is not installed")
+    def test_no_mx_falls_back_to_address_records(self):
+        dns = address_validator.dns
+        no_answer = dns.resolver.NoAnswer()
+        self.assertEqual(self.lookup(no_answer, lambda *a, **k: [("addr",)]), (True, True))
+        self.assertEqual(self.lookup(no_answer, gaierror()), (False, True))
+        # Lookup trouble isn't proof the domain is dead
+        self.assertEqual(self.lookup(no_answer, gaierror(socket.EAI_AGAIN)), (True, True))
+        self.assertEqual(self.lookup(dns.resolver.NXDOMAIN(), None), (False, False))
+        self.assertEqual(self.lookup(dns.exception.Timeout(), None), (True, False))
+
+    def test_without_dnspython_a_missing_address_record_is_unknown(self):
+        with mock.patch.object(address_validator, "dns", None):
+            self.assertEqual(self.lookup(None, lambda *a, **k: [("addr",)]), (True, True))
+            # The domain may still have MX records, so it is kept
+            self.assertEqual(self.lookup(None, gaierror()), (True, True))
+
+
+if __name__ == "__main__":
+    unittest.main()
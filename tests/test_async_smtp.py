@@ -0,0 +1,220 @@
+"""AsyncSMTP and AsyncSMTPPool against the benchmark SMTP sink: message bytes, PIPELINING, stale sessions
+and how server errors map onto smtplib exceptions (the same ones the smtplib transport raises).
+
+Run: python -m pytest tests/  (or python -m unittest discover tests)
+"""
+import asyncio
+import os
+import shutil
+import smtplib
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from async_smtp import AsyncSMTP, AsyncSMTPPool, StaleSession  # noqa: E402
+from delivery_policy import TEMPORARY, classify_exception  # noqa: E402
+from smtp_pool import SMTPConnectionPool  # noqa: E402
+from smtp_sink import SinkConfig, SMTPSink, make_tls_context  # noqa: E402
+from bench_smtp_transport import client_tls_context  # noqa: E402
+
+SAMPLES = [
+    b"Subject: plain\r\n\r\nHello\r\n",
+    b"Subject: dots\r\n\r\n.leading dot\r\n..two dots\r\n.\r\nend\r\n",
+    "Subject: 8bit\r\nContent-Transfer-Encoding: 8bit\r\n\r\nCafé résumé\r\n".encode("utf-8"),
+    b"Subject: no trailing newline\r\n\r\nlast line",
+]
+ACCOUNT = {"EMAIL_USER": "sender@example.com", "EMAIL_PASS": "secret"}
+RCPTS = ["a@example.com", "b@example.net"]
+
+
+class DroppingSink(SMTPSink):
+    """Sink that can drop every open connection, as a server does with idle sessions"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connections = []
+
+    async def handle(self, reader, writer):
+        self.connections.append(writer)
+        await super().handle(reader, writer)
+
+    def drop_all(self):
+        for writer in self.connections:
+            writer.transport.abort()
+
+
+class StallingServer:
+    """Greets and answers EHLO (and STARTTLS), then never replies again, like an overloaded server"""
+
+    def __init__(self, pipelining=True, starttls=False):
+        caps = [b"localhost"] + [b"PIPELINING"] * pipelining + [b"STARTTLS"] * starttls
+        self.ehlo_reply = b"".join(b"250-" + c + b"\r\n" for c in caps[:-1]) + b"250 " + caps[-1] + b"\r\n"
+
+    async def handle(self, reader, writer):
+        writer.write(b"220 localhost ESMTP\r\n")
+        await reader.readline()
+        writer.write(self.ehlo_reply)
+        if (await reader.readline()).startswith(b"STARTTLS"):
+            writer.write(b"220 Go ahead\r\n")
+        # Read and ignore everything else until the client gives up
+        while await reader.read(4096):
+            pass
+        writer.close()
+
+
+class SessionTest(unittest.IsolatedAsyncioTestCase):
+    """One AsyncSMTP session against an in-process sink without TLS"""
+
+    async def start_sink(self, **config):
+        self.messages = []
+        self.sink = DroppingSink(SinkConfig(tls=False, **config), messages=self.messages)
+        self.server = await self.sink.serve()
+        self.addAsyncCleanup(self._stop_sink)
+        session = AsyncSMTP("127.0.0.1", self.server.sockets[0].getsockname()[1], timeout=5)
+        await session.connect()
+        self.addAsyncCleanup(session.quit)
+        return session
+
+    async def _stop_sink(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def test_pipelining_follows_the_server(self):
+        for pipelining in (True, False):
+            session = await self.start_sink(pipelining=pipelining)
+            self.assertEqual(session.pipelining, pipelining)
+
+    async def test_pipelined_envelope_saves_round_trips(self):
+        rtt = 0.05
+        elapsed = {}
+        for pipelining in (True, False):
+            session = await self.start_sink(rtt_ms=rtt * 1000, pipelining=pipelining)
+            started = time.perf_counter()
+            await session.sendmail("sender@example.com", ["a@example.com"], SAMPLES[0])
+            elapsed[pipelining] = time.perf_counter() - started
+        # MAIL/RCPT/DATA in one write, then the message: two round trips instead of four
+        self.assertLess(elapsed[True], 3 * rtt)
+        self.assertGreaterEqual(elapsed[False], 3 * rtt)
+        self.assertEqual(len(self.messages), 1)
+
+    async def test_dropped_session_is_stale(self):
+        for pipelining in (True, False):
+            session = await self.start_sink(pipelining=pipelining)
+            self.sink.drop_all()
+            await asyncio.sleep(0.05)
+            with self.assertRaises(StaleSession):
+                await session.sendmail("sender@example.com", RCPTS, SAMPLES[0])
+            self.assertEqual(self.messages, [])
+
+    async def test_server_errors_map_to_smtplib_exceptions(self):
+        for fault, code in (("fail_550", 550), ("fail_450", 450), ("fail_421", 421)):
+            session = await self.start_sink(**{fault: 1.0})
+            with self.assertRaises(smtplib.SMTPDataError) as raised:
+                await session.sendmail("sender@example.com", RCPTS, SAMPLES[0])
+            self.assertEqual(raised.exception.smtp_code, code)
+            # 421 means the server is closing the session; anything else leaves it usable
+            self.assertEqual(session.connected, code != 421)
+
+
+class StallTest(unittest.IsolatedAsyncioTestCase):
+    """A server that stops answering: a temporary failure, not a hung send or a stale session to resend on"""
+
+    async def connect(self, **server):
+        listener = await asyncio.start_server(StallingServer(**server).handle, "127.0.0.1", 0)
+        self.addAsyncCleanup(listener.wait_closed)
+        self.addCleanup(listener.close)
+        session = AsyncSMTP("127.0.0.1", listener.sockets[0].getsockname()[1], timeout=0.2)
+        await session.connect()
+        return session
+
+    def assert_temporary(self, error, session):
+        self.assertIsInstance(error, smtplib.SMTPServerDisconnected)
+        self.assertNotIsInstance(error, StaleSession)
+        self.assertEqual(classify_exception(error)[0], TEMPORARY)
+        self.assertFalse(session.connected)
+
+    async def test_no_reply_to_the_envelope(self):
+        for pipelining in (True, False):
+            session = await self.connect(pipelining=pipelining)
+            with self.assertRaises(smtplib.SMTPServerDisconnected) as raised:
+                await session.sendmail("sender@example.com", RCPTS, SAMPLES[0])
+            self.assert_temporary(raised.exception, session)
+
+    async def test_no_tls_handshake(self):
+        session = await self.connect(starttls=True)
+        with self.assertRaises(smtplib.SMTPServerDisconnected) as raised:
+            await session.starttls(client_tls_context())
+        self.assert_temporary(raised.exception, session)
+
+
+@unittest.skipUnless(shutil.which("openssl"), "the sink needs openssl for its STARTTLS certificate")
+class PoolTest(unittest.TestCase):
+    """Both transports through STARTTLS and AUTH, on a sink served from a background event loop"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.loop = asyncio.new_event_loop()
+        threading.Thread(target=cls.loop.run_forever, daemon=True).start()
+        cls.tmp = tempfile.mkdtemp(prefix="test_async_smtp_")
+        cls.tls = make_tls_context(cls.tmp)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def start_sink(self, **config):
+        messages = []
+        sink = DroppingSink(SinkConfig(**config), self.tls, messages=messages)
+        server = asyncio.run_coroutine_threadsafe(sink.serve(), self.loop).result()
+        self.addCleanup(self.loop.call_soon_threadsafe, server.close)
+        return sink, server.sockets[0].getsockname()[1], messages
+
+    def pools(self, port):
+        for pool in (SMTPConnectionPool("127.0.0.1", port),
+                     AsyncSMTPPool("127.0.0.1", port, tls_context=client_tls_context())):
+            yield pool
+            pool.close_all()
+
+    def test_messages_arrive_intact(self):
+        for pipelining in (True, False):
+            _, port, messages = self.start_sink(pipelining=pipelining)
+            for pool in self.pools(port):
+                with self.subTest(transport=type(pool).__name__, pipelining=pipelining):
+                    messages.clear()
+                    for data in SAMPLES:
+                        pool.sendmail(ACCOUNT, "sender@example.com", RCPTS, data)
+                    expected = [d if d.endswith(b"\r\n") else d + b"\r\n" for d in SAMPLES]
+                    self.assertEqual([body for _, _, body in messages], expected)
+                    for _, rcpts, _ in messages:
+                        self.assertEqual(rcpts, [b"TO:<a@example.com>", b"TO:<b@example.net>"])
+
+    def test_stale_pooled_session_is_resent_once(self):
+        sink, port, messages = self.start_sink()
+        for pool in self.pools(port):
+            with self.subTest(transport=type(pool).__name__):
+                messages.clear()
+                pool.sendmail(ACCOUNT, "sender@example.com", RCPTS, SAMPLES[0])
+                self.loop.call_soon_threadsafe(sink.drop_all)
+                time.sleep(0.05)
+                pool.sendmail(ACCOUNT, "sender@example.com", RCPTS, SAMPLES[1])
+                self.assertEqual(len(messages), 2)
+
+    def test_both_transports_raise_the_same_errors(self):
+        for fault, code in (("fail_550", 550), ("fail_450", 450), ("fail_421", 421)):
+            _, port, _ = self.start_sink(**{fault: 1.0})
+            for pool in self.pools(port):
+                with self.subTest(transport=type(pool).__name__, code=code):
+                    with self.assertRaises(smtplib.SMTPDataError) as raised:
+                        pool.sendmail(ACCOUNT, "sender@example.com", RCPTS, SAMPLES[0])
+                    self.assertEqual(raised.exception.smtp_code, code)
+
+
+if __name__ == "__main__":
+    unittest.main()
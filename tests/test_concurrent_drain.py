@@ -0,0 +1,101 @@
+"""Two unsharded main.py processes sending one campaign from a shared ledger and spool: every recipient
+is delivered exactly once.
+
+Run: python -m pytest tests/
+"""
+import asyncio
+import csv
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from smtp_sink import SinkConfig, SMTPSink, make_tls_context  # noqa: E402
+
+RECIPIENTS = 300
+STAGGER = 0.8
+DRIVER = f"""
+import contextlib, os, sys
+sys.path.insert(0, {ROOT!r})
+import main
+main.SEND_DELAY_RANGE = (0, 0)
+with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+    main.run()
+"""
+
+
+@unittest.skipUnless(shutil.which("openssl"), "the sink needs openssl for its STARTTLS certificate")
+class ConcurrentDrainTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="test_concurrent_drain_")
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.messages = []
+        sink = SMTPSink(SinkConfig(rtt_ms=1), make_tls_context(self.workdir), messages=self.messages)
+        self.server = asyncio.run_coroutine_threadsafe(sink.serve(), self.loop).result()
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def write_inputs(self):
+        with open(os.path.join(self.workdir, "vendors.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Full Name", "Email"])
+            for i in range(RECIPIENTS):
+                writer.writerow([f"Recruiter {i}", f"recruiter{i}@vendor{i % 30}.example.com"])
+        accounts = [{"EMAIL_USER": f"sender{i}@example.com", "EMAIL_PASS": "secret", "DAILY_QUOTA": 10 * RECIPIENTS}
+                    for i in range(4)]
+        with open(os.path.join(self.workdir, "accounts.json"), "w") as f:
+            json.dump(accounts, f)
+
+    def env(self):
+        env = dict(os.environ)
+        env.update({
+            "EMAIL_ACCOUNTS_FILE": "accounts.json", "SMTP_SERVER": "127.0.0.1",
+            "SMTP_PORT": str(self.server.sockets[0].getsockname()[1]), "SMTP_TLS_VERIFY": "0",
+            "VENDOR_CSV_FILES": "vendors.csv", "CAMPAIGN_ID": "drain-test", "SPOOL_DIR": "spool",
+            "SEND_LEDGER_DB": "send_ledger.db", "SUPPRESSION_DB": "suppression.db",
+            "ACCOUNT_USAGE_DB": "account_usage.db", "ACTIVITY_OUTBOX_DIR": "activity_outbox",
+            "VALIDATE_DOMAINS": "0", "DOMAIN_RATE_PER_MINUTE": "0", "SHARD_COUNT": "1",
+            "RETRY_WAIT_LIMIT": "0", "BOUNCE_SOURCES": "",
+            "WBL_API_URL": "http://127.0.0.1:9/api", "WBL_API_TOKEN": "", "WBL_EMAIL": "", "WBL_PASSWORD": "",
+        })
+        return env
+
+    def test_each_recipient_is_sent_once(self):
+        self.write_inputs()
+        workers = []
+        for delay in (0, STAGGER):
+            # The second worker starts while the first has sends whose outcomes are still buffered
+            time.sleep(delay)
+            workers.append(subprocess.Popen([sys.executable, "-c", DRIVER], cwd=self.workdir, env=self.env(),
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE))
+        for worker in workers:
+            _, stderr = worker.communicate(timeout=300)
+            self.assertEqual(worker.returncode, 0, stderr.decode(errors="replace"))
+
+        delivered = Counter(rcpt for _, rcpts, _ in self.messages for rcpt in rcpts)
+        duplicates = {rcpt: n for rcpt, n in delivered.items() if n > 1}
+        self.assertEqual(duplicates, {})
+        self.assertEqual(len(delivered), RECIPIENTS)
+        conn = sqlite3.connect(os.path.join(self.workdir, "send_ledger.db"))
+        self.assertEqual(dict(conn.execute("SELECT status, COUNT(*) FROM sends GROUP BY status")), {"sent": RECIPIENTS})
+        conn.close()
+        # The campaign is complete, so its spool is gone
+        self.assertEqual(os.listdir(os.path.join(self.workdir, "spool")), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
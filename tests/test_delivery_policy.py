@@ -0,0 +1,162 @@
+"""SMTP failure classification, what each class means for the recipient, backoff and the circuit breaker.
+
+Run: python -m pytest tests/
+"""
+import os
+import smtplib
+import socket
+import sys
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from delivery_policy import (  # noqa: E402
+    ACCOUNT_AUTH, ACCOUNT_LIMIT, DEFER, GIVE_UP, PERMANENT, RECIPIENT_PERMANENT, SWITCH, TEMPORARY,
+    CircuitBreaker, backoff_delay, classify_exception, classify_smtp_error, decide_failure, failure_action
+)
+
+# Stand-ins for the random module: always the top or the bottom of the range
+HIGH = SimpleNamespace(uniform=lambda lo, hi: hi)
+LOW = SimpleNamespace(uniform=lambda lo, hi: lo)
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+# (code, reply text, failure class)
+SMTP_REPLIES = [
+    (421, "4.7.0 Try again later, closing connection", TEMPORARY),
+    (450, "4.2.1 Mailbox temporarily unavailable", TEMPORARY),
+    (451, "4.7.1 Rate limit exceeded", TEMPORARY),
+    (452, "4.5.3 Too many recipients", TEMPORARY),
+    (None, "", TEMPORARY),
+    (530, "5.7.0 Authentication Required", ACCOUNT_AUTH),
+    (534, "5.7.9 Application-specific password required", ACCOUNT_AUTH),
+    (535, "5.7.8 Username and Password not accepted", ACCOUNT_AUTH),
+    (550, "5.4.5 Daily user sending limit exceeded", ACCOUNT_LIMIT),
+    (554, "5.7.0 Quota exceeded for this account", ACCOUNT_LIMIT),
+    (550, "5.7.1 Message rejected", ACCOUNT_LIMIT),
+    (550, "5.1.1 The email account that you tried to reach does not exist", RECIPIENT_PERMANENT),
+    (550, "User unknown", RECIPIENT_PERMANENT),
+    (553, "Sorry, that domain isn't in my list of allowed rcpthosts", RECIPIENT_PERMANENT),
+    (551, "User not local", RECIPIENT_PERMANENT),
+    (552, "5.3.4 Message size exceeds fixed limit", PERMANENT),
+    (554, "5.7.1 Message rejected as spam", PERMANENT),
+]
+
+# (failure class, attempts so far, already a retry from another account, max attempts, action)
+ACTIONS = [
+    (ACCOUNT_LIMIT, 1, False, 5, SWITCH),
+    (ACCOUNT_LIMIT, 1, True, 5, GIVE_UP),
+    (ACCOUNT_AUTH, 3, False, 5, SWITCH),
+    (ACCOUNT_AUTH, 1, True, 5, GIVE_UP),
+    (TEMPORARY, 1, False, 5, DEFER),
+    (TEMPORARY, 4, True, 5, DEFER),
+    (TEMPORARY, 5, False, 5, GIVE_UP),
+    (TEMPORARY, 1, False, 1, GIVE_UP),
+    (RECIPIENT_PERMANENT, 1, False, 5, GIVE_UP),
+    (PERMANENT, 1, False, 5, GIVE_UP),
+]
+
+
+class ClassifyTest(unittest.TestCase):
+    def test_smtp_replies(self):
+        for code, text, expected in SMTP_REPLIES:
+            with self.subTest(code=code, text=text):
+                self.assertEqual(classify_smtp_error(code, text), expected)
+
+    def test_exceptions(self):
+        cases = [
+            (smtplib.SMTPDataError(450, b"4.2.1 Try later"), (TEMPORARY, 450, "4.2.1 Try later")),
+            (smtplib.SMTPSenderRefused(535, b"5.7.8 Bad credentials", "a@x.com"),
+             (ACCOUNT_AUTH, 535, "5.7.8 Bad credentials")),
+            (smtplib.SMTPRecipientsRefused({"b@y.com": (550, b"5.1.1 User unknown")}),
+             (RECIPIENT_PERMANENT, 550, "5.1.1 User unknown")),
+            (smtplib.SMTPAuthenticationError(535, "Bad credentials"), (ACCOUNT_AUTH, 535, "Bad credentials")),
+            (smtplib.SMTPServerDisconnected("Connection unexpectedly closed"),
+             (TEMPORARY, None, "Connection unexpectedly closed")),
+            (smtplib.SMTPConnectError(-1, b"timed out"), (TEMPORARY, -1, "timed out")),
+            (socket.timeout("timed out"), (TEMPORARY, None, "timed out")),
+            (ConnectionResetError("reset by peer"), (TEMPORARY, None, "reset by peer")),
+            (ValueError("bad header"), (PERMANENT, None, "bad header")),
+        ]
+        for error, expected in cases:
+            with self.subTest(error=repr(error)):
+                self.assertEqual(classify_exception(error), expected)
+
+    def test_actions(self):
+        for error_class, attempts, is_retry, max_attempts, expected in ACTIONS:
+            with self.subTest(error_class=error_class, attempts=attempts, is_retry=is_retry):
+                self.assertEqual(failure_action(error_class, attempts, is_retry, max_attempts), expected)
+
+    def test_reply_to_action(self):
+        # A first attempt: 4xx waits, the account's fault moves to another account, the rest give up
+        expected = {TEMPORARY: DEFER, ACCOUNT_AUTH: SWITCH, ACCOUNT_LIMIT: SWITCH,
+                    RECIPIENT_PERMANENT: GIVE_UP, PERMANENT: GIVE_UP}
+        for code, text, error_class in SMTP_REPLIES:
+            with self.subTest(code=code, text=text):
+                self.assertEqual(failure_action(classify_smtp_error(code, text), 1, False, 5), expected[error_class])
+
+    def test_decisions(self):
+        greylisted = decide_failure(TEMPORARY, 450, 2, False, 5, now=1000.0, retry_base=300, rng=HIGH)
+        self.assertEqual((greylisted.action, greylisted.retry_at), (DEFER, 1600.0))
+        self.assertTrue(greylisted.soft_error and greylisted.slows_domain)
+        self.assertFalse(greylisted.account_fault)
+        # A dropped connection backs the account off but says nothing about the domain
+        dropped = decide_failure(TEMPORARY, None, 1, False, 5, now=1000.0, rng=LOW)
+        self.assertEqual((dropped.action, dropped.retry_at, dropped.slows_domain), (DEFER, 1150.0, False))
+        blocked = decide_failure(ACCOUNT_LIMIT, 550, 1, False, 5, now=1000.0)
+        self.assertEqual((blocked.action, blocked.retry_at, blocked.account_fault), (SWITCH, None, True))
+        self.assertFalse(blocked.soft_error)
+        unknown = decide_failure(RECIPIENT_PERMANENT, 550, 1, False, 5, now=1000.0)
+        self.assertEqual(unknown.action, GIVE_UP)
+        self.assertFalse(unknown.account_fault or unknown.soft_error or unknown.slows_domain)
+
+
+class BackoffTest(unittest.TestCase):
+    def test_window_doubles_up_to_the_cap(self):
+        for attempt, window in ((1, 300), (2, 600), (3, 1200), (10, 6 * 3600)):
+            self.assertEqual(backoff_delay(attempt, rng=HIGH), window)
+            self.assertEqual(backoff_delay(attempt, rng=LOW), window / 2)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_after_consecutive_failures_with_doubling_cooldown(self):
+        clock = FakeClock(1000.0)
+        breaker = CircuitBreaker(failure_threshold=3, cooldown=60, max_cooldown=200, clock=clock)
+        self.assertFalse(breaker.record_failure())
+        self.assertFalse(breaker.record_failure())
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.record_failure())
+        self.assertTrue(breaker.is_open)
+        self.assertFalse(breaker.allow())
+        self.assertTrue(breaker.allow(now=1060.0))
+
+        # Half-open trial fails: open again for twice as long, then capped
+        clock.now = 1060.0
+        for _ in range(3):
+            opened = breaker.record_failure()
+        self.assertTrue(opened)
+        self.assertEqual(breaker.open_until, 1060.0 + 120)
+        clock.now = 1180.0
+        for _ in range(3):
+            breaker.record_failure()
+        self.assertEqual(breaker.open_until, 1180.0 + 200)
+
+    def test_success_resets(self):
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=60, clock=FakeClock(1000.0))
+        breaker.record_failure()
+        breaker.record_success()
+        self.assertFalse(breaker.record_failure())
+        self.assertTrue(breaker.record_failure())
+        breaker.record_success()
+        self.assertEqual(breaker.opens, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
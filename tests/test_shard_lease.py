@@ -0,0 +1,124 @@
+"""Shard leases and send claims between two workers sharing one send ledger.
+
+Run: python -m pytest tests/
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from send_ledger import SendLedger, PENDING, SENDING, SENT  # noqa: E402
+from shard_lease import ShardLease, accounts_for_shard, shard_of  # noqa: E402
+
+CAMPAIGN = "lease-test"
+TTL = 0.3
+
+
+class ShardLeaseTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="test_shard_lease_")
+        path = os.path.join(self.tmp, "send_ledger.db")
+        # One ledger connection per worker, as separate processes would have
+        self.ledger_a = SendLedger(path)
+        self.ledger_b = SendLedger(path)
+        self.emails = [f"user{i}@example.com" for i in range(40)]
+        self.ledger_a.add_recipients(CAMPAIGN, self.emails)
+        self.a = ShardLease(self.ledger_a, CAMPAIGN, 2, ttl=TTL, owner="worker-a")
+        self.b = ShardLease(self.ledger_b, CAMPAIGN, 2, ttl=TTL, owner="worker-b")
+
+    def tearDown(self):
+        for lease in (self.a, self.b):
+            lease._stop.set()
+        self.ledger_a.close()
+        self.ledger_b.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def in_shard(self, shard):
+        return [e for e in self.emails if shard_of(e, 2) == shard]
+
+    def crash(self, lease):
+        """Stop renewing without releasing, like a worker that died"""
+        lease._stop.set()
+        lease._thread.join()
+
+    def test_workers_take_different_shards(self):
+        self.assertEqual(self.a.acquire(), 0)
+        self.assertEqual(self.b.acquire(), 1)
+        self.assertIsNone(ShardLease(self.ledger_b, CAMPAIGN, 2, ttl=TTL, owner="worker-c").acquire(preferred=0))
+        self.assertTrue(all(self.a.owns(e) for e in self.in_shard(0)))
+        self.assertFalse(any(self.a.owns(e) for e in self.in_shard(1)))
+
+    def test_claim_is_exactly_once(self):
+        self.a.acquire(preferred=0)
+        self.b.acquire(preferred=1)
+        email = self.in_shard(0)[0]
+        self.assertFalse(self.b.claim(email), "claimed a recipient of a shard it doesn't lease")
+        self.assertTrue(self.a.claim(email))
+        self.assertFalse(self.a.claim(email), "claimed the same recipient twice")
+        self.assertEqual(self.ledger_b.counts(CAMPAIGN), {PENDING: 39, SENDING: 1})
+
+    def test_heartbeat_keeps_the_lease(self):
+        self.a.acquire(preferred=0)
+        time.sleep(TTL * 2)
+        self.assertIsNone(self.b.reclaim())
+        self.assertTrue(self.a.claim(self.in_shard(0)[0]))
+        self.assertFalse(self.a.lost.is_set())
+
+    def test_takeover_after_crash(self):
+        self.a.acquire(preferred=0)
+        self.crash(self.a)
+        self.assertIsNone(self.b.reclaim(), "took over a lease that hasn't expired")
+        time.sleep(TTL * 1.5)
+        self.assertEqual(self.b.reclaim(), 0)
+
+        # The old owner comes back: its claims are refused and the new owner's go through
+        email = self.in_shard(0)[0]
+        self.assertFalse(self.a.claim(email))
+        self.assertFalse(self.ledger_a.renew_shard(CAMPAIGN, 0, "worker-a", TTL))
+        self.assertTrue(self.b.claim(email))
+        self.ledger_b.record(CAMPAIGN, email, SENT, account="sender@example.com", smtp_code=250)
+        self.ledger_b.flush()
+        self.assertEqual(self.ledger_a.counts(CAMPAIGN, (0, 2))[SENT], 1)
+
+    def test_old_owner_notices_the_takeover(self):
+        self.a.acquire(preferred=0)
+        # Renewals stop reaching the ledger for longer than the ttl, then resume
+        self.a._stop.set()
+        self.a._thread.join()
+        time.sleep(TTL * 1.5)
+        self.assertEqual(self.b.reclaim(), 0)
+        self.a._stop.clear()
+        self.a._heartbeat()
+        self.assertTrue(self.a.lost.is_set())
+
+    def test_finished_shards_are_not_reclaimed(self):
+        self.a.acquire(preferred=0)
+        self.a.release()
+        time.sleep(TTL * 1.5)
+        self.assertIsNone(self.b.reclaim())
+        # ...but a worker starting up can still lease it
+        self.assertEqual(self.b.acquire(preferred=0), 0)
+
+    def test_shards_released_only_when_every_worker_is_done(self):
+        self.a.acquire(preferred=0)
+        self.a.release()
+        # Shard 1 was never leased, so its recipients haven't been worked yet
+        self.assertFalse(self.ledger_b.shards_released(CAMPAIGN, 2))
+        self.b.acquire(preferred=1)
+        self.assertFalse(self.ledger_a.shards_released(CAMPAIGN, 2))
+        self.b.release()
+        self.assertTrue(self.ledger_a.shards_released(CAMPAIGN, 2))
+
+    def test_accounts_are_split_between_shards(self):
+        accounts = [{"EMAIL_USER": f"sender{i}@example.com"} for i in range(5)]
+        shards = [accounts_for_shard(accounts, shard, 2) for shard in range(2)]
+        self.assertEqual(sorted(a["EMAIL_USER"] for s in shards for a in s), sorted(a["EMAIL_USER"] for a in accounts))
+        self.assertEqual([len(s) for s in shards], [3, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import argparse
+import os
+
+from job_activity_logger import JobActivityLogger
+from recipient_ingest import IngestStats, expand_sources, iter_recipients
+
+# CSV header (lower-cased) -> vendor_contact field
+COLUMN_MAP = {
+    "full_name": "full_name", "full name": "full_name", "name": "full_name",
+    "phone": "phone", "phone number": "phone",
+    "linkedin_id": "linkedin_id", "linkedin": "linkedin_id",
+    "company_name": "company_name", "company": "company_name",
+    "location": "location", "city": "location",
+}
+
+
+def contacts_from_csv(sources, stats=None):
+    """Stream vendor_contact dicts from recipient CSVs (one per unique email)"""
+    for row in iter_recipients(sources, email_column="Email", stats=stats):
+        contact = {"email": row["Email"]}
+        for column, value in row.items():
+            field = COLUMN_MAP.get((column or "").strip().lower())
+            if field and value and value.strip():
+                contact.setdefault(field, value.strip())
+        yield contact
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload vendor contacts from CSV files to the WBL API")
+    parser.add_argument("sources", nargs="*", default=[os.getenv("VENDOR_CSV_FILES", "vendoremails.csv")],
+                        help="CSV files or globs with an 'Email' column")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("VENDOR_UPLOAD_WORKERS", "8")))
+    parser.add_argument("--checkpoint", default="vendor_contacts_uploaded.txt")
+    parser.add_argument("--bulk-path", default=os.getenv("WBL_VENDOR_CONTACT_BULK_PATH") or None,
+                        help="API path that accepts a JSON list of contacts (e.g. vendor_contact/bulk)")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    sources = [part for source in args.sources for part in source.split(",")]
+    if not expand_sources(sources):
+        print(f"⚠ CSV file not found: {', '.join(sources)}")
+        return
+
+    stats = IngestStats()
+    logger = JobActivityLogger()
+    logger.save_vendor_contacts_bulk(
+        contacts_from_csv(sources, stats),
+        checkpoint_path=args.checkpoint,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        bulk_path=args.bulk_path
+    )
+    print(stats.summary())
+
+
+if __name__ == "__main__":
+    main()